@@ -0,0 +1,150 @@
+"""
+LLM Circuit Breaker
+Stops calling a failing or slow LLM and probes it until it recovers
+"""
+import threading
+import time
+from collections import deque
+from typing import Deque, Tuple
+from app.config import config
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# Gauge values for /metrics
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class CircuitBreaker:
+    """
+    Closed: calls go through and their outcomes fill a rolling window.
+    Once the window holds at least `min_calls` outcomes and the share of
+    failures, or of calls slower than `slow_call_seconds`, reaches its
+    threshold, the breaker opens.
+
+    Open: allow() is False, so callers use their fallback immediately
+    instead of waiting on the LLM. After `open_seconds` the breaker goes
+    half-open.
+
+    Half-open: up to `probes` calls at a time are let through. That many
+    successes in a row close the breaker (with an empty window); any
+    failure or slow call opens it again for another `open_seconds`.
+    """
+
+    def __init__(self, name: str, window_seconds: float = None, min_calls: int = None,
+                 failure_rate: float = None, slow_call_seconds: float = None, slow_rate: float = None,
+                 open_seconds: float = None, probes: int = None):
+        self.name = name
+        self.window_seconds = config.LLM_BREAKER_WINDOW if window_seconds is None else window_seconds
+        self.min_calls = config.LLM_BREAKER_MIN_CALLS if min_calls is None else min_calls
+        self.failure_rate = config.LLM_BREAKER_FAILURE_RATE if failure_rate is None else failure_rate
+        self.slow_call_seconds = config.LLM_SLOW_CALL_SECONDS if slow_call_seconds is None else slow_call_seconds
+        self.slow_rate = config.LLM_BREAKER_SLOW_RATE if slow_rate is None else slow_rate
+        self.open_seconds = config.LLM_BREAKER_OPEN_SECONDS if open_seconds is None else open_seconds
+        self.probes = config.LLM_BREAKER_PROBES if probes is None else probes
+
+        self._lock = threading.Lock()
+        self.state = CLOSED
+        self.opened_at = 0.0
+        # (finished at, failed, slow) per call in the window, with running totals
+        self._window: Deque[Tuple[float, bool, bool]] = deque()
+        self._failures = 0
+        self._slow = 0
+        self._probes_in_flight = 0
+        self._probe_successes = 0
+        self.counters = {"calls": 0, "failures": 0, "slow_calls": 0, "rejected": 0, "opened": 0}
+
+    def _prune(self, now: float):
+        cutoff = now - self.window_seconds
+        while self._window and self._window[0][0] < cutoff:
+            _, failed, slow = self._window.popleft()
+            self._failures -= failed
+            self._slow -= slow
+
+    def _open(self, now: float):
+        self.state = OPEN
+        self.opened_at = now
+        self._probes_in_flight = 0
+        self._probe_successes = 0
+        self.counters["opened"] += 1
+
+    def allow(self) -> bool:
+        """Whether to make a call now (False: use the fallback)"""
+        now = time.monotonic()
+        with self._lock:
+            if self.state == OPEN and now - self.opened_at >= self.open_seconds:
+                self.state = HALF_OPEN
+            if self.state == CLOSED:
+                return True
+            if self.state == HALF_OPEN and self._probes_in_flight < self.probes:
+                self._probes_in_flight += 1
+                return True
+            self.counters["rejected"] += 1
+            return False
+
+    def record(self, seconds: float, ok: bool):
+        """
+        Outcome of a call allow() let through
+
+        Args:
+            seconds: How long the call took
+            ok: False for an error or timeout
+        """
+        now = time.monotonic()
+        slow = seconds >= self.slow_call_seconds
+        with self._lock:
+            self.counters["calls"] += 1
+            self.counters["failures"] += not ok
+            self.counters["slow_calls"] += slow
+            if self.state == HALF_OPEN:
+                self._probes_in_flight = max(0, self._probes_in_flight - 1)
+                if not ok or slow:
+                    self._open(now)
+                else:
+                    self._probe_successes += 1
+                    if self._probe_successes >= self.probes:
+                        self.state = CLOSED
+                        self._window.clear()
+                        self._failures = self._slow = 0
+                return
+            if self.state == OPEN:
+                # A call started before the breaker opened
+                return
+
+            self._window.append((now, not ok, slow))
+            self._failures += not ok
+            self._slow += slow
+            self._prune(now)
+            calls = len(self._window)
+            if calls >= self.min_calls and (
+                self._failures / calls >= self.failure_rate or self._slow / calls >= self.slow_rate
+            ):
+                self._open(now)
+
+    def abandon(self):
+        """A call allow() let through was cancelled before it finished"""
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self._probes_in_flight = max(0, self._probes_in_flight - 1)
+
+    def stats(self) -> dict:
+        """Current state, window rates and counters"""
+        now = time.monotonic()
+        with self._lock:
+            self._prune(now)
+            calls = len(self._window)
+            state = self.state
+            if state == OPEN and now - self.opened_at >= self.open_seconds:
+                state = HALF_OPEN
+            return {
+                "state": state,
+                "window_calls": calls,
+                "window_failure_rate": round(self._failures / calls, 4) if calls else 0.0,
+                "window_slow_rate": round(self._slow / calls, 4) if calls else 0.0,
+                **self.counters
+            }
+
+
+# Singleton instance
+llm_breaker = CircuitBreaker("llm")
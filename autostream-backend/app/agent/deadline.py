@@ -0,0 +1,125 @@
+"""
+Turn Deadlines
+A per-request deadline carried through the turn, split into per-stage time budgets
+"""
+import logging
+import threading
+import time
+from contextvars import ContextVar
+from typing import Dict, Optional
+from app.config import config
+from app.agent.metrics import metrics_registry
+
+logger = logging.getLogger(__name__)
+
+# Longest a stage may take, in seconds; "llm" gets whatever the deadline leaves
+STAGE_BUDGETS: Dict[str, Optional[float]] = {
+    "retrieval": config.STAGE_BUDGET_RETRIEVAL_MS / 1000,
+    "youtube": config.STAGE_BUDGET_YOUTUBE_MS / 1000,
+    "llm": None,
+    "lead_capture": config.STAGE_BUDGET_LEAD_CAPTURE_MS / 1000,
+}
+
+# Time a stage must leave for the stages after it, in seconds
+_RESERVE_AFTER_LLM = config.STAGE_BUDGET_LEAD_CAPTURE_MS / 1000
+STAGE_RESERVES: Dict[str, float] = {
+    "retrieval": config.LLM_MIN_BUDGET_MS / 1000 + _RESERVE_AFTER_LLM,
+    "youtube": 0.0,
+    "llm": _RESERVE_AFTER_LLM,
+    "lead_capture": 0.0,
+}
+
+# Outcomes: ok (within budget), exceeded (ran to completion over budget),
+# timed_out (cut off at its budget), skipped (not enough time left to start)
+stage_budget_outcomes = metrics_registry.counter(
+    "autostream_stage_budget_total", "Turn stages by time budget outcome", ("stage", "outcome")
+)
+
+
+class Deadline:
+    """When the current request must be answered by, and what each stage may spend of it"""
+
+    def __init__(self, seconds: float, requested: bool = False):
+        self.seconds = seconds
+        # Asked for by the client (X-Deadline-Ms) rather than the server's TURN_DEADLINE_MS
+        self.requested = requested
+        self.started = time.monotonic()
+        self.expires_at = self.started + seconds
+
+    @classmethod
+    def for_request(cls, requested_ms: Optional[str] = None) -> "Deadline":
+        """
+        Deadline for a new request
+
+        Args:
+            requested_ms: Client's X-Deadline-Ms header, capped at TURN_DEADLINE_MAX_MS
+                (TURN_DEADLINE_MS when absent or invalid)
+        """
+        try:
+            ms = min(max(float(requested_ms), 1.0), config.TURN_DEADLINE_MAX_MS)
+        except (TypeError, ValueError):
+            return cls(config.TURN_DEADLINE_MS / 1000)
+        return cls(ms / 1000, requested=True)
+
+    def remaining(self) -> float:
+        """Seconds left (negative once past the deadline)"""
+        return self.expires_at - time.monotonic()
+
+    def budget(self, stage: str) -> float:
+        """
+        Seconds a stage may take now: its own budget, cut down so the
+        stages after it keep their reserve
+        """
+        available = self.remaining() - STAGE_RESERVES.get(stage, 0.0)
+        limit = STAGE_BUDGETS.get(stage)
+        return max(0.0, available if limit is None else min(limit, available))
+
+    def observe(self, stage: str, seconds: float) -> str:
+        """Record a stage (or the whole "turn") that ran to completion; returns ok or exceeded"""
+        limit = self.seconds if stage == "turn" else STAGE_BUDGETS.get(stage)
+        outcome = "exceeded" if limit is not None and seconds > limit else "ok"
+        budget_stats.record(stage, outcome)
+        return outcome
+
+
+class BudgetStats:
+    """Stage budget outcome counts, for /api/stats"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counts: Dict[str, Dict[str, int]] = {}
+
+    def record(self, stage: str, outcome: str):
+        stage_budget_outcomes.inc(1, stage, outcome)
+        with self._lock:
+            stage_counts = self.counts.setdefault(stage, {})
+            stage_counts[outcome] = stage_counts.get(outcome, 0) + 1
+
+    def summary(self) -> dict:
+        with self._lock:
+            return {
+                "turn_deadline_ms": config.TURN_DEADLINE_MS,
+                "stage_budgets_ms": {
+                    stage: None if seconds is None else round(seconds * 1000)
+                    for stage, seconds in STAGE_BUDGETS.items()
+                },
+                "outcomes": {stage: dict(counts) for stage, counts in self.counts.items()}
+            }
+
+
+# Singleton instance
+budget_stats = BudgetStats()
+
+# Deadline of the request being handled (set by the API, or by arun for other callers)
+current_deadline: ContextVar[Optional[Deadline]] = ContextVar("current_deadline", default=None)
+
+if config.TURN_DEADLINE_MS / 1000 - STAGE_BUDGETS["retrieval"] - STAGE_RESERVES["llm"] < config.LLM_TIMEOUT:
+    # Calls get cut by the deadline before LLM_TIMEOUT, where they would count as failures
+    logger.warning("TURN_DEADLINE_MS leaves the LLM less than LLM_TIMEOUT", extra={
+        "turn_deadline_ms": config.TURN_DEADLINE_MS, "llm_timeout": config.LLM_TIMEOUT
+    })
+if config.LLM_TIMEOUT <= config.LLM_SLOW_CALL_SECONDS:
+    # Calls time out before they can count as slow, so the breaker's slow-call rate never trips
+    logger.warning("LLM_TIMEOUT is not above LLM_SLOW_CALL_SECONDS", extra={
+        "llm_timeout": config.LLM_TIMEOUT, "llm_slow_call_seconds": config.LLM_SLOW_CALL_SECONDS
+    })
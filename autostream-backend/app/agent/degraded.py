@@ -0,0 +1,162 @@
+"""
+Degraded Replies
+Answers without the LLM, from the prompt templates and retrieved knowledge, while the LLM is unavailable
+"""
+import logging
+import re
+from typing import Callable, Dict, List, Optional, Tuple
+from app.agent.intent_embedding import embedding_intent_classifier
+from app.agent.prompts import (
+    BASIC_PLAN_PROMPT, COMPARISON_PROMPT, GREETING_PROMPT, HIGH_INTENT_PROMPT, INFO_PROMPT,
+    OBJECTION_HANDLING_PROMPT, PRICING_PROMPT, PRO_PLAN_PROMPT
+)
+from app.agent.state import AgentState
+
+logger = logging.getLogger(__name__)
+
+# Template lines that instruct the model rather than speak to the user
+_DIRECTIVES = (
+    "Show", "Keep", "Welcome", "Response", "Educational", "Reframe", "Ask ONE", "Ask for next",
+    "One at a time", "No ", "NO ", "Missing fields", "Polite"
+)
+# Directive headers whose bullet list is for the model too
+_DIRECTIVE_BLOCKS = ("Current:",)
+# "Label: text" lines whose text is said as is
+_SPOKEN = re.compile(r'^(?:Then ask|Ask|Acknowledge|Soft CTA):\s*(.+)$')
+_CONDITIONAL = re.compile(r'^If (.+?):\s*(.+)$')
+_CONTEXT_HEADER = re.compile(r'\[Context \d+\]\s*')
+_MARKDOWN = re.compile(r'[#*`]+')
+
+# Template conditions, as predicates on the session state
+_CONDITIONS: Dict[str, Callable[[dict], bool]] = {
+    "missing name": lambda s: not s.get("name"),
+    "missing email": lambda s: not s.get("email"),
+    "missing platform": lambda s: not s.get("platform"),
+    "platform is already YouTube": lambda s: (s.get("platform") or "").lower() == "youtube" and not s.get("yt_channel"),
+    "platform is YouTube and no channel shared": lambda s: (s.get("platform") or "").lower() == "youtube" and not s.get("yt_channel"),
+    "platform not known": lambda s: not s.get("platform"),
+    "platform unknown": lambda s: not s.get("platform"),
+}
+
+_INTENT_TEMPLATES = {
+    "greeting": GREETING_PROMPT,
+    "pricing": PRICING_PROMPT,
+    "comparison": COMPARISON_PROMPT,
+    "objection": OBJECTION_HANDLING_PROMPT,
+    "high_intent": HIGH_INTENT_PROMPT,
+}
+
+
+class _Fields(dict):
+    def __missing__(self, key):
+        return ""
+
+
+def knowledge_excerpt(context: Optional[str], max_chars: int = 400) -> Optional[str]:
+    """The top retrieved chunk as plain text (headings and tables dropped), cut at a line end"""
+    if not context or not context.startswith("[Context"):
+        return None
+    chunk = _CONTEXT_HEADER.split(context)[1] if _CONTEXT_HEADER.search(context) else context
+    lines = [_MARKDOWN.sub("", line).strip() for line in chunk.strip().splitlines() if not line.startswith("#")]
+    text = ""
+    for line in lines:
+        if not line or line.startswith("|"):
+            continue
+        if text and len(text) + len(line) > max_chars:
+            break
+        text += line + ("\n" if line.startswith("-") or line.endswith(":") else " ")
+    return text.strip() or None
+
+
+def render(template: str, state: dict, knowledge: Optional[str] = None) -> str:
+    """
+    Turn an LLM instruction template into the reply it asks for
+
+    The opening situation line and directive lines are dropped, spoken
+    lines ("Ask: ...") keep their text, conditional lines ("If ...: ...")
+    are kept only when their condition holds (the first one only, since
+    replies ask one question), and an "Explain ..." line is replaced by
+    the retrieved knowledge.
+    """
+    fields = _Fields(
+        name=state.get("name") or "",
+        email=state.get("email") or "",
+        platform=state.get("platform") or "",
+        plan=state.get("selected_plan") or "",
+        selected_plan=state.get("selected_plan") or "",
+        user_message="",
+        missing_fields=""
+    )
+    lines: List[str] = []
+    skipping_block = False
+    asked = False
+    for line in template.format_map(fields).splitlines()[1:]:
+        stripped = line.strip()
+        if skipping_block:
+            if stripped.startswith("-"):
+                continue
+            skipping_block = False
+        if stripped in _DIRECTIVE_BLOCKS:
+            skipping_block = True
+            continue
+        if stripped.startswith(_DIRECTIVES):
+            continue
+        if stripped.startswith("Explain"):
+            if knowledge:
+                lines.append(knowledge)
+            continue
+        conditional = _CONDITIONAL.match(stripped)
+        if conditional:
+            condition = _CONDITIONS.get(conditional.group(1))
+            if not asked and condition is not None and condition(state):
+                lines.append(conditional.group(2))
+                asked = True
+            continue
+        spoken = _SPOKEN.match(stripped)
+        if spoken:
+            lines.append(spoken.group(1))
+            continue
+        lines.append(stripped)
+
+    text = "\n".join(lines)
+    return re.sub(r'\n{3,}', "\n\n", text).strip()
+
+
+def _intent(state: AgentState, message: str) -> str:
+    """Intent from the local classifier only (no LLM to escalate to; embeds, so not on the event loop)"""
+    if state.get("conversation_state") in ("CONFIRMATION", "QUALIFIED"):
+        return "high_intent"
+    try:
+        intent, _, _ = embedding_intent_classifier.classify(message)
+        return intent.lower()
+    except Exception:
+        logger.exception("Local intent classification failed")
+    return "pricing" if "pricing" in state.get("turn_keywords", []) else "info"
+
+
+def degraded_reply(state: AgentState) -> Tuple[str, str]:
+    """
+    Reply to the latest message without the LLM
+
+    A plan picked this turn gets its plan template; otherwise the local
+    intent picks one, and anything else is answered with the top
+    retrieved chunk through the INFO template.
+
+    Returns:
+        (intent, reply text)
+    """
+    messages = state.get("messages", [])
+    message = messages[-1].content if messages else ""
+    intent = _intent(state, message)
+
+    plan = state.get("selected_plan")
+    if "plan_selected" in state.get("turn_keywords", []) and plan in ("basic", "pro"):
+        template = BASIC_PLAN_PROMPT if plan == "basic" else PRO_PLAN_PROMPT
+    elif intent == "high_intent" and state.get("name") and state.get("email") and state.get("platform"):
+        # Lead capture replaces this with the closing message
+        template = PRO_PLAN_PROMPT if plan == "pro" else PRICING_PROMPT
+    else:
+        template = _INTENT_TEMPLATES.get(intent, INFO_PROMPT)
+
+    reply = render(template, state, knowledge_excerpt(state.get("retrieved_context")))
+    return intent, reply
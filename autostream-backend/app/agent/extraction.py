@@ -0,0 +1,120 @@
+"""
+Single-Pass Extraction Engine
+One compiled alternation regex pulls lead fields and funnel keyword hits out of a message
+"""
+import re
+from typing import Optional, Set
+
+# Order matters: URLs and emails are tried first so that words inside them
+# ("pro" in youtube.com/@proGamer, "youtube" in a link) are not counted twice.
+# The name alternative is a lookahead so the word after "I'm" is still
+# scanned for keywords ("I'm interested" yields both a name and an agreement hit).
+# Matches are anchored to token starts, and the final unnamed alternative
+# swallows any other token whole, so the scan advances a word at a time
+# instead of retrying every alternative at every character.
+_PATTERN = re.compile(
+    r"""
+    (?<![\w.-])(?:
+        (?P<yt_url>(?:https?://)?(?:www\.)?youtube\.com/\S+|youtu\.be/\S+)
+      | (?P<email>[\w.+-]+@[\w.-]+\.\w+)
+      | (?:my\s+name\s+is|i'm|i\s+am|call\s+me)\s+(?=(?P<name>\w+))
+      | (?P<plan>pro|basic)\b
+      | (?P<platform>youtube|tiktok|instagram)\b
+      | (?P<frequency>weekly|daily|monthly)\b
+      | (?P<pricing>prices?|pricing|costs?|plans?|how\s+much)\b
+      | (?P<agreement>sounds\s+good|okay|interested|like\s+it)\b
+      | [\w.-]+
+    )
+    """,
+    re.IGNORECASE | re.VERBOSE,
+)
+
+# Keyword categories reported in ExtractionResult.keywords
+KEYWORD_GROUPS = ("platform", "frequency", "pricing", "agreement")
+
+# When several platforms are mentioned the later entry wins (matches the
+# original per-platform loop, which overwrote earlier hits)
+_PLATFORM_PRIORITY = {"youtube": 0, "tiktok": 1, "instagram": 2}
+
+
+class ExtractionResult:
+    """Fields and keyword categories found in one message"""
+
+    __slots__ = ("email", "plan", "platform", "name", "yt_channel", "keywords")
+
+    def __init__(self):
+        self.email: Optional[str] = None
+        self.plan: Optional[str] = None
+        self.platform: Optional[str] = None
+        self.name: Optional[str] = None
+        self.yt_channel: Optional[str] = None
+        self.keywords: Set[str] = set()
+
+    def to_dict(self) -> dict:
+        """Plain dict view, used by the correctness corpus (tests/test_extraction.py)"""
+        return {
+            "email": self.email,
+            "plan": self.plan,
+            "platform": self.platform,
+            "name": self.name,
+            "yt_channel": self.yt_channel,
+            "keywords": sorted(self.keywords)
+        }
+
+
+class ExtractionEngine:
+    """Runs the compiled pattern once per message"""
+
+    def extract(self, text: str) -> ExtractionResult:
+        """
+        Extract lead fields and keyword hits in a single scan
+
+        Args:
+            text: Raw user message
+
+        Returns:
+            ExtractionResult with every field and keyword category found
+        """
+        result = ExtractionResult()
+        keywords = result.keywords
+
+        for match in _PATTERN.finditer(text):
+            group = match.lastgroup
+            if group is None:
+                continue
+            value = match.group(group)
+
+            if group == "yt_url":
+                if result.yt_channel is None:
+                    result.yt_channel = value
+                # A channel link counts as mentioning YouTube
+                self._set_platform(result, "youtube")
+                keywords.add("platform")
+            elif group == "email":
+                if result.email is None:
+                    result.email = value
+            elif group == "name":
+                if result.name is None:
+                    result.name = value.capitalize()
+            elif group == "plan":
+                # "pro" takes precedence over "basic" when both appear
+                if result.plan != "pro":
+                    result.plan = value.lower()
+            elif group == "platform":
+                self._set_platform(result, value.lower())
+                keywords.add("platform")
+            else:
+                keywords.add(group)
+
+        return result
+
+    @staticmethod
+    def _set_platform(result: ExtractionResult, platform: str):
+        """Keep the highest-priority platform seen so far"""
+        current = result.platform
+        if current is None or _PLATFORM_PRIORITY[platform] > _PLATFORM_PRIORITY[current]:
+            result.platform = platform
+
+
+# Singleton instance
+extraction_engine = ExtractionEngine()
@@ -0,0 +1,270 @@
+"""
+FAQ Direct Answers
+Question/answer pairs derived from the knowledge base, matched by embedding similarity so canonical questions skip the LLM
+"""
+import json
+import logging
+import re
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from app.config import config
+from app.agent.metrics import metrics_registry
+from app.agent.rag import rag_pipeline
+from app.agent.state import AgentState
+
+logger = logging.getLogger(__name__)
+
+# Signals that move the funnel in ways a canned answer would not acknowledge
+_LLM_SIGNALS = {"plan_selected", "agreement"}
+
+_TABLE_MARKS = {"❌": "not included", "✅": "included"}
+
+faq_lookups = metrics_registry.counter(
+    "autostream_faq_lookups_total", "Messages checked against the FAQ index (answered: no retrieval or LLM)",
+    ("outcome",)
+)
+
+
+def slug(heading: str) -> str:
+    """Entry id from a knowledge base heading"""
+    return re.sub(r'[^a-z0-9]+', "-", heading.lower().replace("'", "")).strip("-")
+
+
+class FAQEntry:
+    """One canonical answer, the questions it answers and the intent it is tagged with"""
+
+    def __init__(self, entry_id: str, section: str, questions: List[str], answer: str, intent: str):
+        self.id = entry_id
+        self.section = section
+        self.questions = questions
+        self.answer = answer
+        self.intent = intent
+
+    @property
+    def context(self) -> str:
+        """The answer as retrieved context, for later turns and degraded replies"""
+        return f"[Context 1]\n### {self.section}\n{self.answer}"
+
+
+def faq_entries(markdown: str, spec: dict) -> List[FAQEntry]:
+    """
+    Derive question/answer pairs from the knowledge base
+
+    Every "###" subsection of a listed "##" section is one entry: a
+    heading that is a question is asked as is, others as "Tell me about
+    your ...". Each row of a listed section's table is one entry answered
+    with the row's values per plan. Extra phrasings come from the spec.
+
+    Args:
+        markdown: knowledge.md text
+        spec: {"sections": {section: intent}, "questions": {entry id: [phrasings]}}
+    """
+    extra: Dict[str, List[str]] = spec.get("questions", {})
+    entries: List[FAQEntry] = []
+
+    for block in re.split(r'^## ', markdown, flags=re.MULTILINE)[1:]:
+        section, _, body = block.partition("\n")
+        section = section.strip()
+        intent = spec["sections"].get(section)
+        if intent is None:
+            continue
+
+        for sub in re.split(r'^### ', body, flags=re.MULTILINE)[1:]:
+            heading, _, text = sub.partition("\n")
+            heading = heading.strip()
+            answer = "\n".join(line.replace("**", "").strip() for line in text.strip().splitlines() if line.strip())
+            question = heading if heading.endswith("?") else f"Tell me about your {heading.lower()}"
+            entry_id = slug(heading)
+            entries.append(FAQEntry(entry_id, heading, [question, *extra.get(entry_id, [])], answer, intent))
+
+        rows = [line for line in body.splitlines() if line.startswith("|")]
+        if len(rows) > 2:
+            plans = [cell.strip() for cell in rows[0].strip("|").split("|")][1:]
+            for row in rows[2:]:
+                feature, *values = [cell.strip() for cell in row.strip("|").split("|")]
+                values = [_TABLE_MARKS.get(value, value) for value in values]
+                answer = f"{feature}: " + ", ".join(f"{value} on {plan}" for plan, value in zip(plans, values)) + "."
+                entry_id = slug(feature)
+                questions = [f"Tell me about {feature.lower()} on each plan", *extra.get(entry_id, [])]
+                entries.append(FAQEntry(entry_id, section, questions, answer, intent))
+
+    return entries
+
+
+class FAQIndex:
+    """
+    Answers messages that ask a knowledge base question directly.
+
+    Every question phrasing is embedded with the RAG pipeline's model; a
+    message is answered by the entry of its most similar phrasing when
+    that similarity clears FAQ_MIN_SIMILARITY and beats the best phrasing
+    of any other entry by FAQ_MIN_MARGIN. Everything else goes through
+    retrieval and the LLM as usual.
+    """
+
+    def __init__(self, spec_path: str = None, knowledge_path: str = None, enabled: bool = None):
+        self.spec_path = spec_path or config.FAQ_PATH
+        self.knowledge_path = knowledge_path or config.KNOWLEDGE_BASE_PATH
+        self.enabled = config.FAQ_ENABLED if enabled is None else enabled
+        self.min_similarity = config.FAQ_MIN_SIMILARITY
+        self.min_margin = config.FAQ_MIN_MARGIN
+        self.entries: Dict[str, FAQEntry] = {}
+        self._owners: List[str] = []
+        self._vectors: Optional[np.ndarray] = None
+        self._lock = threading.Lock()
+        self.counters = {"answered": 0, "passed": 0}
+
+    def build(self):
+        """Parse the knowledge base and embed every phrasing (once; at startup or on first use)"""
+        if self._vectors is not None:
+            return
+        with self._lock:
+            if self._vectors is not None:
+                return
+            with open(self.spec_path, 'r', encoding='utf-8') as f:
+                spec = json.load(f)
+            with open(self.knowledge_path, 'r', encoding='utf-8') as f:
+                entries = faq_entries(f.read(), spec)
+
+            owners, questions = [], []
+            for entry in entries:
+                owners.extend([entry.id] * len(entry.questions))
+                questions.extend(entry.questions)
+            vectors = np.asarray(rag_pipeline.embeddings.embed_documents(questions), dtype=np.float32)
+            vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+            self.entries = {entry.id: entry for entry in entries}
+            self._owners = owners
+            self._vectors = vectors
+            logger.info("FAQ index built", extra={"entries": len(entries), "questions": len(questions)})
+
+    def _scores(self, vector: np.ndarray) -> Tuple[Optional[str], float, float]:
+        """(best entry id, its similarity, margin over the best other entry)"""
+        similarities = self._vectors @ vector
+        best: Dict[str, float] = {}
+        for owner, similarity in zip(self._owners, similarities.tolist()):
+            if similarity > best.get(owner, -1.0):
+                best[owner] = similarity
+        ranked = sorted(best.items(), key=lambda item: item[1], reverse=True)
+        if not ranked:
+            return None, 0.0, 0.0
+        top_id, top = ranked[0]
+        return top_id, top, top - (ranked[1][1] if len(ranked) > 1 else 0.0)
+
+    def _embed(self, message: str) -> np.ndarray:
+        vector = np.asarray(rag_pipeline.embed_query(message), dtype=np.float32)
+        return vector / max(float(np.linalg.norm(vector)), 1e-12)
+
+    def match(self, message: str) -> Optional[FAQEntry]:
+        """The entry that answers `message`, if one clears the thresholds"""
+        self.build()
+        entry_id, similarity, margin = self._scores(self._embed(message))
+        if entry_id is None or similarity < self.min_similarity or margin < self.min_margin:
+            return None
+        return self.entries[entry_id]
+
+    def answer(self, state: AgentState) -> Optional[FAQEntry]:
+        """
+        Direct answer for the turn's message (runs in the retrieval thread)
+
+        Turns that pick a plan or agree to sign up are left to the LLM,
+        since the answer would ignore that.
+        """
+        messages = state.get("messages")
+        if not self.enabled or not messages or _LLM_SIGNALS.intersection(state.get("turn_keywords", [])):
+            return None
+        entry = self.match(messages[-1].content)
+        outcome = "answered" if entry is not None else "passed"
+        self.counters[outcome] += 1
+        faq_lookups.inc(1, outcome)
+        return entry
+
+    def get(self, entry_id: str) -> FAQEntry:
+        self.build()
+        return self.entries[entry_id]
+
+    def evaluate(self, eval_path: str = None,
+                 thresholds: Tuple[float, ...] = (0.6, 0.65, 0.7, 0.75, 0.8, 0.85, 0.9, 0.95),
+                 margins: Tuple[float, ...] = (0.0, 0.02, 0.05, 0.1), min_precision: float = 1.0) -> dict:
+        """
+        Precision and LLM calls saved per similarity threshold and margin on a labeled set
+
+        Args:
+            eval_path: JSON list of {"message", "faq"} records ("faq" null when
+                the message needs the LLM)
+            min_precision: Precision a setting must reach to be recommended
+
+        Returns:
+            Per threshold (at FAQ_MIN_MARGIN) and per margin (at
+            FAQ_MIN_SIMILARITY): share of messages answered directly (LLM
+            calls saved), precision of those answers and recall of the
+            answerable messages; the setting that answers the most messages
+            at `min_precision`; plus match latency
+        """
+        eval_path = eval_path or config.FAQ_EVAL_PATH
+        with open(eval_path, 'r', encoding='utf-8') as f:
+            records = json.load(f)
+        self.build()
+
+        latencies, scored = [], []
+        for record in records:
+            start = time.perf_counter()
+            scored.append(self._scores(self._embed(record["message"])))
+            latencies.append((time.perf_counter() - start) * 1000)
+
+        answerable = sum(1 for record in records if record["faq"])
+
+        def outcome(threshold: float, min_margin: float) -> dict:
+            answered = correct = 0
+            for record, (entry_id, similarity, margin) in zip(records, scored):
+                if entry_id is None or similarity < threshold or margin < min_margin:
+                    continue
+                answered += 1
+                correct += entry_id == record["faq"]
+            return {
+                "answered": answered,
+                "precision": round(correct / answered, 3) if answered else None,
+                "recall": round(correct / answerable, 3) if answerable else None,
+                "llm_calls_saved": round(answered / len(records), 3)
+            }
+
+        recommended = None
+        for threshold in thresholds:
+            for min_margin in margins:
+                result = outcome(threshold, min_margin)
+                if result["answered"] and result["precision"] >= min_precision and (
+                        recommended is None or result["answered"] > recommended["answered"]):
+                    recommended = {"min_similarity": threshold, "min_margin": min_margin, **result}
+
+        latencies.sort()
+        return {
+            "examples": len(records),
+            "answerable": answerable,
+            "entries": len(self.entries),
+            "embedding_model": config.EMBEDDING_MODEL,
+            "min_similarity": self.min_similarity,
+            "min_margin": self.min_margin,
+            "thresholds": {f"{threshold:.2f}": outcome(threshold, self.min_margin) for threshold in thresholds},
+            "margins": {f"{min_margin:.2f}": outcome(self.min_similarity, min_margin) for min_margin in margins},
+            "recommended": recommended,
+            "match_ms_p50": round(latencies[len(latencies) // 2], 3),
+        }
+
+    def stats(self) -> dict:
+        """Entries indexed and answered / passed counts"""
+        return {
+            "enabled": self.enabled,
+            "entries": len(self.entries),
+            "min_similarity": self.min_similarity,
+            **self.counters
+        }
+
+
+# Singleton instance
+faq_index = FAQIndex()
+
+
+if __name__ == "__main__":
+    print(json.dumps(faq_index.evaluate(), indent=2))
@@ -0,0 +1,181 @@
+"""
+Conversation Funnel State Machine
+Declarative DISCOVERY → FINAL transition table compiled into lookup tables
+"""
+import itertools
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+import numpy as np
+
+FUNNEL_STATES = ["DISCOVERY", "EXPLORING", "PRICING", "CONFIRMATION", "QUALIFIED", "FINAL"]
+
+# Intents the LLM tags replies with; anything else maps to "other"
+FUNNEL_INTENTS = ["greeting", "info", "pricing", "comparison", "objection", "high_intent", "other"]
+
+# Per-turn boolean signals. Keyword categories come from the extraction engine;
+# plan_selected / lead_captured are derived from state updates.
+FUNNEL_SIGNALS = ["platform", "frequency", "pricing", "agreement", "plan_selected", "lead_captured"]
+
+# Transition rules, checked in order per state. A rule fires when the intent
+# is in "intents" (if given) AND at least one of "signals" is hit (if given).
+# No rule firing means the conversation stays where it is.
+TRANSITIONS: Dict[str, List[dict]] = {
+    "DISCOVERY": [
+        # User shares content type or posting frequency
+        {"signals": ["platform", "frequency"], "to": "EXPLORING"},
+    ],
+    "EXPLORING": [
+        {"intents": ["pricing", "comparison"], "to": "PRICING"},
+        {"signals": ["pricing"], "to": "PRICING"},
+    ],
+    "PRICING": [
+        {"signals": ["agreement"], "to": "CONFIRMATION"},
+        {"intents": ["high_intent"], "to": "QUALIFIED"},
+    ],
+    "CONFIRMATION": [
+        # Exists for one turn only; any reply moves forward to avoid a loop
+        {"to": "QUALIFIED"},
+    ],
+    "QUALIFIED": [
+        {"signals": ["lead_captured"], "to": "FINAL"},
+    ],
+    "FINAL": [],
+}
+
+_STATE_INDEX = {state: i for i, state in enumerate(FUNNEL_STATES)}
+_INTENT_INDEX = {intent: i for i, intent in enumerate(FUNNEL_INTENTS)}
+_SIGNAL_BIT = {signal: 1 << i for i, signal in enumerate(FUNNEL_SIGNALS)}
+
+
+def signal_mask(signals: Iterable[str]) -> int:
+    """Pack signal names into a bitmask (unknown names are ignored)"""
+    mask = 0
+    for signal in signals:
+        mask |= _SIGNAL_BIT.get(signal, 0)
+    return mask
+
+
+class FunnelMachine:
+    """
+    Compiled form of a transition table.
+    Every (state, intent, signal mask) combination is resolved once up front,
+    into a dict for per-turn lookups and a dense array for bulk evaluation.
+    """
+
+    def __init__(self, transitions: Dict[str, List[dict]] = None):
+        """
+        Args:
+            transitions: Rule table in the TRANSITIONS format (defaults to TRANSITIONS)
+        """
+        self.transitions = transitions or TRANSITIONS
+        n_masks = 1 << len(FUNNEL_SIGNALS)
+        self.table = np.zeros((len(FUNNEL_STATES), len(FUNNEL_INTENTS), n_masks), dtype=np.int8)
+        self.lookup: Dict[Tuple[str, str, int], str] = {}
+
+        for state, intent, mask in itertools.product(FUNNEL_STATES, FUNNEL_INTENTS, range(n_masks)):
+            target = self._resolve(state, intent, mask)
+            self.table[_STATE_INDEX[state], _INTENT_INDEX[intent], mask] = _STATE_INDEX[target]
+            self.lookup[(state, intent, mask)] = target
+
+    def _resolve(self, state: str, intent: str, mask: int) -> str:
+        """Walk the rules for one input combination"""
+        for rule in self.transitions.get(state, []):
+            if "intents" in rule and intent not in rule["intents"]:
+                continue
+            if "signals" in rule and not mask & signal_mask(rule["signals"]):
+                continue
+            return rule["to"]
+        return state
+
+    def next_state(self, state: str, intent: str, signals: Iterable[str]) -> str:
+        """
+        Resolve one turn's transition
+
+        Args:
+            state: Current conversation state
+            intent: Intent tagged for this turn
+            signals: Signal names hit this turn (see FUNNEL_SIGNALS)
+
+        Returns:
+            Next conversation state
+        """
+        if state not in _STATE_INDEX:
+            return state
+        if intent not in _INTENT_INDEX:
+            intent = "other"
+        return self.lookup[(state, intent, signal_mask(signals))]
+
+    def next_state_bulk(self, states: np.ndarray, intents: np.ndarray, masks: np.ndarray) -> np.ndarray:
+        """
+        Vectorized transition over arrays of state, intent and signal-mask indices
+
+        Args:
+            states: State indices into FUNNEL_STATES
+            intents: Intent indices into FUNNEL_INTENTS
+            masks: Signal bitmasks
+
+        Returns:
+            Next state indices
+        """
+        return self.table[states, intents, masks]
+
+    def simulate(
+        self,
+        sessions: int = 1_000_000,
+        turns: int = 8,
+        intent_probs: Optional[Dict[str, float]] = None,
+        signal_probs: Optional[Dict[str, float]] = None,
+        seed: int = 0
+    ) -> dict:
+        """
+        Replay synthetic sessions through the funnel without the LLM
+
+        Each turn draws an intent and independent signals per session. The
+        lead_captured signal only fires in QUALIFIED, mirroring the agent.
+
+        Args:
+            sessions: Number of synthetic sessions
+            turns: Turns per session
+            intent_probs: Probability per intent (normalized; defaults to uniform)
+            signal_probs: Per-turn probability per signal (defaults to 0.2)
+            seed: RNG seed for reproducible comparisons between rule tables
+
+        Returns:
+            Final state distribution, conversion rates and throughput
+        """
+        rng = np.random.default_rng(seed)
+        intent_p = np.array([(intent_probs or {}).get(i, 0.0 if intent_probs else 1.0) for i in FUNNEL_INTENTS])
+        intent_p = intent_p / intent_p.sum()
+        signal_probs = signal_probs or {}
+
+        qualified = _STATE_INDEX["QUALIFIED"]
+        states = np.zeros(sessions, dtype=np.int8)
+        reached_qualified = np.zeros(sessions, dtype=bool)
+
+        start = time.perf_counter()
+        for _ in range(turns):
+            intents = rng.choice(len(FUNNEL_INTENTS), size=sessions, p=intent_p)
+            masks = np.zeros(sessions, dtype=np.int64)
+            for signal, bit in _SIGNAL_BIT.items():
+                hits = rng.random(sessions) < signal_probs.get(signal, 0.2)
+                if signal == "lead_captured":
+                    hits &= states == qualified
+                masks |= np.where(hits, bit, 0)
+            states = self.next_state_bulk(states, intents, masks)
+            reached_qualified |= states >= qualified
+        elapsed = time.perf_counter() - start
+
+        counts = np.bincount(states, minlength=len(FUNNEL_STATES))
+        return {
+            "sessions": sessions,
+            "turns": turns,
+            "final_states": {state: int(counts[i]) for i, state in enumerate(FUNNEL_STATES)},
+            "qualified_rate": round(float(reached_qualified.mean()), 4),
+            "capture_rate": round(float(counts[_STATE_INDEX["FINAL"]]) / sessions, 4),
+            "transitions_per_second": int(sessions * turns / elapsed) if elapsed else None
+        }
+
+
+# Singleton instance
+funnel_machine = FunnelMachine()
+
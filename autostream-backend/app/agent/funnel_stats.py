@@ -0,0 +1,198 @@
+"""
+Funnel Analytics
+Funnel occupancy, transition counts and conversion maintained incrementally on state changes
+"""
+import threading
+import time
+from typing import Dict, Optional
+import numpy as np
+from app.agent.funnel import FUNNEL_STATES
+
+# Rolling windows reported by /api/funnel, in seconds
+WINDOWS = {"5m": 300, "1h": 3600, "24h": 86400}
+
+_N = len(FUNNEL_STATES)
+_STATE_INDEX = {state: i for i, state in enumerate(FUNNEL_STATES)}
+_DISCOVERY = _STATE_INDEX["DISCOVERY"]
+_QUALIFIED = _STATE_INDEX["QUALIFIED"]
+_FINAL = _STATE_INDEX["FINAL"]
+
+# Layout of one time bucket: sessions started, then the flattened from x to transition matrix
+_STARTED = 0
+_MATRIX = 1
+_WIDTH = 1 + _N * _N
+
+
+class BucketRing:
+    """
+    Fixed-width time buckets in a ring, each a row of event counts.
+    Like usage.RollingCounter, a bucket remembers its period so stale rows
+    are reset on reuse and ignored by window sums without a sweep.
+    """
+
+    def __init__(self, width: int, bucket_seconds: int = 60, num_buckets: int = 1440):
+        self.bucket_seconds = bucket_seconds
+        self.num_buckets = num_buckets
+        self._periods = np.full(num_buckets, -1, dtype=np.int64)
+        self._values = np.zeros((num_buckets, width), dtype=np.int64)
+
+    def add(self, column: int, now: float, amount: int = 1):
+        period = int(now // self.bucket_seconds)
+        slot = period % self.num_buckets
+        if self._periods[slot] != period:
+            self._periods[slot] = period
+            self._values[slot] = 0
+        self._values[slot, column] += amount
+
+    def window(self, seconds: int, now: float) -> np.ndarray:
+        """Column totals over the trailing `seconds` (bucket-aligned)"""
+        current = int(now // self.bucket_seconds)
+        oldest = current - min(self.num_buckets, -(-seconds // self.bucket_seconds)) + 1
+        live = (self._periods >= oldest) & (self._periods <= current)
+        return self._values[live].sum(axis=0)
+
+
+def _entered(started: int, matrix: np.ndarray) -> np.ndarray:
+    """Entries per state: transitions into it, plus new sessions for DISCOVERY"""
+    entered = matrix.sum(axis=0)
+    entered[_DISCOVERY] += started
+    return entered
+
+
+def _rate(numerator: int, denominator: int) -> Optional[float]:
+    return round(numerator / denominator, 4) if denominator else None
+
+
+def _funnel_view(started: int, matrix: np.ndarray) -> dict:
+    entered = _entered(started, matrix)
+    return {
+        "sessions_started": int(started),
+        "entered": {state: int(entered[i]) for i, state in enumerate(FUNNEL_STATES)},
+        "transitions": {
+            source: {target: int(matrix[i, j]) for j, target in enumerate(FUNNEL_STATES) if matrix[i, j]}
+            for i, source in enumerate(FUNNEL_STATES) if matrix[i].any()
+        },
+        "qualified_rate": _rate(int(entered[_QUALIFIED]), int(started)),
+        "capture_rate": _rate(int(entered[_FINAL]), int(started))
+    }
+
+
+class FunnelStats:
+    """
+    Funnel analytics updated on every session start, state change and
+    session end, so reading them never scans sessions.
+
+    Keeps the state of each live session (to know which count to move on
+    a transition or eviction), current occupancy per state, cumulative
+    transition counts overall and per plan and platform, and per-minute
+    buckets for rolling windows. A read costs the same with ten sessions
+    or a million.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.session_states: Dict[str, int] = {}
+        self.occupancy = np.zeros(_N, dtype=np.int64)
+        self.started = 0
+        self.matrix = np.zeros((_N, _N), dtype=np.int64)
+        # Attribute value -> transitions made while the session had that plan / platform
+        self.by: Dict[str, Dict[str, np.ndarray]] = {"plan": {}, "platform": {}}
+        self.ring = BucketRing(_WIDTH)
+
+    def start_session(self, session_id: str):
+        """A new session enters DISCOVERY"""
+        now = time.time()
+        with self._lock:
+            previous = self.session_states.get(session_id)
+            if previous is not None:
+                self.occupancy[previous] -= 1
+            self.session_states[session_id] = _DISCOVERY
+            self.occupancy[_DISCOVERY] += 1
+            self.started += 1
+            self.ring.add(_STARTED, now)
+
+    def transition(self, session_id: str, source: str, target: str,
+                   plan: Optional[str] = None, platform: Optional[str] = None):
+        """
+        Record a state change
+
+        Args:
+            session_id: Session that moved
+            source: State before the turn
+            target: State after the turn (no-op when equal to source)
+            plan: Selected plan at the time, if any
+            platform: Creator platform at the time, if any
+        """
+        if source == target or source not in _STATE_INDEX or target not in _STATE_INDEX:
+            return
+        i, j = _STATE_INDEX[source], _STATE_INDEX[target]
+        now = time.time()
+        with self._lock:
+            current = self.session_states.get(session_id)
+            if current is not None:
+                self.occupancy[current] -= 1
+            self.session_states[session_id] = j
+            self.occupancy[j] += 1
+            self.matrix[i, j] += 1
+            for dimension, value in (("plan", plan), ("platform", platform)):
+                key = (value or "unknown").lower()
+                counts = self.by[dimension].get(key)
+                if counts is None:
+                    counts = self.by[dimension][key] = np.zeros((_N, _N), dtype=np.int64)
+                counts[i, j] += 1
+            self.ring.add(_MATRIX + i * _N + j, now)
+
+    def end_session(self, session_id: str):
+        """A session was evicted, expired or deleted"""
+        with self._lock:
+            current = self.session_states.pop(session_id, None)
+            if current is not None:
+                self.occupancy[current] -= 1
+
+    def live(self) -> Dict[str, int]:
+        """Live sessions per state"""
+        with self._lock:
+            return {state: int(self.occupancy[i]) for i, state in enumerate(FUNNEL_STATES)}
+
+    def summary(self) -> dict:
+        """
+        Live occupancy, cumulative funnel, per plan / platform conversion
+        and rolling windows
+
+        Per plan and platform, transitions are attributed to the value the
+        session had when it moved, so conversion_rate there is captures
+        over entries into QUALIFIED (where both are normally known).
+        """
+        now = time.time()
+        with self._lock:
+            occupancy = self.occupancy.copy()
+            started = self.started
+            matrix = self.matrix.copy()
+            by = {dimension: {key: counts.copy() for key, counts in values.items()}
+                  for dimension, values in self.by.items()}
+            windows = {name: self.ring.window(seconds, now) for name, seconds in WINDOWS.items()}
+
+        breakdown = {}
+        for dimension, values in by.items():
+            breakdown[f"by_{dimension}"] = {}
+            for key, counts in values.items():
+                entered = counts.sum(axis=0)
+                breakdown[f"by_{dimension}"][key] = {
+                    "entered": {state: int(entered[i]) for i, state in enumerate(FUNNEL_STATES) if entered[i]},
+                    "conversion_rate": _rate(int(entered[_FINAL]), int(entered[_QUALIFIED]))
+                }
+
+        return {
+            "live": {state: int(occupancy[i]) for i, state in enumerate(FUNNEL_STATES)},
+            "live_sessions": int(occupancy.sum()),
+            "totals": _funnel_view(started, matrix),
+            **breakdown,
+            "windows": {
+                name: _funnel_view(int(row[_STARTED]), row[_MATRIX:].reshape(_N, _N))
+                for name, row in windows.items()
+            }
+        }
+
+
+# Singleton instance
+funnel_stats = FunnelStats()
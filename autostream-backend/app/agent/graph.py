@@ -2,210 +2,733 @@
 Optimized LangGraph Workflow using Groq
 With conversation state management for proper flow control
 """
-from typing import Literal, Dict, Any
-from langgraph.graph import StateGraph, END
-from langchain_groq import ChatGroq
+import logging
+from contextvars import ContextVar
+from typing import Callable, Literal, Dict, Any, List, Optional, Set, Tuple
+from langgraph.graph import StateGraph, START, END
 from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
+from langchain_core.messages.ai import add_ai_message_chunks
 from app.config import config
 from app.agent.state import AgentState
-from app.agent.rag import rag_pipeline
-from app.agent.tools import lead_executor
+from app.agent.rag import rag_pipeline, rag_retrieval_node
+from app.agent.tools import lead_executor, lead_capture_node
 from app.agent.youtube_analyzer import youtube_analyzer
+from app.agent.timing import StageTimer, pipeline_timings, current_timer, timed_node
+from app.agent.metrics import record_turn, record_llm_usage
+from app.agent.usage import token_ledger, usage_record
+from app.profiling import request_profiler, track_thread
+from app.agent.extraction import extraction_engine, ExtractionResult
+from app.agent.funnel import funnel_machine
+from app.agent.funnel_stats import funnel_stats
+from app.agent.prompts import SYSTEM_PROMPT, FINAL_STATE_MESSAGE
+from app.agent.circuit_breaker import llm_breaker
+from app.agent.model_router import ModelRouter, Route, model_router
+from app.agent.degraded import degraded_reply
+from app.agent.intent import intent_classifier
+from app.agent.deadline import Deadline, budget_stats, current_deadline
+from app.agent.quick_replies import quick_replies
+from app.agent.faq import faq_index
+from app.memory.session_store import session_store
+import asyncio
 import re
+import time
+import uuid
 
-class AutoStreamGraph:
-    """Simplified High-Speed LangGraph workflow using Groq"""
+logger = logging.getLogger(__name__)
+
+# Receives cleaned reply text as it streams from the LLM, and None when the text
+# sent so far is discarded for a fallback reply (set by arun's on_token)
+reply_listener: ContextVar[Optional[Callable[[Optional[str]], None]]] = ContextVar("reply_listener", default=None)
+
+# Background tasks started by the running turn, cancelled if the turn is abandoned (set by arun)
+turn_tasks: ContextVar[Optional[list]] = ContextVar("turn_tasks", default=None)
+
+# An intent/state tag that may still be growing at the end of the streamed text
+_PARTIAL_TAG = re.compile(r'(\[[^\]]*|(?:INTENT|STATE):\s*\S*\s*)$', re.IGNORECASE)
+
+
+def strip_tags(text: str) -> str:
+    """Remove the INTENT / STATE tags the model adds to its reply"""
+    text = re.sub(r'\[INTENT:.*?\]', '', text, flags=re.IGNORECASE)
+    text = re.sub(r'INTENT:\s*\w+\s*', '', text, flags=re.IGNORECASE)
+    return re.sub(r'STATE:\s*\w+\s*', '', text, flags=re.IGNORECASE)
+
+
+def parse_reply(content: str, default: Optional[str] = "greeting") -> Tuple[Optional[str], str]:
+    """
+    Split a model reply into its intent tag and the text shown to the user
+    
+    Returns:
+        (intent, reply without tags); intent is `default` when the reply has no tag
+    """
+    intent_match = re.search(r'INTENT:\s*(\w+)', content, re.IGNORECASE)
+    if not intent_match:
+        intent_match = re.search(r'\[INTENT:\s*(.*?)\]', content, re.IGNORECASE)
+    intent = intent_match.group(1).strip().lower() if intent_match else default
+    return intent, strip_tags(content).strip()
+
+
+class ReplyTagFilter:
+    """
+    Streams a reply with its tags removed. Whole words are released as
+    they complete; anything that could still turn into a tag is held
+    back until the next chunk decides it.
+    """
     
     def __init__(self):
-        """Initialize with a single Groq LLM instance"""
-        self.llm = ChatGroq(
-            model_name=config.GROQ_MODEL,
-            groq_api_key=config.GROQ_API_KEY,
-            temperature=config.TEMPERATURE,
-            max_tokens=config.MAX_TOKENS
-        )
-        self.graph = self._build_graph()
+        self.pending = ""
+        self.gap = ""  # whitespace released so far but not yet shown
+        self.started = False
     
-    def _build_graph(self) -> StateGraph:
-        """Single-node streamlined graph"""
-        workflow = StateGraph(AgentState)
+    def _release(self, text: str) -> str:
+        text = strip_tags(text)
+        body = text.rstrip()
+        if not body:
+            self.gap += text
+            return ""
+        text, self.gap = self.gap + body, text[len(body):]
+        if not self.started:
+            text = text.lstrip()
+            self.started = True
+        return text
+    
+    def feed(self, chunk: str) -> str:
+        """Add a chunk; returns the text that is now safe to show"""
+        self.pending += chunk
+        cut = max(self.pending.rfind(" "), self.pending.rfind("\n")) + 1
+        partial = _PARTIAL_TAG.search(self.pending[:cut])
+        if partial:
+            cut = partial.start()
+        released, self.pending = self.pending[:cut], self.pending[cut:]
+        return self._release(released)
+    
+    def flush(self) -> str:
+        """Release whatever is left at the end of the reply"""
+        released, self.pending = self.pending, ""
+        return self._release(released)
+
+
+class AutoStreamGraph:
+    """High-Speed multi-node LangGraph workflow using Groq"""
+    
+    def __init__(self, checkpointer=None, router: ModelRouter = None):
+        """
+        Initialize with the reply model router
         
-        # We only need one smart node now
-        workflow.add_node("agent", self._agent_node)
+        Args:
+            checkpointer: LangGraph checkpointer for per-session state
+                (defaults to the session store's)
+            router: Picks the reply model per turn (defaults to the shared router)
+        """
+        self.router = router or model_router
+        # Set to a chat model to use it for every reply instead of routing (tests, benchmarks)
+        self.llm = None
+        self.checkpointer = checkpointer
+        self.graph = None
+        # Turns answered without the LLM (see _degraded_turn)
+        self.degraded_replies = 0
+        # Turns abandoned mid-flight (client gone) and the LLM work that saved (estimates)
+        self.cancellations = {"turns": 0, "llm_calls": 0, "output_tokens_saved": 0.0, "seconds_saved": 0.0}
+    
+    async def _compiled_graph(self):
+        """Compile on first use, once the session store's checkpointer is open"""
+        if self.graph is None:
+            checkpointer = self.checkpointer or await session_store.open()
+            self.graph = self._build_graph(checkpointer)
+        return self.graph
+    
+    def _build_graph(self, checkpointer) -> StateGraph:
+        """
+        extract ─┬─ FINAL ─────────────→ close
+                 ├─ quick reply ───────→ quick_reply ─┬→ [lead_capture]
+                 └─ [retrieve] ─┬→ respond ───────────┼→ [enrich]
+                                └→ faq_answer ────────┘
         
-        workflow.set_entry_point("agent")
-        workflow.add_edge("agent", END)
+        Retrieval is skipped once the user is qualified, and a closed
+        conversation never reaches the LLM. A quick-reply button message
+        with a precomputed answer for the session's state skips both (see
+        app.agent.quick_replies), and a message matching a knowledge base
+        question is answered from it in place of retrieval and the LLM (see
+        app.agent.faq). A new YouTube channel is looked
+        up in the background from extract; enrich only attaches the result
+        if it is ready by the end of the turn (otherwise on a later turn).
         
-        return workflow.compile()
-
-    def _agent_node(self, state: AgentState) -> AgentState:
-        """
-        Single-Pass Node using Groq for ultra-fast response with state management
+        Each stage runs within its share of the turn deadline (see
+        app.agent.deadline): retrieval and enrich are cut short or skipped,
+        the LLM gets what is left, and lead capture always runs.
         """
+        workflow = StateGraph(AgentState)
+        
+        workflow.add_node("extract", timed_node("extraction", self._extract_node))
+        workflow.add_node("retrieve", timed_node("retrieval", self._retrieve_node))
+        workflow.add_node("enrich", timed_node("youtube", self._enrich_node))
+        workflow.add_node("respond", timed_node("llm", self._respond_node))
+        workflow.add_node("lead_capture", timed_node("lead_capture", self._lead_capture_node))
+        workflow.add_node("close", timed_node("close", self._close_node))
+        workflow.add_node("quick_reply", timed_node("quick_reply", self._quick_reply_node))
+        workflow.add_node("faq_answer", timed_node("faq_answer", self._faq_answer_node))
+        
+        workflow.set_entry_point("extract")
+        workflow.add_conditional_edges(
+            "extract", self._route_after_extract, ["close", "quick_reply", "retrieve", "respond"]
+        )
+        workflow.add_conditional_edges("retrieve", self._route_after_retrieve, ["faq_answer", "respond"])
+        for node in ("respond", "quick_reply", "faq_answer"):
+            workflow.add_conditional_edges(
+                node, self._route_after_respond, ["lead_capture", "enrich", END]
+            )
+        workflow.add_edge("lead_capture", END)
+        workflow.add_edge("enrich", END)
+        workflow.add_edge("close", END)
+        
+        return workflow.compile(checkpointer=checkpointer)
+    
+    async def _extract_node(self, state: AgentState) -> AgentState:
+        """Single-pass extraction from the user's message (on the event loop, it is microseconds)"""
         messages = state.get("messages", [])
         if not messages: return {}
         
-        latest_message = messages[-1].content
+        extraction = extraction_engine.extract(messages[-1].content)
+        updates = self._fast_extract(extraction, state)
         
-        # 1. Quick RAG Retrieval
-        context = rag_pipeline.retrieve_context(latest_message)
+        signals = set(extraction.keywords)
+        if extraction.plan:
+            signals.add("plan_selected")
+        updates["turn_keywords"] = sorted(signals)
         
-        # 2. Use optimized system prompt
-        from app.agent.prompts import SYSTEM_PROMPT
+        # Ask permission for channel recommendations once, on the turn it appears
+        updates["show_youtube_permission"] = bool(
+            updates.get("yt_channel") and not state.get("yt_permission_asked")
+        )
+        if updates["show_youtube_permission"]:
+            updates["yt_permission_asked"] = True
+        
+        # Set again by retrieval when this turn's message is an FAQ
+        if state.get("faq_match"):
+            updates["faq_match"] = None
+        
+        # Channel lookup runs alongside retrieval and the LLM instead of in front of them
+        channel = updates.get("yt_channel") or state.get("yt_channel")
+        if channel and not state.get("yt_analysis_done"):
+            task = youtube_analyzer.prefetch(channel)
+            started = turn_tasks.get()
+            if task is not None and started is not None:
+                started.append(task)
+        
+        return updates
+    
+    def _route_after_extract(self, state: AgentState) -> List[str]:
+        """Pick the stages this turn actually needs"""
+        if state.get("conversation_state") == "FINAL":
+            return ["close"]
+        
+        if quick_replies.should_serve(state):
+            return ["quick_reply"]
+        
+        if rag_pipeline.should_retrieve(state):
+            return ["retrieve"]
+        return ["respond"]
+    
+    async def _retrieve_node(self, state: AgentState) -> AgentState:
+        """
+        Retrieval within its budget; when it is skipped or runs out the
+        previous turn's context is kept (the thread finishes on its own)
+        """
+        deadline = current_deadline.get()
+        if deadline is None:
+            return await asyncio.to_thread(self._retrieve_in_thread, state)
+        budget = deadline.budget("retrieval")
+        if budget < config.STAGE_MIN_BUDGET_MS / 1000:
+            budget_stats.record("retrieval", "skipped")
+            return {}
+        started = time.perf_counter()
+        try:
+            updates = await asyncio.wait_for(asyncio.to_thread(self._retrieve_in_thread, state), budget)
+        except asyncio.TimeoutError:
+            budget_stats.record("retrieval", "timed_out")
+            logger.warning("Retrieval ran out of budget", extra={"budget_ms": round(budget * 1000)})
+            return {}
+        deadline.observe("retrieval", time.perf_counter() - started)
+        return updates
+    
+    @staticmethod
+    def _retrieve_in_thread(state: AgentState) -> AgentState:
+        with track_thread():
+            entry = faq_index.answer(state)
+            if entry is not None:
+                return {"faq_match": entry.id, "retrieved_context": entry.context}
+            return rag_retrieval_node(state)
+    
+    def _route_after_retrieve(self, state: AgentState) -> str:
+        return "faq_answer" if state.get("faq_match") else "respond"
+    
+    def _faq_answer_node(self, state: AgentState) -> AgentState:
+        """The knowledge base's answer to a frequently asked question, tagged with its intent"""
+        entry = faq_index.get(state["faq_match"])
+        return self._answer_turn(state, reply_listener.get(), entry.intent, entry.answer)
+    
+    async def _enrich_node(self, state: AgentState) -> AgentState:
+        """
+        Attach the YouTube channel analysis if the background lookup has
+        finished, or finishes within the youtube budget
+        """
+        yt_analysis = youtube_analyzer.cached(state["yt_channel"])
+        deadline = current_deadline.get()
+        if not yt_analysis and deadline is not None:
+            budget = deadline.budget("youtube")
+            if budget < config.STAGE_MIN_BUDGET_MS / 1000:
+                budget_stats.record("youtube", "skipped")
+            else:
+                try:
+                    # analyze() shields the lookup, so giving up here leaves it running
+                    yt_analysis = await asyncio.wait_for(youtube_analyzer.analyze(state["yt_channel"]), budget)
+                    budget_stats.record("youtube", "ok")
+                except asyncio.TimeoutError:
+                    budget_stats.record("youtube", "timed_out")
+        if not yt_analysis:
+            return {}
+        return {"yt_analysis": yt_analysis, "yt_analysis_done": True}
+    
+    def _lead_capture_node(self, state: AgentState) -> AgentState:
+        """Lead capture is never cut short; its time is only checked against the budget"""
+        started = time.perf_counter()
+        updates = lead_capture_node(state)
+        deadline = current_deadline.get()
+        if deadline is not None:
+            deadline.observe("lead_capture", time.perf_counter() - started)
+        return updates
+    
+    async def _respond_node(self, state: AgentState) -> AgentState:
+        """
+        Groq call with state-aware system prompt, then intent parsing
+        and conversation state transition
+        """
+        messages = state.get("messages", [])
+        if not messages: return {}
         
         # Get current conversation state
         current_conv_state = state.get('conversation_state', 'DISCOVERY')
         
-        system_prompt = SYSTEM_PROMPT.format(
-            context=context,
-            name=state.get('name', 'Unknown'),
-            email=state.get('email', 'Unknown'),
-            platform=state.get('platform', 'Unknown'),
-            plan=state.get('selected_plan', 'None'),
-            conversation_state=current_conv_state
-        )
-
+        listener = reply_listener.get()
         try:
-            # Single High-Speed call to Groq
-            response = self.llm.invoke([
-                SystemMessage(content=system_prompt),
-                HumanMessage(content=latest_message)
-            ])
-            
-            ai_content = response.content
-            
-            # 3. Fast Extraction
-            intent_match = re.search(r'INTENT:\s*(\w+)', ai_content, re.IGNORECASE)
-            if not intent_match:
-                intent_match = re.search(r'\[INTENT:\s*(.*?)\]', ai_content, re.IGNORECASE)
-            
-            intent = intent_match.group(1).strip().lower() if intent_match else "greeting"
-            
-            # Remove ALL intent and state tags from response
-            clean_reply = ai_content
-            clean_reply = re.sub(r'\[INTENT:.*?\]', '', clean_reply, flags=re.IGNORECASE)
-            clean_reply = re.sub(r'INTENT:\s*\w+\s*', '', clean_reply, flags=re.IGNORECASE)
-            clean_reply = re.sub(r'STATE:\s*\w+\s*', '', clean_reply, flags=re.IGNORECASE)
-            clean_reply = clean_reply.strip()
-            
-            # Regex extraction from the USER'S message
-            updates = self._fast_extract(latest_message, state)
-            
-            # 4. Conversation State Transition Logic
+            # Single High-Speed call to Groq (streamed when someone is listening)
+            prompt = self._reply_prompt(state)
+            route = None
+            if self.llm is None:
+                # May embed the message for its intent: keep it off the event loop
+                route, _ = await asyncio.to_thread(self.router.select, state)
+            response = await self._guarded_llm_call(prompt, listener, route)
+            if response is None:
+                return await asyncio.to_thread(self._degraded_turn, state, listener)
+            usage = getattr(response, "usage_metadata", None)
+            record_llm_usage("respond", usage)
+        
+            # Intent tag extraction; ALL intent and state tags removed from the reply
+            intent, clean_reply = parse_reply(response.content, default=None)
+            if intent is None:
+                # Untagged reply: classify the message locally rather than assume a greeting.
+                # The reply call already spent this turn's LLM time, so no escalation.
+                intent = await asyncio.to_thread(intent_classifier.classify_intent, state, False)
+        
+            # Conversation State Transition Logic
             new_conv_state = self._determine_next_state(
                 current_conv_state,
                 intent,
-                latest_message.lower(),
-                state,
-                updates
+                set(state.get("turn_keywords", [])),
+                state
+            )
+            funnel_stats.transition(
+                state.get("session_id"), current_conv_state, new_conv_state,
+                state.get("selected_plan"), state.get("platform")
             )
-            updates["conversation_state"] = new_conv_state
-            
-            # 4.5 YouTube Channel Analysis
-            if updates.get("yt_channel") and not state.get("yt_analysis_done"):
-                yt_analysis = youtube_analyzer.analyze_channel(updates["yt_channel"])
-                if yt_analysis:
-                    updates["yt_analysis"] = yt_analysis
-                    updates["yt_analysis_done"] = True
             
-            # 5. Check for Lead Capture trigger
-            new_state = {**state, **updates}
-            if not state.get("lead_captured") and lead_executor.should_capture_lead(new_state):
-                lead_executor.execute_capture(new_state)
-                # Move to FINAL state and use proper closure message
-                updates["conversation_state"] = "FINAL"
-                updates["lead_captured"] = True
-                clean_reply = "Thanks for sharing your details. Our team will review your information and reach out to you shortly to help you get started with AutoStream. Looking forward to supporting your content journey."
-
+            # Attribute the call to the funnel stage the turn started in
+            usage_entry = usage_record(usage, route.prices if route else None)
+            token_ledger.record(
+                usage_entry, intent, current_conv_state, state.get("tenant_id") or "default", "respond"
+            )
+        
             return {
-                "messages": [AIMessage(content=clean_reply)],
+                # Explicit id so lead capture can replace this reply with the closing message
+                "messages": [AIMessage(content=clean_reply, id=str(uuid.uuid4()))],
                 "intent": intent,
                 "turn_count": state.get("turn_count", 0) + 1,
-                "retrieved_context": context,
-                **updates
+                "conversation_state": new_conv_state,
+                "token_usage": usage_entry
             }
-            
+        
         except Exception as e:
-            print(f"Groq Agent Error: {e}")
-            return {"messages": [AIMessage(content="I'm here to help! What would you like to know about our video editing plans?")]}
-
-    def _determine_next_state(self, current_state: str, intent: str, message: str, state: dict, updates: dict) -> str:
-        """
-        Determine next conversation state based on current state and user input
-        """
-        # If already in FINAL state, stay there
-        if current_state == "FINAL":
-            return "FINAL"
-        
-        # DISCOVERY to EXPLORING
-        if current_state == "DISCOVERY":
-            if any(word in message for word in ["youtube", "tiktok", "instagram", "weekly", "daily", "monthly"]):
-                return "EXPLORING"
-            return "DISCOVERY"
-        
-        # EXPLORING to PRICING
-        if current_state == "EXPLORING":
-            if intent in ["pricing", "comparison"] or any(word in message for word in ["price", "cost", "plan", "how much"]):
-                return "PRICING"
-            return "EXPLORING"
-        
-        # PRICING to CONFIRMATION
-        if current_state == "PRICING":
-            if any(word in message for word in ["sounds good", "okay", "interested", "like it"]):
-                return "CONFIRMATION"
-            if intent == "high_intent":
-                return "QUALIFIED"
-            return "PRICING"
-        
-        # CONFIRMATION to QUALIFIED (ONE TURN ONLY)
-        if current_state == "CONFIRMATION":
-            # Any response in CONFIRMATION state moves to QUALIFIED
-            if intent == "high_intent" or updates.get("selected_plan"):
-                return "QUALIFIED"
-            # Even if not explicit, move forward to avoid loop
-            return "QUALIFIED"
-        
-        # QUALIFIED to FINAL (when lead captured)
-        if current_state == "QUALIFIED":
-            if state.get("lead_captured") or updates.get("lead_captured"):
-                return "FINAL"
-            return "QUALIFIED"
-        
-        return current_state
-
-    def _fast_extract(self, text: str, state: AgentState) -> dict:
-        """Ultra-fast regex extraction"""
+            logger.exception("Groq agent call failed")
+            return await asyncio.to_thread(self._degraded_turn, state, listener)
+    
+    def _reply_prompt(self, state: AgentState) -> list:
+        """State-aware system prompt plus the latest user message"""
+        system_prompt = SYSTEM_PROMPT.format(
+            context=state.get('retrieved_context') or "Knowledge base not available.",
+            name=state.get('name', 'Unknown'),
+            email=state.get('email', 'Unknown'),
+            platform=state.get('platform', 'Unknown'),
+            plan=state.get('selected_plan', 'None'),
+            conversation_state=state.get('conversation_state', 'DISCOVERY')
+        )
+        return [SystemMessage(content=system_prompt), HumanMessage(content=state["messages"][-1].content)]
+    
+    async def _guarded_llm_call(self, prompt: list, listener: Optional[Callable[[str], None]],
+                                route: Optional[Route] = None) -> Optional[AIMessage]:
+        """
+        LLM call through the circuit breaker, bounded by LLM_TIMEOUT and
+        by what the turn deadline leaves
+        
+        Errors and LLM_TIMEOUT overruns count against the breaker. A call
+        cut short by a client's deadline (X-Deadline-Ms) before LLM_TIMEOUT
+        does not: one impatient client must not open the breaker for
+        everyone. Such a call only counts as slow once it has run past
+        LLM_SLOW_CALL_SECONDS. The server's own TURN_DEADLINE_MS leaves the
+        LLM more than LLM_TIMEOUT, so a stalled upstream still fails.
+        
+        Args:
+            route: Routed model to call (None: the self.llm override)
+        
+        Returns:
+            The reply, or None when the breaker is open, too little of the
+            deadline is left to call, or the call failed
+        """
+        deadline = current_deadline.get()
+        timeout = config.LLM_TIMEOUT
+        cut_by_deadline = False
+        if deadline is not None:
+            budget = deadline.budget("llm")
+            if budget < config.LLM_MIN_BUDGET_MS / 1000:
+                budget_stats.record("llm", "skipped")
+                return None
+            if budget < timeout:
+                timeout = budget
+                cut_by_deadline = deadline.requested
+        if not llm_breaker.allow():
+            return None
+        llm = self.llm if route is None else route.llm
+        streamed = False
+        
+        def forward(text: str):
+            nonlocal streamed
+            streamed = True
+            listener(text)
+        
+        started = time.perf_counter()
+        try:
+            if listener is None:
+                call = llm.ainvoke(prompt)
+            else:
+                call = self._stream_reply(llm, prompt, forward)
+            response = await asyncio.wait_for(call, timeout)
+        except asyncio.CancelledError:
+            llm_breaker.abandon()
+            self._count_cancelled_call(route, time.perf_counter() - started)
+            raise
+        except Exception as e:
+            elapsed = time.perf_counter() - started
+            if isinstance(e, asyncio.TimeoutError) and timeout < config.LLM_TIMEOUT:
+                budget_stats.record("llm", "timed_out")
+            if cut_by_deadline and isinstance(e, asyncio.TimeoutError):
+                if elapsed >= llm_breaker.slow_call_seconds:
+                    llm_breaker.record(elapsed, ok=True)
+                else:
+                    llm_breaker.abandon()
+            else:
+                llm_breaker.record(elapsed, ok=False)
+                if route is not None:
+                    self.router.record(route, elapsed, None, ok=False)
+            logger.warning("Groq agent call failed", extra={"error": repr(e), "breaker": llm_breaker.state})
+            if streamed:
+                # Part of a reply went out; the fallback replaces it
+                listener(None)
+            return None
+        elapsed = time.perf_counter() - started
+        if deadline is not None:
+            deadline.observe("llm", elapsed)
+        llm_breaker.record(elapsed, ok=True)
+        if route is not None:
+            self.router.record(route, elapsed, getattr(response, "usage_metadata", None))
+        return response
+    
+    def _count_cancelled_call(self, route: Optional[Route], elapsed: float):
+        """Estimate what an abandoned LLM call would still have cost, from the route's recent calls"""
+        self.cancellations["llm_calls"] += 1
+        if route is None:
+            return
+        seconds, output_tokens = self.router.expected(route)
+        if seconds is None:
+            return
+        remaining = max(0.0, 1 - elapsed / seconds) if seconds else 0.0
+        self.cancellations["seconds_saved"] += max(0.0, seconds - elapsed)
+        self.cancellations["output_tokens_saved"] += output_tokens * remaining
+    
+    def _degraded_turn(self, state: AgentState, listener: Optional[Callable[[str], None]]) -> AgentState:
+        """
+        Answer without the LLM (breaker open, no time left or call failed): the matching
+        prompt template filled from the retrieved knowledge. Extraction and
+        lead capture run as usual, so the funnel keeps moving. Classifies the
+        message locally, so it is run in a worker thread.
+        """
+        intent, reply = degraded_reply(state)
+        reply = reply or "I'm here to help! What would you like to know about our video editing plans?"
+        self.degraded_replies += 1
+        return self._answer_turn(state, listener, intent, reply)
+    
+    def _answer_turn(self, state: AgentState, listener: Optional[Callable[[str], None]],
+                     intent: str, reply: str) -> AgentState:
+        """Finish a turn whose reply did not come from the LLM: send it, then move the funnel"""
+        current_conv_state = state.get('conversation_state', 'DISCOVERY')
+        if listener is not None:
+            listener(reply)
+        
+        new_conv_state = self._determine_next_state(
+            current_conv_state, intent, set(state.get("turn_keywords", [])), state
+        )
+        funnel_stats.transition(
+            state.get("session_id"), current_conv_state, new_conv_state,
+            state.get("selected_plan"), state.get("platform")
+        )
+        return {
+            "messages": [AIMessage(content=reply, id=str(uuid.uuid4()))],
+            "intent": intent,
+            "turn_count": state.get("turn_count", 0) + 1,
+            "conversation_state": new_conv_state
+        }
+    
+    async def _stream_reply(self, llm, prompt: list, listener: Callable[[str], None]) -> AIMessage:
+        """Stream the LLM reply to `listener` (tags removed) and return the whole message"""
+        tag_filter = ReplyTagFilter()
+        chunks = []
+        async for chunk in llm.astream(prompt):
+            chunks.append(chunk)
+            text = tag_filter.feed(chunk.content)
+            if text:
+                listener(text)
+        tail = tag_filter.flush()
+        if tail:
+            listener(tail)
+        if not chunks:
+            return AIMessage(content="")
+        # One merge at the end (adding chunk by chunk re-merges the whole message each time)
+        return add_ai_message_chunks(chunks[0], *chunks[1:])
+    
+    def _route_after_respond(self, state: AgentState) -> List[str]:
+        """Check for Lead Capture trigger and a channel analysis to attach"""
+        stages = []
+        if lead_executor.should_capture_lead(state):
+            stages.append("lead_capture")
+        if state.get("yt_channel") and not state.get("yt_analysis_done"):
+            stages.append("enrich")
+        return stages or [END]
+    
+    def _quick_reply_node(self, state: AgentState) -> AgentState:
+        """Precomputed reply to a quick-reply button, with the context it was written from"""
+        entry = quick_replies.lookup(state)
+        updates = self._answer_turn(state, reply_listener.get(), entry["intent"], entry["reply"])
+        updates["retrieved_context"] = entry["retrieved_context"]
+        return updates
+    
+    async def precompute_reply(self, message: str, conversation_state: str) -> Optional[dict]:
+        """
+        What a turn would answer to `message` in `conversation_state` with
+        nothing else known about the user, without touching any session
+        (for app.agent.quick_replies)
+        
+        Returns:
+            The state fields the prompt was built from, retrieved context,
+            reply, intent and model; None where retrieval would be skipped
+        """
+        state: Dict[str, Any] = {
+            "messages": [HumanMessage(content=message)],
+            "conversation_state": conversation_state
+        }
+        state.update(await self._extract_node(state))
+        if not rag_pipeline.should_retrieve(state):
+            return None
+        state["retrieved_context"] = await asyncio.to_thread(rag_pipeline.retrieve_context, message)
+        if self.llm is None:
+            route, _ = await asyncio.to_thread(self.router.select, state)
+            llm, model = route.llm, route.model
+        else:
+            llm, model = self.llm, "override"
+        response = await asyncio.wait_for(llm.ainvoke(self._reply_prompt(state)), config.LLM_TIMEOUT)
+        intent, reply = parse_reply(response.content)
+        return {
+            "profile": quick_replies.profile(state),
+            "retrieved_context": state["retrieved_context"],
+            "reply": reply,
+            "intent": intent,
+            "model": model
+        }
+    
+    def _close_node(self, state: AgentState) -> AgentState:
+        """FINAL state: the closing message is fixed, so skip retrieval and the LLM"""
+        return {
+            "messages": [AIMessage(content=FINAL_STATE_MESSAGE)],
+            "turn_count": state.get("turn_count", 0) + 1
+        }
+    
+    def _determine_next_state(self, current_state: str, intent: str, signals: Set[str], state: dict) -> str:
+        """
+        Determine next conversation state from the compiled funnel table
+        
+        Args:
+            signals: Keyword/signal categories hit by this turn (see funnel.FUNNEL_SIGNALS)
+        """
+        signals = set(signals)
+        if state.get("lead_captured"):
+            signals.add("lead_captured")
+        return funnel_machine.next_state(current_state, intent, signals)
+    
+    def _fast_extract(self, extraction: ExtractionResult, state: AgentState) -> dict:
+        """Map a single-pass extraction onto state updates"""
         updates = {}
-        low_text = text.lower()
         
         # Email
-        email = re.search(r'[\w\.-]+@[\w\.-]+\.\w+', text)
-        if email and not state.get("email"): updates["email"] = email.group(0)
+        if extraction.email and not state.get("email"):
+            updates["email"] = extraction.email
         
-        # Plan
-        if "pro" in low_text: updates["selected_plan"] = "pro"
-        elif "basic" in low_text: updates["selected_plan"] = "basic"
+        # Plan (whole words only, so "problem" or "product" no longer count as Pro)
+        if extraction.plan:
+            updates["selected_plan"] = extraction.plan
         
         # Platform
-        for p in ["youtube", "tiktok", "instagram"]:
-            if p in low_text and not state.get("platform"):
-                updates["platform"] = p.capitalize()
-                
+        if extraction.platform and not state.get("platform"):
+            updates["platform"] = extraction.platform.capitalize()
+        
         # Name
-        name = re.search(r"(?:my name is|i'm|i am|call me) ([\w\s]+)", low_text)
-        if name and not state.get("name"):
-            updates["name"] = name.group(1).strip().split()[0].capitalize()
-            
+        if extraction.name and not state.get("name"):
+            updates["name"] = extraction.name
+        
         # YouTube Link
-        if "youtube.com" in low_text or "youtu.be" in low_text:
-            yt = re.search(r'(?:https?://)?(?:www\.)?youtube\.com/\S+|youtu\.be/\S+', text)
-            if yt: updates["yt_channel"] = yt.group(0)
-            
+        if extraction.yt_channel:
+            updates["yt_channel"] = extraction.yt_channel
+        
         return updates
+    
+    def run(self, session_id: str, message: str, new_session: bool = False, tenant_id: str = None,
+            profile_id: str = None) -> AgentState:
+        """
+        Execute the optimized graph (blocking, for scripts and tests)
+        
+        Pass profile_id to write a profile of the turn under that name
+        (see app.profiling).
+        """
+        if profile_id is None:
+            return asyncio.run(self.arun(session_id, message, new_session, tenant_id))
+        
+        async def profiled():
+            async with request_profiler.profile(profile_id, session_id):
+                return await self.arun(session_id, message, new_session, tenant_id)
+        return asyncio.run(profiled())
+    
+    async def arun(self, session_id: str, message: str, new_session: bool = False, tenant_id: str = None,
+                   on_token: Callable[[Optional[str]], None] = None) -> AgentState:
+        """
+        Run one turn on the running event loop
+        
+        Only the new user message is sent in; the rest of the session's
+        state is loaded from the checkpointer, and a single checkpoint with
+        just the channels this turn changed is written when the turn ends.
+        
+        Args:
+            session_id: Session (checkpoint thread) identifier
+            message: User message
+            new_session: Seed session metadata on the first turn
+            tenant_id: Tenant the session belongs to (recorded on the first turn)
+            on_token: Called with reply text as the LLM streams it (tags removed),
+                and with None when the call fails mid-stream: the text sent so
+                far is void and the fallback reply follows. May be called from
+                a worker thread (replies that do not come from the LLM).
+        
+        The turn runs within the caller's current_deadline, or a new
+        TURN_DEADLINE_MS one when none is set.
+        
+        Returns:
+            Full session state after the turn
+        """
+        turn_input: Dict[str, Any] = {"messages": [HumanMessage(content=message)]}
+        if new_session:
+            turn_input["session_id"] = session_id
+            turn_input["tenant_id"] = tenant_id or "default"
+            funnel_stats.start_session(session_id)
+        
+        graph = await self._compiled_graph()
+        
+        # Tag the run's checkpoint so an abandoned turn can be told apart from the one before it
+        turn_id = uuid.uuid4().hex
+        run_config = {**session_store.thread_config(session_id), "metadata": {"turn_id": turn_id}}
+        
+        deadline = current_deadline.get() or Deadline.for_request()
+        deadline_token = current_deadline.set(deadline)
+        timer = StageTimer()
+        token = current_timer.set(timer)
+        listener_token = reply_listener.set(on_token)
+        started_tasks: list = []
+        tasks_token = turn_tasks.set(started_tasks)
+        intent = "error"
+        try:
+            result = await graph.ainvoke(turn_input, run_config, durability="exit")
+            session_store.record_turn(session_id, result.get("turn_count", 0))
+            intent = result.get("intent") or "greeting"
+            return result
+        except asyncio.CancelledError:
+            intent = "cancelled"
+            self.cancellations["turns"] += 1
+            for task in started_tasks:
+                youtube_analyzer.discard(task)
+            await asyncio.shield(self._record_abandoned_turn(graph, session_id, turn_id, turn_input))
+            raise
+        finally:
+            turn_tasks.reset(tasks_token)
+            reply_listener.reset(listener_token)
+            current_timer.reset(token)
+            current_deadline.reset(deadline_token)
+            if intent != "cancelled":
+                deadline.observe("turn", time.monotonic() - deadline.started)
+            timing = timer.finish()
+            pipeline_timings.record(timing)
+            record_turn(timing, intent, timer.conversation_state or "DISCOVERY")
+    
+    async def _record_abandoned_turn(self, graph, session_id: str, turn_id: str, turn_input: dict):
+        """
+        Leave a cancelled turn as just the user's input
+        
+        On cancellation the graph still checkpoints whatever nodes finished,
+        which can include a reply nobody saw. That checkpoint is superseded
+        by one branched from the turn's starting point holding the turn
+        input and the fields extracted from the message (contact details,
+        plan, channel), so the session shows the user's message and no
+        half-finished assistant turn.
+        """
+        thread = session_store.thread_config(session_id)
+        try:
+            latest = await graph.checkpointer.aget_tuple(thread)
+            base, before = thread, latest
+            if latest is not None and latest.metadata.get("turn_id") == turn_id:
+                if latest.parent_config is None:
+                    # The session's first turn: nothing to branch from
+                    await graph.checkpointer.adelete_thread(session_id)
+                    before = None
+                else:
+                    base = latest.parent_config
+                    before = await graph.checkpointer.aget_tuple(base)
+            previous = before.checkpoint["channel_values"] if before is not None else {}
+            message = turn_input["messages"][-1].content
+            updates = {**self._fast_extract(extraction_engine.extract(message), previous), **turn_input}
+            await graph.aupdate_state(base, updates, as_node=START)
+        except Exception:
+            logger.exception("Could not record abandoned turn", extra={"session_id": session_id})
 
-    def run(self, state: AgentState) -> AgentState:
-        """Execute the optimized graph"""
-        return self.graph.invoke(state)
+    async def attach_analysis(self, session_id: str, analysis: dict):
+        """Save a channel analysis that arrived after its turn, as the enrich node would have"""
+        graph = await self._compiled_graph()
+        await graph.aupdate_state(
+            session_store.thread_config(session_id),
+            {"yt_analysis": analysis, "yt_analysis_done": True},
+            as_node="enrich"
+        )
 
 # Singleton instance
 autostream_graph = AutoStreamGraph()
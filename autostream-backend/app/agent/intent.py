@@ -1,12 +1,20 @@
 """
 Intent Identification Module
-Classifies user intent using Groq LLM
+Classifies user intent locally, escalating to Groq LLM on low confidence
 """
+import json
+import logging
+import time
 from langchain_groq import ChatGroq
 from langchain_core.messages import HumanMessage, SystemMessage
 from app.config import config
 from app.agent.prompts import INTENT_CLASSIFICATION_PROMPT
 from app.agent.state import AgentState
+from app.agent.intent_embedding import embedding_intent_classifier
+from app.agent.metrics import record_llm_usage
+from app.agent.usage import token_ledger, usage_record
+
+logger = logging.getLogger(__name__)
 
 class IntentClassifier:
     """Classifies user intent for conversation routing"""
@@ -19,18 +27,37 @@ class IntentClassifier:
             temperature=0.3,
             max_tokens=10
         )
+        # How often the local classifier answered vs. escalating to the LLM
+        self.counters = {"local": 0, "llm": 0}
     
-    def classify_intent(self, state: AgentState) -> str:
+    def classify_intent(self, state: AgentState, escalate: bool = True) -> str:
         """
         Classify user intent based on conversation context
+        
+        Args:
+            state: Conversation state; its latest message is classified
+            escalate: Ask the LLM when the local classifier is unsure
+                (False keeps the local best guess)
         """
         messages = state.get("messages", [])
         if not messages:
             return "greeting"
         
-        latest_message = messages[-1].content
-        previous_intent = state.get("intent", "greeting")
+        # Local nearest-centroid pass; only unsure messages pay for a Groq call
+        try:
+            intent, _, confident = embedding_intent_classifier.classify(messages[-1].content)
+            if confident or not escalate:
+                self.counters["local"] += 1
+                return intent.lower()
+        except Exception as e:
+            logger.exception("Local intent classification failed")
         
+        return self._escalate(state)
+    
+    def _escalate(self, state: AgentState) -> str:
+        """Classify the latest message with the LLM"""
+        latest_message = state["messages"][-1].content
+        previous_intent = state.get("intent", "greeting")
         context = self._build_context(state)
         
         prompt = INTENT_CLASSIFICATION_PROMPT.format(
@@ -40,7 +67,10 @@ class IntentClassifier:
         )
         
         try:
+            self.counters["llm"] += 1
             response = self.llm.invoke([HumanMessage(content=prompt)])
+            usage = getattr(response, "usage_metadata", None)
+            record_llm_usage("intent", usage)
             intent = response.content.strip().upper()
             
             # Validate against 6 fixed intents
@@ -54,12 +84,100 @@ class IntentClassifier:
                 else:
                     intent = previous_intent
             
+            token_ledger.record(
+                usage_record(usage), intent.lower(), state.get("conversation_state", "DISCOVERY"),
+                state.get("tenant_id") or "default", "intent"
+            )
             return intent.lower()
             
         except Exception as e:
-            print(f"Intent classification error: {e}")
+            logger.exception("Intent classification failed")
             return previous_intent or "greeting"
     
+    def classify_batch(self, messages: list) -> list:
+        """
+        Classify many standalone messages (offline use)
+        
+        Messages are embedded in one batch; only low-confidence ones
+        are escalated to the LLM, one call each, reusing the batch's
+        local result instead of embedding them again.
+        
+        Args:
+            messages: Raw user messages
+            
+        Returns:
+            Lowercase intent per message
+        """
+        results = embedding_intent_classifier.classify_batch(messages)
+        intents = []
+        for message, (intent, _, confident) in zip(messages, results):
+            if confident:
+                self.counters["local"] += 1
+            else:
+                intent = self._escalate({
+                    "messages": [HumanMessage(content=message)],
+                    "intent": intent.lower()
+                })
+            intents.append(intent.lower())
+        return intents
+    
+    def evaluate(self, eval_path: str = None) -> dict:
+        """
+        Report the local classifier against the LLM on a labeled eval set
+        
+        Every message is also sent to the LLM, so this makes one Groq call
+        per example and records into the live stats: run it in its own
+        process.
+        
+        Args:
+            eval_path: JSON list of {"message", "intent"} records
+            
+        Returns:
+            Accuracy of the local pass, the LLM and the combined classifier
+            (local when confident, else LLM), agreement of confident local
+            labels with the LLM, escalation rate and per-message latency
+        """
+        eval_path = eval_path or config.INTENT_EVAL_PATH
+        with open(eval_path, 'r', encoding='utf-8') as f:
+            records = json.load(f)
+        expected = [r["intent"].lower() for r in records]
+        embedding_intent_classifier.warm_up()
+        
+        local, local_ms, llm, llm_ms = [], [], [], []
+        for record in records:
+            start = time.perf_counter()
+            intent, _, confident = embedding_intent_classifier.classify(record["message"])
+            local_ms.append((time.perf_counter() - start) * 1000)
+            local.append((intent.lower(), confident))
+            start = time.perf_counter()
+            llm.append(self._escalate({"messages": [HumanMessage(content=record["message"])]}))
+            llm_ms.append((time.perf_counter() - start) * 1000)
+        
+        combined = [label if confident else llm_label for (label, confident), llm_label in zip(local, llm)]
+        confident = [(label, llm_label) for (label, sure), llm_label in zip(local, llm) if sure]
+        combined_ms = [ms + (0 if sure else llm_time) for ms, (_, sure), llm_time in zip(local_ms, local, llm_ms)]
+        
+        def accuracy(labels: list) -> float:
+            return round(sum(a == b for a, b in zip(labels, expected)) / len(expected), 3)
+        
+        def p50(samples: list) -> float:
+            return round(sorted(samples)[len(samples) // 2], 2)
+        
+        return {
+            "examples": len(records),
+            "local_accuracy": accuracy([label for label, _ in local]),
+            "llm_accuracy": accuracy(llm),
+            "combined_accuracy": accuracy(combined),
+            "escalation_rate": round(1 - len(confident) / len(records), 3),
+            "local_agreement_with_llm": round(
+                sum(a == b for a, b in confident) / len(confident), 3
+            ) if confident else None,
+            "local_ms_p50": p50(local_ms),
+            "llm_ms_p50": p50(llm_ms),
+            "combined_ms_p50": p50(combined_ms),
+            "combined_ms_mean": round(sum(combined_ms) / len(combined_ms), 2)
+        }
+    
     def _build_context(self, state: AgentState) -> str:
         """Build context string from state"""
         context_parts = []
@@ -88,3 +206,7 @@ def classify_intent_node(state: AgentState) -> AgentState:
     """LangGraph node for intent classification"""
     intent = intent_classifier.classify_intent(state)
     return {"intent": intent}
+
+
+if __name__ == "__main__":
+    print(json.dumps(intent_classifier.evaluate(), indent=2))
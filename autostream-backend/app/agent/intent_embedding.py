@@ -0,0 +1,162 @@
+"""
+Local Intent Classifier
+Nearest-centroid classification over MiniLM embeddings shared with the RAG pipeline
+"""
+import json
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from app.config import config
+from app.agent.rag import rag_pipeline
+
+INTENT_LABELS = ["GREETING", "INFO", "PRICING", "COMPARISON", "OBJECTION", "HIGH_INTENT"]
+
+
+class EmbeddingIntentClassifier:
+    """
+    Classifies messages against per-intent centroids of labeled examples.
+    Reuses the sentence-transformers model already loaded by RAGPipeline,
+    so no extra model is kept in memory.
+    """
+
+    def __init__(self, examples_path: str = None):
+        """
+        Args:
+            examples_path: JSON file mapping intent label to example messages
+        """
+        self.examples_path = examples_path or config.INTENT_EXAMPLES_PATH
+        self.min_similarity = config.INTENT_LOCAL_MIN_SIMILARITY
+        self.min_margin = config.INTENT_LOCAL_MIN_MARGIN
+        self.labels: List[str] = []
+        self.centroids: Optional[np.ndarray] = None
+        self._lock = threading.Lock()
+
+    def _ensure_centroids(self):
+        """Embed the labeled examples once, on first use"""
+        if self.centroids is not None:
+            return
+        with self._lock:
+            if self.centroids is not None:
+                return
+
+            with open(self.examples_path, 'r', encoding='utf-8') as f:
+                examples: Dict[str, List[str]] = json.load(f)
+
+            labels = [label for label in INTENT_LABELS if examples.get(label)]
+            centroids = []
+            for label in labels:
+                vectors = self._embed(examples[label])
+                centroid = vectors.mean(axis=0)
+                centroids.append(centroid / np.linalg.norm(centroid))
+
+            self.labels = labels
+            self.centroids = np.vstack(centroids)
+
+    def warm_up(self):
+        """Embed the labeled examples now rather than on the first message"""
+        self._ensure_centroids()
+
+    def _embed(self, texts: List[str]) -> np.ndarray:
+        """Embed texts and L2-normalize each row"""
+        vectors = np.asarray(rag_pipeline.embeddings.embed_documents(texts), dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+    def _score(self, vectors: np.ndarray) -> List[Tuple[str, float, bool]]:
+        """Turn embeddings into (label, confidence, confident) tuples"""
+        similarities = vectors @ self.centroids.T
+        results = []
+        for row in similarities:
+            order = np.argsort(row)[::-1]
+            top = float(row[order[0]])
+            margin = top - float(row[order[1]]) if len(order) > 1 else top
+            confident = top >= self.min_similarity and margin >= self.min_margin
+            results.append((self.labels[order[0]], top, confident))
+        return results
+
+    def classify(self, message: str) -> Tuple[str, float, bool]:
+        """
+        Classify a single message
+
+        Returns:
+            (intent label, cosine similarity to its centroid, whether it clears the thresholds)
+        """
+        return self.classify_batch([message])[0]
+
+    def classify_batch(self, messages: List[str]) -> List[Tuple[str, float, bool]]:
+        """
+        Classify many messages with a single embedding call (offline use)
+
+        Args:
+            messages: Raw user messages
+
+        Returns:
+            One (intent label, confidence, confident) tuple per message
+        """
+        if not messages:
+            return []
+        self._ensure_centroids()
+        return self._score(self._embed(messages))
+
+    def evaluate(self, eval_path: str = None) -> dict:
+        """
+        Report accuracy and latency against a labeled eval set
+
+        Args:
+            eval_path: JSON list of {"message", "intent"} records
+
+        Returns:
+            Report dict with overall, confident-subset and per-intent accuracy
+            plus per-message and batch latency
+        """
+        eval_path = eval_path or config.INTENT_EVAL_PATH
+        with open(eval_path, 'r', encoding='utf-8') as f:
+            records = json.load(f)
+
+        messages = [r["message"] for r in records]
+        expected = [r["intent"].upper() for r in records]
+
+        self._ensure_centroids()
+
+        latencies = []
+        predictions = []
+        for message in messages:
+            start = time.perf_counter()
+            predictions.append(self.classify(message))
+            latencies.append((time.perf_counter() - start) * 1000)
+
+        start = time.perf_counter()
+        self.classify_batch(messages)
+        batch_ms = (time.perf_counter() - start) * 1000
+
+        correct = [p[0] == e for p, e in zip(predictions, expected)]
+        confident = [p[2] for p in predictions]
+        confident_correct = [c for c, ok in zip(correct, confident) if ok]
+
+        per_intent = {}
+        for label in INTENT_LABELS:
+            hits = [c for c, e in zip(correct, expected) if e == label]
+            if hits:
+                per_intent[label] = round(sum(hits) / len(hits), 3)
+
+        latencies.sort()
+        return {
+            "examples": len(records),
+            "accuracy": round(sum(correct) / len(correct), 3),
+            "confident_share": round(sum(confident) / len(confident), 3),
+            "confident_accuracy": round(sum(confident_correct) / len(confident_correct), 3) if confident_correct else None,
+            "llm_escalation_rate": round(1 - sum(confident) / len(confident), 3),
+            "per_intent_accuracy": per_intent,
+            "latency_ms_p50": round(latencies[len(latencies) // 2], 3),
+            "latency_ms_p95": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))], 3),
+            "batch_ms_per_message": round(batch_ms / len(messages), 3),
+        }
+
+
+# Singleton instance
+embedding_intent_classifier = EmbeddingIntentClassifier()
+
+
+if __name__ == "__main__":
+    print(json.dumps(embedding_intent_classifier.evaluate(), indent=2))
@@ -0,0 +1,187 @@
+"""
+Service Metrics
+Counters and histograms rendered in the Prometheus text exposition format
+"""
+import bisect
+import logging
+import threading
+from typing import Callable, Dict, Iterable, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Latency buckets in seconds: sub-millisecond stages up to slow LLM turns
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Iterable[str], values: Iterable[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonic counter with labels"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.label_names = labels
+        self._values: Dict[LabelValues, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, *labels: str):
+        """Add `amount`; label values are positional, in declaration order"""
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}" for key, value in items]
+
+
+class Histogram:
+    """Bucketed distribution with labels (cumulative buckets on render)"""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = (), buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.label_names = labels
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [per-bucket counts (+Inf last), sum, count]
+        self._series: Dict[LabelValues, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str):
+        """Record one observation; label values are positional, in declaration order"""
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = [(key, list(series[0]), series[1], series[2]) for key, series in self._series.items()]
+        lines = []
+        for key, counts, total, count in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.label_names, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.label_names, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.label_names, key)} {count}")
+        return lines
+
+
+# A collector returns (name, type, help, [(labels dict, value), ...]) families read at scrape time
+Collector = Callable[[], List[Tuple[str, str, str, List[Tuple[Dict[str, str], float]]]]]
+
+
+class MetricsRegistry:
+    """Owns the service's metrics and renders them for /metrics"""
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors: List[Collector] = []
+
+    def counter(self, name: str, help: str, labels: Tuple[str, ...] = ()) -> Counter:
+        metric = Counter(name, help, labels)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, help: str, labels: Tuple[str, ...] = (), buckets=DEFAULT_BUCKETS) -> Histogram:
+        metric = Histogram(name, help, labels, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def collector(self, func: Collector) -> Collector:
+        """Register a scrape-time collector for values owned by other components (usable as a decorator)"""
+        self._collectors.append(func)
+        return func
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text format (version 0.0.4)"""
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+        for collect in self._collectors:
+            try:
+                families = collect()
+            except Exception as e:
+                logger.exception("Metrics collector failed")
+                continue
+            for name, kind, help, samples in families:
+                lines.append(f"# HELP {name} {help}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in samples:
+                    lines.append(f"{name}{_format_labels(labels.keys(), labels.values())} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+# Singleton instance
+metrics_registry = MetricsRegistry()
+
+turn_seconds = metrics_registry.histogram(
+    "autostream_turn_seconds", "Wall time of a chat turn", ("intent", "conversation_state")
+)
+stage_seconds = metrics_registry.histogram(
+    "autostream_stage_seconds", "Time spent in one turn stage", ("stage", "intent", "conversation_state")
+)
+llm_tokens = metrics_registry.counter(
+    "autostream_llm_tokens_total", "LLM tokens used", ("source", "kind")
+)
+llm_calls = metrics_registry.counter(
+    "autostream_llm_calls_total", "LLM calls made", ("source",)
+)
+
+
+def record_turn(timing: dict, intent: str, conversation_state: str):
+    """
+    Fold one turn's StageTimer record into the histograms
+
+    Args:
+        timing: StageTimer.finish() output
+        intent: Intent classified on this turn
+        conversation_state: State the turn started in
+    """
+    turn_seconds.observe(timing["wall_ms"] / 1000, intent, conversation_state)
+    for stage, ms in timing["stages_ms"].items():
+        stage_seconds.observe(ms / 1000, stage, intent, conversation_state)
+
+
+def record_llm_usage(source: str, usage: dict):
+    """
+    Count one LLM call and its tokens
+
+    Args:
+        source: Call site ("respond", "intent")
+        usage: LangChain usage_metadata (input_tokens / output_tokens), may be empty
+    """
+    llm_calls.inc(1, source)
+    if usage:
+        llm_tokens.inc(usage.get("input_tokens", 0), source, "input")
+        llm_tokens.inc(usage.get("output_tokens", 0), source, "output")
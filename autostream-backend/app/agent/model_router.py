@@ -0,0 +1,259 @@
+"""
+Model Routing
+Picks the reply model, temperature and token budget per turn from the conversation state and intent
+"""
+import logging
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+from langchain_groq import ChatGroq
+from app.config import config
+from app.agent.intent_embedding import embedding_intent_classifier
+from app.agent.metrics import metrics_registry
+from app.agent.state import AgentState
+
+logger = logging.getLogger(__name__)
+
+# Route name -> model settings. "prices" are USD per million (input, output) tokens.
+ROUTES: Dict[str, dict] = {
+    "fast": {
+        "model": config.GROQ_FAST_MODEL,
+        "temperature": config.FAST_TEMPERATURE,
+        "max_tokens": config.FAST_MAX_TOKENS,
+        "prices": (config.LLM_FAST_INPUT_COST_PER_MTOK, config.LLM_FAST_OUTPUT_COST_PER_MTOK),
+    },
+    "quality": {
+        "model": config.GROQ_MODEL,
+        "temperature": config.TEMPERATURE,
+        "max_tokens": config.MAX_TOKENS,
+        "prices": (config.LLM_INPUT_COST_PER_MTOK, config.LLM_OUTPUT_COST_PER_MTOK),
+    },
+}
+
+# Checked in order; the first rule whose conditions all hold picks the route.
+# "states": conversation state the turn starts in; "signals": extraction
+# signals of this turn (turn_keywords); "intents": local intent of this
+# message, "unknown" when the classifier is unsure. Intents are only
+# classified when a rule asks for them.
+ROUTING_RULES: List[dict] = [
+    # Prices, plan comparison and the plan choice are where the answer sells
+    {"name": "pricing_state", "states": ["PRICING"], "route": "quality"},
+    {"name": "pricing_signal", "signals": ["pricing", "plan_selected"], "route": "quality"},
+    {"name": "sales_intent", "intents": ["pricing", "comparison", "objection", "unknown"], "route": "quality"},
+    # Greetings, discovery small talk, confirmation and contact collection
+    {"name": "default", "route": "fast"},
+]
+
+# Recent call latencies kept per route for percentiles
+_LATENCY_SAMPLES = 1000
+
+route_decisions = metrics_registry.counter(
+    "autostream_llm_route_decisions_total", "Reply model routing decisions", ("route", "rule")
+)
+route_seconds = metrics_registry.histogram(
+    "autostream_llm_route_seconds", "Reply LLM call latency per route", ("route", "model")
+)
+route_tokens = metrics_registry.counter(
+    "autostream_llm_route_tokens_total", "Reply LLM tokens per route", ("route", "kind")
+)
+
+
+class Route:
+    """One model configuration and its client"""
+
+    def __init__(self, name: str, model: str, temperature: float, max_tokens: int,
+                 prices: Tuple[float, float] = None, base_url: str = None):
+        self.name = name
+        self.model = model
+        self.temperature = temperature
+        self.max_tokens = max_tokens
+        self.prices = prices
+        self.base_url = base_url or config.GROQ_BASE_URL or None
+        self.llm = ChatGroq(
+            model_name=model,
+            groq_api_key=config.GROQ_API_KEY,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            base_url=self.base_url
+        )
+
+
+class ModelRouter:
+    """
+    Chooses a Route for each reply from ROUTING_RULES.
+
+    Decisions cost a few dict lookups, plus one local intent
+    classification (an embedding, no LLM call) on turns that reach an
+    intent rule; that blocks, so async callers run select() in a worker
+    thread. Decisions per rule and per-route latency and tokens go to
+    /metrics and /api/stats for tuning.
+    """
+
+    def __init__(self, routes: Dict[str, dict] = None, rules: List[dict] = None, enabled: bool = None):
+        """
+        Args:
+            routes: Route name -> {"model", "temperature", "max_tokens", "prices", "base_url"?}
+            rules: Ordered, named rules (see ROUTING_RULES); the last should match everything
+            enabled: False sends every turn to the "quality" route
+        """
+        self.routes = {name: Route(name, **settings) for name, settings in (routes or ROUTES).items()}
+        self.rules = rules or ROUTING_RULES
+        for rule in self.rules:
+            if rule["route"] not in self.routes:
+                raise ValueError(f"Routing rule uses unknown route {rule['route']!r}")
+        self.enabled = config.MODEL_ROUTING if enabled is None else enabled
+        self._lock = threading.Lock()
+        self.stats_by_route: Dict[str, dict] = {
+            name: {"decisions": 0, "calls": 0, "errors": 0, "input_tokens": 0, "output_tokens": 0,
+                   "latency_ms": deque(maxlen=_LATENCY_SAMPLES)}
+            for name in self.routes
+        }
+        self.decisions_by_rule: Dict[str, int] = {}
+
+    @staticmethod
+    def _intent(state: AgentState) -> str:
+        messages = state.get("messages", [])
+        if not messages:
+            return "unknown"
+        try:
+            intent, _, confident = embedding_intent_classifier.classify(messages[-1].content)
+        except Exception:
+            logger.exception("Local intent classification failed")
+            return "unknown"
+        return intent.lower() if confident else "unknown"
+
+    def select(self, state: AgentState) -> Tuple[Route, str]:
+        """
+        Route for the reply to the latest message
+
+        Returns:
+            (route, name of the deciding rule)
+        """
+        if not self.enabled:
+            route, label = self.routes["quality"], "disabled"
+        else:
+            conversation_state = state.get("conversation_state", "DISCOVERY")
+            signals = set(state.get("turn_keywords", []))
+            intent = None
+            route, label = self.routes[self.rules[-1]["route"]], self.rules[-1]["name"]
+            for rule in self.rules:
+                if "states" in rule and conversation_state not in rule["states"]:
+                    continue
+                if "signals" in rule and not signals.intersection(rule["signals"]):
+                    continue
+                if "intents" in rule:
+                    if intent is None:
+                        intent = self._intent(state)
+                    if intent not in rule["intents"]:
+                        continue
+                route, label = self.routes[rule["route"]], rule["name"]
+                break
+
+        route_decisions.inc(1, route.name, label)
+        with self._lock:
+            self.stats_by_route[route.name]["decisions"] += 1
+            self.decisions_by_rule[label] = self.decisions_by_rule.get(label, 0) + 1
+        return route, label
+
+    def record(self, route: Route, seconds: float, usage: Optional[dict], ok: bool = True):
+        """Latency and tokens of one call made on a route"""
+        route_seconds.observe(seconds, route.name, route.model)
+        usage = usage or {}
+        input_tokens = int(usage.get("input_tokens", 0) or 0)
+        output_tokens = int(usage.get("output_tokens", 0) or 0)
+        route_tokens.inc(input_tokens, route.name, "input")
+        route_tokens.inc(output_tokens, route.name, "output")
+        with self._lock:
+            stats = self.stats_by_route[route.name]
+            stats["calls"] += 1
+            stats["errors"] += not ok
+            stats["input_tokens"] += input_tokens
+            stats["output_tokens"] += output_tokens
+            stats["latency_ms"].append(seconds * 1000)
+
+    def expected(self, route: Route) -> Tuple[Optional[float], Optional[float]]:
+        """Typical (seconds, output tokens) of a call on route, from recent calls (None until there are some)"""
+        with self._lock:
+            stats = self.stats_by_route[route.name]
+            latencies = sorted(stats["latency_ms"])
+            if not latencies or not stats["calls"]:
+                return None, None
+            return latencies[len(latencies) // 2] / 1000, stats["output_tokens"] / stats["calls"]
+
+    def stats(self) -> dict:
+        """Per route: model, decisions, calls, tokens and recent latency percentiles"""
+        with self._lock:
+            routes = {}
+            for name, stats in self.stats_by_route.items():
+                latencies = sorted(stats["latency_ms"])
+                routes[name] = {
+                    "model": self.routes[name].model,
+                    **{key: value for key, value in stats.items() if key != "latency_ms"},
+                    "avg_output_tokens": round(stats["output_tokens"] / stats["calls"], 1) if stats["calls"] else None,
+                    "latency_p50_ms": round(latencies[len(latencies) // 2], 2) if latencies else None,
+                    "latency_p95_ms": round(latencies[int(len(latencies) * 0.95)], 2) if latencies else None
+                }
+            return {"enabled": self.enabled, "routes": routes, "decisions_by_rule": dict(self.decisions_by_rule)}
+
+
+# Singleton instance
+model_router = ModelRouter()
+
+
+def stand_in_app(seconds_per_token: Dict[str, float] = None, first_token_seconds: Dict[str, float] = None,
+                 reply: str = None, failing: Tuple[str, ...] = ()):
+    """
+    OpenAI-compatible chat completions server standing in for Groq
+    (serve it and set GROQ_BASE_URL to its address, or hand it to an
+    httpx.ASGITransport)
+
+    Latency per model is first_token_seconds + seconds_per_token * output
+    tokens, where output tokens are min(max_tokens, reply length in words).
+    Models in failing answer 503, like an overloaded provider.
+    """
+    import asyncio
+    import uuid
+    from fastapi import FastAPI, Request
+    from fastapi.responses import JSONResponse
+
+    seconds_per_token = seconds_per_token or {}
+    first_token_seconds = first_token_seconds or {}
+    reply = reply or ("INTENT: pricing STATE: PRICING Great question. Basic is 29 dollars a month for 10 "
+                      "videos in 720p, and Pro is 79 dollars a month with unlimited videos, 4K and AI "
+                      "captions. How many videos do you make a month?")
+    app = FastAPI()
+
+    @app.post("/openai/v1/chat/completions")
+    async def completions(request: Request):
+        body = await request.json()
+        model = body.get("model", "")
+        if model in failing:
+            return JSONResponse(status_code=503, content={"error": {
+                "message": f"{model} is over capacity", "type": "service_unavailable"}})
+        words = reply.split()
+        output_tokens = min(len(words), body.get("max_tokens") or len(words))
+        prompt_tokens = sum(len(str(m.get("content", "")).split()) for m in body.get("messages", []))
+        await asyncio.sleep(first_token_seconds.get(model, 0.0) + seconds_per_token.get(model, 0.0) * output_tokens)
+        return {
+            "id": f"chatcmpl-{uuid.uuid4().hex}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": " ".join(words[:output_tokens])}}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": output_tokens,
+                      "total_tokens": prompt_tokens + output_tokens}
+        }
+
+    return app
+
+
+if __name__ == "__main__":
+    import argparse
+    import uvicorn
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--stand-in", type=int, metavar="PORT", required=True,
+                        help="Serve the stand-in Groq API on PORT (the benchmark is python -m bench.model_router)")
+    args = parser.parse_args()
+    uvicorn.run(stand_in_app(), host="127.0.0.1", port=args.stand_in)
@@ -80,7 +80,8 @@ NOT high-intent:
 - Okay - acknowledging
 - Interesting - still exploring
 
-Tag response with INTENT type and STATE type
+Start every response with its tags, before the reply text:
+INTENT: type STATE: type
 
 KNOWLEDGE BASE - RAG Only:
 Basic Plan:
@@ -181,6 +182,9 @@ NEVER:
 
 Respond naturally. Move forward. One action per turn. Transition states explicitly."""
 
+# Fixed closing message once the lead is captured (FINAL state)
+FINAL_STATE_MESSAGE = "Thanks for sharing your details. Our team will review your information and reach out to you shortly to help you get started with AutoStream. Looking forward to supporting your content journey."
+
 # Intent classification
 INTENT_CLASSIFICATION_PROMPT = """Classify using MULTI-LAYER DETECTION:
 
@@ -0,0 +1,224 @@
+"""
+Quick Reply Cache
+Replies to the frontend's quick-reply buttons, precomputed per conversation state into a versioned artifact
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+from app.config import config
+from app.agent.metrics import metrics_registry
+from app.agent.model_router import ROUTING_RULES, ROUTES
+from app.agent.prompts import SYSTEM_PROMPT
+from app.agent.state import AgentState
+
+logger = logging.getLogger(__name__)
+
+# Bumped when the artifact layout changes
+ARTIFACT_FORMAT = 1
+
+# State fields the reply prompt is built from; an entry is served only when all match
+PROFILE_FIELDS = ("conversation_state", "name", "email", "platform", "selected_plan")
+
+quick_reply_lookups = metrics_registry.counter(
+    "autostream_quick_replies_total", "Quick-reply button messages by outcome (hit: no retrieval or LLM)",
+    ("outcome",)
+)
+
+
+def normalize(message: str) -> str:
+    """Button text as matched: case and spacing ignored"""
+    return " ".join(message.lower().split())
+
+
+class QuickReplyCache:
+    """
+    Serves the button texts of the frontend's QuickReplies component
+    (mirrored in app/data/quick_replies.json) without retrieval or the LLM.
+
+    For each button text and listed conversation state, the build runs the
+    real pipeline once (extraction, retrieval, routed model) from a session
+    that knows nothing else about the user, and stores the retrieved
+    context, reply and intent. A turn is answered from the artifact only
+    when its state after extraction matches the one the entry was built
+    from, so the reply is the one the prompt would have produced.
+
+    The artifact's version hashes everything the replies depend on (the
+    knowledge base, system prompt, models, retrieval settings and button
+    list); an artifact with another version is ignored and rebuilt.
+    """
+
+    def __init__(self, source_path: str = None, artifact_path: str = None, enabled: bool = None):
+        self.source_path = source_path or config.QUICK_REPLIES_SOURCE_PATH
+        self.artifact_path = artifact_path or config.QUICK_REPLIES_ARTIFACT_PATH
+        self.enabled = config.QUICK_REPLIES_ENABLED if enabled is None else enabled
+        with open(self.source_path, "r", encoding="utf-8") as f:
+            source = json.load(f)
+        self.messages: List[str] = source["messages"]
+        self.states: List[str] = source["states"]
+        self._texts = {normalize(message) for message in self.messages}
+        self._entries: Dict[Tuple, dict] = {}
+        self._build_task: Optional[asyncio.Task] = None
+        self.loaded_version: Optional[str] = None
+        self.built_at: Optional[float] = None
+        self.counters = {"hits": 0, "misses": 0}
+        self.version = self._version()
+
+    def _version(self) -> str:
+        """Hash of every input the precomputed replies depend on"""
+        digest = hashlib.sha256()
+        with open(config.KNOWLEDGE_BASE_PATH, "rb") as f:
+            digest.update(f.read())
+        digest.update(SYSTEM_PROMPT.encode("utf-8"))
+        digest.update(json.dumps({
+            "format": ARTIFACT_FORMAT,
+            "messages": self.messages,
+            "states": self.states,
+            "routing": config.MODEL_ROUTING,
+            "rules": ROUTING_RULES,
+            "routes": {name: [route["model"], route["temperature"], route["max_tokens"]] for name, route in ROUTES.items()},
+            "retrieval": [config.EMBEDDING_MODEL, config.CHUNK_SIZE, config.CHUNK_OVERLAP, config.TOP_K_RESULTS]
+        }, sort_keys=True, default=str).encode("utf-8"))
+        return digest.hexdigest()[:16]
+
+    @staticmethod
+    def profile(state: AgentState) -> dict:
+        """The prompt-relevant fields of a state"""
+        profile = {field: state.get(field) for field in PROFILE_FIELDS}
+        profile["conversation_state"] = profile["conversation_state"] or "DISCOVERY"
+        return profile
+
+    @staticmethod
+    def _key(message: str, profile: dict) -> Tuple:
+        return (normalize(message),) + tuple(profile[field] for field in PROFILE_FIELDS)
+
+    def _install(self, artifact: dict):
+        self._entries = {self._key(entry["message"], entry["profile"]): entry for entry in artifact["entries"]}
+        self.loaded_version = artifact["version"]
+        self.built_at = artifact.get("built_at")
+
+    def load(self) -> bool:
+        """
+        Load the artifact if it exists and matches the current version
+
+        Returns:
+            False when it is missing or stale (nothing is served until a build)
+        """
+        if not self.enabled:
+            return True
+        try:
+            with open(self.artifact_path, "r", encoding="utf-8") as f:
+                artifact = json.load(f)
+        except FileNotFoundError:
+            logger.info("No quick reply artifact", extra={"path": self.artifact_path})
+            return False
+        if artifact.get("version") != self.version:
+            logger.info("Quick reply artifact is stale", extra={
+                "artifact_version": artifact.get("version"), "version": self.version
+            })
+            return False
+        self._install(artifact)
+        logger.info("Quick replies loaded", extra={"entries": len(self._entries), "version": self.version})
+        return True
+
+    async def build(self, graph) -> int:
+        """
+        Precompute every button text in every listed state, write the
+        artifact (atomically) and start serving it
+
+        When a precompute fails the entries that worked are served but not
+        written, so the next start (or build) tries again.
+
+        Args:
+            graph: AutoStreamGraph whose precompute_reply runs the pipeline
+
+        Returns:
+            Entries built
+        """
+        entries = []
+        failed = 0
+        for message in self.messages:
+            for conversation_state in self.states:
+                try:
+                    entry = await graph.precompute_reply(message, conversation_state)
+                except Exception:
+                    logger.exception("Quick reply precompute failed", extra={
+                        "quick_reply": message, "conversation_state": conversation_state
+                    })
+                    failed += 1
+                    continue
+                if entry is not None:
+                    entries.append({"message": message, **entry})
+
+        artifact = {"version": self.version, "built_at": time.time(), "entries": entries}
+        if not failed:
+            tmp_path = f"{self.artifact_path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(artifact, f, indent=2)
+            os.replace(tmp_path, self.artifact_path)
+        self._install(artifact)
+        logger.info("Quick replies built", extra={
+            "entries": len(entries), "failed": failed, "saved": not failed, "version": self.version
+        })
+        return len(entries)
+
+    def start_build(self, graph):
+        """Build in the background on the running loop (startup with a missing or stale artifact)"""
+        if not self.enabled or (self._build_task is not None and not self._build_task.done()):
+            return
+        self._build_task = asyncio.create_task(self.build(graph))
+        self._build_task.add_done_callback(self._build_done)
+
+    @staticmethod
+    def _build_done(task: asyncio.Task):
+        if not task.cancelled() and task.exception() is not None:
+            logger.error("Quick reply build failed", exc_info=task.exception())
+
+    def lookup(self, state: AgentState) -> Optional[dict]:
+        """Entry for the latest message in this state, if one was precomputed"""
+        messages = state.get("messages")
+        if not self._entries or not messages:
+            return None
+        return self._entries.get(self._key(messages[-1].content, self.profile(state)))
+
+    def should_serve(self, state: AgentState) -> bool:
+        """Whether this turn is answered from the artifact (counted for button texts only)"""
+        messages = state.get("messages")
+        if not self._entries or not messages or normalize(messages[-1].content) not in self._texts:
+            return False
+        hit = self.lookup(state) is not None
+        outcome = "hits" if hit else "misses"
+        self.counters[outcome] += 1
+        quick_reply_lookups.inc(1, outcome[:-1])
+        return hit
+
+    def stats(self) -> dict:
+        """Artifact version, entries and hit counts"""
+        return {
+            "enabled": self.enabled,
+            "version": self.version,
+            "loaded_version": self.loaded_version,
+            "built_at": self.built_at,
+            "entries": len(self._entries),
+            "building": self._build_task is not None and not self._build_task.done(),
+            **self.counters
+        }
+
+
+# Singleton instance
+quick_replies = QuickReplyCache()
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--build", action="store_true", help="Build the artifact (calls the LLM)")
+    args = parser.parse_args()
+    if not args.build:
+        parser.error("nothing to do without --build (the benchmark is python -m bench.quick_replies)")
+    from app.agent.graph import autostream_graph
+    count = asyncio.run(quick_replies.build(autostream_graph))
+    print(json.dumps({"entries": count, "version": quick_replies.version, "path": quick_replies.artifact_path}))
@@ -2,7 +2,10 @@
 RAG Pipeline for Knowledge Retrieval
 Uses FAISS vector store with Gemini embeddings
 """
+import logging
 import os
+import threading
+from collections import OrderedDict
 from typing import List
 from langchain_huggingface import HuggingFaceEmbeddings
 from langchain_community.vectorstores import FAISS
@@ -11,6 +14,8 @@ from langchain_core.documents import Document
 from app.config import config
 from app.agent.state import AgentState
 
+logger = logging.getLogger(__name__)
+
 class RAGPipeline:
     """RAG pipeline for retrieving knowledge base context"""
     
@@ -20,6 +25,8 @@ class RAGPipeline:
             model_name=config.EMBEDDING_MODEL
         )
         self.vector_store = None
+        self._query_vectors: OrderedDict[str, List[float]] = OrderedDict()
+        self._query_lock = threading.Lock()
         self._initialize_vector_store()
     
     def _initialize_vector_store(self):
@@ -29,7 +36,7 @@ class RAGPipeline:
             kb_path = config.KNOWLEDGE_BASE_PATH
             
             if not os.path.exists(kb_path):
-                print(f"Warning: Knowledge base not found at {kb_path}")
+                logger.warning("Knowledge base not found", extra={"path": kb_path})
                 return
             
             with open(kb_path, 'r', encoding='utf-8') as f:
@@ -56,12 +63,45 @@ class RAGPipeline:
                 embedding=self.embeddings
             )
             
-            print(f"✓ Vector store initialized with {len(documents)} chunks")
+            logger.info("Vector store initialized", extra={"chunks": len(documents)})
             
         except Exception as e:
-            print(f"Error initializing vector store: {e}")
+            logger.exception("Vector store initialization failed")
             self.vector_store = None
     
+    def prepare_for_fork(self):
+        """
+        Make the model and index ready to be shared read-only by forked workers
+        
+        Switches the model to inference (no autograd state is ever written
+        to the weights) and runs one query so lazily built buffers and
+        caches are created here, once, rather than privately in every worker.
+        """
+        client = getattr(self.embeddings, "_client", None)
+        if client is not None:
+            client.eval()
+            for parameter in client.parameters():
+                parameter.requires_grad_(False)
+        if self.vector_store:
+            self.vector_store.similarity_search("warm up", k=1)
+    
+    def embed_query(self, query: str) -> List[float]:
+        """
+        Query embedding, reused when the same text is embedded again within
+        a turn (the FAQ index and retrieval both embed the user's message)
+        """
+        with self._query_lock:
+            vector = self._query_vectors.get(query)
+            if vector is not None:
+                self._query_vectors.move_to_end(query)
+                return vector
+        vector = self.embeddings.embed_query(query)
+        with self._query_lock:
+            self._query_vectors[query] = vector
+            while len(self._query_vectors) > config.QUERY_EMBEDDING_CACHE_SIZE:
+                self._query_vectors.popitem(last=False)
+        return vector
+    
     def retrieve_context(self, query: str, k: int = None) -> str:
         """
         Retrieve relevant context from knowledge base
@@ -81,7 +121,7 @@ class RAGPipeline:
         
         try:
             # Retrieve relevant documents
-            docs = self.vector_store.similarity_search(query, k=k)
+            docs = self.vector_store.similarity_search_by_vector(self.embed_query(query), k=k)
             
             # Format context
             context_parts = []
@@ -91,12 +131,16 @@ class RAGPipeline:
             return "\n\n".join(context_parts)
             
         except Exception as e:
-            print(f"RAG retrieval error: {e}")
+            logger.exception("RAG retrieval failed")
             return "Unable to retrieve context at this time."
     
     def should_retrieve(self, state: AgentState) -> bool:
         """
-        Determine if RAG retrieval is needed based on intent
+        Determine if RAG retrieval is needed based on conversation state
+        
+        Once the user is qualified the agent is only collecting contact
+        details (or closing), so the knowledge base adds nothing and the
+        previous turn's context is reused.
         
         Args:
             state: Current agent state
@@ -104,10 +148,7 @@ class RAGPipeline:
         Returns:
             True if retrieval should happen
         """
-        intent = state.get("intent", "")
-        
-        # Retrieve for product/pricing questions
-        return intent in ["product_pricing", "greeting"]
+        return state.get("conversation_state", "DISCOVERY") not in ("QUALIFIED", "FINAL")
 
 # Singleton instance
 rag_pipeline = RAGPipeline()
@@ -123,14 +164,14 @@ def rag_retrieval_node(state: AgentState) -> AgentState:
     Returns:
         Updated state with retrieved context
     """
-    # Check if retrieval is needed
+    # Check if retrieval is needed (keep the previous context otherwise)
     if not rag_pipeline.should_retrieve(state):
-        return {"retrieved_context": None}
+        return {}
     
     # Get latest message
     messages = state.get("messages", [])
     if not messages:
-        return {"retrieved_context": None}
+        return {}
     
     latest_message = messages[-1].content
     
@@ -3,8 +3,20 @@ Agent State Schema for LangGraph
 Defines the stateful structure for conversation tracking
 """
 from typing import TypedDict, List, Optional, Annotated
-import operator
 from langchain_core.messages import BaseMessage
+from langgraph.graph.message import add_messages
+from app.config import config
+from app.agent.usage import add_usage
+
+
+def add_messages_window(left: List[BaseMessage], right: List[BaseMessage]) -> List[BaseMessage]:
+    """
+    Append new messages (replacing any with a matching id) and keep
+    only the last MAX_CONVERSATION_TURNS turns to prevent memory bloat
+    """
+    merged = add_messages(left, right)
+    return merged[-(config.MAX_CONVERSATION_TURNS * 2):]
+
 
 class AgentState(TypedDict):
     """
@@ -12,7 +24,7 @@ class AgentState(TypedDict):
     Maintains conversation context and lead qualification progress
     """
     # Conversation history
-    messages: Annotated[List[BaseMessage], operator.add]
+    messages: Annotated[List[BaseMessage], add_messages_window]
     
     # Intent classification
     intent: str  # "greeting", "info", "pricing", "comparison", "objection", "high_intent"
@@ -29,12 +41,28 @@ class AgentState(TypedDict):
     platform: Optional[str]  # "YouTube", "Twitch", etc.
     yt_channel: Optional[str]
     
+    # YouTube channel analysis
+    yt_analysis: Optional[dict]
+    yt_analysis_done: bool
+    yt_permission_asked: bool
+    show_youtube_permission: bool  # True only on the turn the channel is first seen
+    
+    # Keyword/signal categories hit by the current turn's message
+    turn_keywords: List[str]
+    
     # Lead qualification status
     lead_captured: bool
     
     # Session metadata
     session_id: str
+    tenant_id: str
     turn_count: int
     
+    # LLM token usage and cost summed over the session
+    token_usage: Annotated[dict, add_usage]
+    
     # RAG context
     retrieved_context: Optional[str]
+    
+    # FAQ entry answering this turn's message directly (set during retrieval)
+    faq_match: Optional[str]
@@ -0,0 +1,145 @@
+"""
+Stage Timing
+Per-stage latency tracking for the agent turn pipeline
+"""
+import asyncio
+import functools
+import inspect
+import threading
+import time
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from app.profiling import track_task, track_thread
+
+
+class StageTimer:
+    """
+    Records how long each stage of a single turn took.
+    Stages may overlap, so stage times need not add up to the turn's
+    wall time.
+    
+    Each stage is also kept as a span (start offset and duration within
+    the turn), and the conversation state the turn started in is noted
+    so stage metrics can be broken down by it.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages: Dict[str, float] = {}
+        self.spans: List[Tuple[str, float, float]] = []
+        self.conversation_state: Optional[str] = None
+
+    def _close(self, stage: str, start: float):
+        end = time.perf_counter()
+        self.stages[stage] = (end - start) * 1000
+        self.spans.append((stage, (start - self.started) * 1000, (end - start) * 1000))
+
+    def note_state(self, state: dict):
+        """Remember the conversation state the turn started in (first call wins)"""
+        if self.conversation_state is None:
+            self.conversation_state = state.get("conversation_state", "DISCOVERY")
+
+    def run(self, stage: str, func: Callable, *args) -> Any:
+        """Run a synchronous stage inline and time it"""
+        start = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            self._close(stage, start)
+
+    async def run_in_thread(self, stage: str, func: Callable, *args) -> Any:
+        """Run a blocking stage in a worker thread and time it"""
+        start = time.perf_counter()
+        try:
+            return await asyncio.to_thread(func, *args)
+        finally:
+            self._close(stage, start)
+
+    async def wait(self, stage: str, awaitable: Awaitable) -> Any:
+        """Await a coroutine stage and time it"""
+        start = time.perf_counter()
+        try:
+            return await awaitable
+        finally:
+            self._close(stage, start)
+
+    def finish(self) -> dict:
+        """Close the timer and return the turn's timing record"""
+        wall_ms = (time.perf_counter() - self.started) * 1000
+        return {
+            "stages_ms": dict(self.stages),
+            "spans": [
+                {"stage": stage, "start_ms": round(start, 3), "duration_ms": round(duration, 3)}
+                for stage, start, duration in self.spans
+            ],
+            "wall_ms": wall_ms
+        }
+
+
+# Timer for the turn currently running (set by AutoStreamGraph.arun)
+current_timer: ContextVar[Optional[StageTimer]] = ContextVar("current_timer", default=None)
+
+
+def timed_node(stage: str, func: Callable) -> Callable:
+    """
+    Wrap a LangGraph node so its run time is recorded as a stage
+    of the current turn (no-op outside a timed turn)
+    """
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(state):
+            track_task()
+            timer = current_timer.get()
+            if timer is None:
+                return await func(state)
+            timer.note_state(state)
+            return await timer.wait(stage, func(state))
+        return async_wrapper
+
+    @functools.wraps(func)
+    def wrapper(state):
+        with track_thread():
+            timer = current_timer.get()
+            if timer is None:
+                return func(state)
+            timer.note_state(state)
+            return timer.run(stage, func, state)
+    return wrapper
+
+
+class PipelineTimings:
+    """Running per-stage latency totals across turns"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.turns = 0
+        self.stage_totals: Dict[str, float] = {}
+        self.stage_counts: Dict[str, int] = {}
+        self.wall_total = 0.0
+
+    def record(self, timing: dict):
+        """Fold one turn's timing record into the totals"""
+        with self._lock:
+            self.turns += 1
+            self.wall_total += timing["wall_ms"]
+            for stage, ms in timing["stages_ms"].items():
+                self.stage_totals[stage] = self.stage_totals.get(stage, 0.0) + ms
+                self.stage_counts[stage] = self.stage_counts.get(stage, 0) + 1
+
+    def summary(self) -> dict:
+        """Average stage latencies and turn wall time"""
+        with self._lock:
+            if not self.turns:
+                return {"turns": 0}
+            return {
+                "turns": self.turns,
+                "avg_stage_ms": {
+                    stage: round(total / self.stage_counts[stage], 2)
+                    for stage, total in self.stage_totals.items()
+                },
+                "avg_wall_ms": round(self.wall_total / self.turns, 2)
+            }
+
+
+# Singleton instance
+pipeline_timings = PipelineTimings()
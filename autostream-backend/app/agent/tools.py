@@ -2,12 +2,23 @@
 Agent Tools - Lead Capture
 Defines tools that the agent can execute
 """
+import logging
+import time
 from typing import Optional
 from langchain.tools import tool
+from langchain_core.messages import AIMessage
 from app.agent.state import AgentState
+from app.agent.prompts import FINAL_STATE_MESSAGE
+from app.leads.outbox import lead_outbox, idempotency_key
+from app.leads.dispatcher import lead_dispatcher
+from app.leads.dedup import lead_dedup
+from app.agent.usage import token_ledger
+from app.agent.funnel_stats import funnel_stats
+
+logger = logging.getLogger(__name__)
 
 @tool
-def capture_lead(name: str, email: str, platform: str, selected_plan: str, yt_channel: Optional[str] = None) -> str:
+def capture_lead(name: str, email: str, platform: str, selected_plan: str, yt_channel: Optional[str] = None, session_id: Optional[str] = None, tenant_id: Optional[str] = None, token_usage: Optional[dict] = None) -> str:
     """
     Capture a qualified lead with their contact information and preferences.
     
@@ -17,26 +28,41 @@ def capture_lead(name: str, email: str, platform: str, selected_plan: str, yt_ch
         platform: Primary content platform (e.g., YouTube, Twitch)
         selected_plan: Selected pricing plan (basic or pro)
         yt_channel: YouTube channel URL (optional)
+        session_id: Conversation the lead came from (optional)
+        tenant_id: Tenant the conversation belongs to (optional)
+        token_usage: LLM tokens and cost spent on the conversation (optional)
     
     Returns:
         Success confirmation message
     """
-    # In production, this would:
-    # 1. Save to CRM/database
-    # 2. Trigger welcome email
-    # 3. Notify sales team
-    # 4. Create HubSpot/Salesforce contact
+    # Only a local durable append happens here; the dispatcher delivers
+    # to the CRM in the background with retries
+    key = idempotency_key(session_id, email)
+    lead = {
+        "name": name,
+        "email": email,
+        "platform": platform,
+        "selected_plan": selected_plan,
+        "yt_channel": yt_channel,
+        "session_id": session_id,
+        "tenant_id": tenant_id or "default",
+        "token_usage": token_usage or {},
+        "captured_at": time.time()
+    }
+    
+    # Same person from another tab or an expired session: update their lead
+    existing_key = lead_dedup.claim(key, email, yt_channel, lead["tenant_id"])
+    if existing_key and lead_outbox.merge(existing_key, lead):
+        lead_dispatcher.notify()
+        return f"Lead updated: {name} ({email}) - {selected_plan} plan (returning lead)"
     
-    print("=" * 60)
-    print("🎯 LEAD CAPTURED SUCCESSFULLY")
-    print("=" * 60)
-    print(f"Name: {name}")
-    print(f"Email: {email}")
-    print(f"Platform: {platform}")
-    print(f"Selected Plan: {selected_plan.upper()}")
-    if yt_channel:
-        print(f"YouTube Channel: {yt_channel}")
-    print("=" * 60)
+    try:
+        lead_outbox.append(lead, key)
+    except Exception:
+        if existing_key is None:
+            lead_dedup.release(key, email, yt_channel, lead["tenant_id"])
+        raise
+    lead_dispatcher.notify()
     
     return f"Lead captured: {name} ({email}) - {selected_plan} plan"
 
@@ -120,15 +146,18 @@ class LeadCaptureExecutor:
                 "email": state["email"],
                 "platform": state["platform"],
                 "selected_plan": state["selected_plan"],
-                "yt_channel": state.get("yt_channel")
+                "yt_channel": state.get("yt_channel"),
+                "session_id": state.get("session_id"),
+                "tenant_id": state.get("tenant_id"),
+                "token_usage": state.get("token_usage")
             })
             
-            print(f"Lead capture result: {result}")
+            logger.info("Lead capture: %s", result)
             
             return {"lead_captured": True}
             
         except Exception as e:
-            print(f"Lead capture error: {e}")
+            logger.exception("Lead capture failed")
             return {"lead_captured": False}
 
 
@@ -140,6 +169,10 @@ def lead_capture_node(state: AgentState) -> AgentState:
     """
     LangGraph node for lead capture execution
     
+    Captures the lead, moves the conversation to FINAL and replaces
+    this turn's reply with the closing message. If the lead could not be
+    stored the state is left as it was, so a later turn tries again.
+    
     Args:
         state: Current agent state
         
@@ -147,8 +180,27 @@ def lead_capture_node(state: AgentState) -> AgentState:
         Updated state with lead capture status
     """
     # Check if we should capture
-    if lead_executor.should_capture_lead(state):
-        return lead_executor.execute_capture(state)
+    if not lead_executor.should_capture_lead(state):
+        return {}
+    
+    result = lead_executor.execute_capture(state)
+    if not result.get("lead_captured"):
+        return result
+    
+    token_ledger.record_lead(state.get("tenant_id") or "default")
+    funnel_stats.transition(
+        state.get("session_id"), state.get("conversation_state", "DISCOVERY"), "FINAL",
+        state.get("selected_plan"), state.get("platform")
+    )
+    
+    updates = {
+        "lead_captured": True,
+        "conversation_state": "FINAL"
+    }
+    
+    # Same id as the reply written by the respond node, so it is replaced rather than appended
+    messages = state.get("messages", [])
+    if messages and isinstance(messages[-1], AIMessage):
+        updates["messages"] = [AIMessage(content=FINAL_STATE_MESSAGE, id=messages[-1].id)]
     
-    # No capture needed
-    return {}
+    return updates
@@ -0,0 +1,174 @@
+"""
+Token Usage Accounting
+Per-call LLM token usage and cost, aggregated per session, intent, conversation state and tenant
+"""
+import threading
+import time
+from typing import Dict, Optional, Tuple
+from app.config import config
+
+# Rolling windows reported by the ledger, in seconds
+WINDOWS = {"5m": 300, "1h": 3600, "24h": 86400}
+
+
+def usage_cost(input_tokens: int, output_tokens: int, prices: Optional[Tuple[float, float]] = None) -> float:
+    """
+    USD cost of a call
+
+    Args:
+        prices: (input, output) USD per million tokens; defaults to the configured main model prices
+    """
+    input_price, output_price = prices or (config.LLM_INPUT_COST_PER_MTOK, config.LLM_OUTPUT_COST_PER_MTOK)
+    return (input_tokens * input_price + output_tokens * output_price) / 1_000_000
+
+
+def usage_record(usage: Optional[dict], prices: Optional[Tuple[float, float]] = None) -> dict:
+    """
+    Normalize LangChain usage_metadata into a session usage record
+
+    Args:
+        prices: Per-million-token prices of the model that made the call (see usage_cost)
+
+    Returns:
+        {"calls", "input_tokens", "output_tokens", "cost_usd"}
+    """
+    usage = usage or {}
+    input_tokens = int(usage.get("input_tokens", 0) or 0)
+    output_tokens = int(usage.get("output_tokens", 0) or 0)
+    return {
+        "calls": 1,
+        "input_tokens": input_tokens,
+        "output_tokens": output_tokens,
+        "cost_usd": usage_cost(input_tokens, output_tokens, prices)
+    }
+
+
+def add_usage(left: Optional[dict], right: Optional[dict]) -> dict:
+    """State reducer: sum usage records (used for the per-session total)"""
+    if not left:
+        return dict(right or {})
+    if not right:
+        return left
+    return {key: left.get(key, 0) + right.get(key, 0) for key in set(left) | set(right)}
+
+
+class RollingCounter:
+    """
+    Sums over trailing time windows using a ring of fixed-width buckets.
+    Each bucket remembers which period it holds, so stale buckets are
+    ignored (and reused) without a background sweep.
+    """
+
+    def __init__(self, bucket_seconds: int = 60, num_buckets: int = 1440):
+        self.bucket_seconds = bucket_seconds
+        self.num_buckets = num_buckets
+        self._periods = [-1] * num_buckets
+        self._values = [[0, 0, 0, 0.0] for _ in range(num_buckets)]  # calls, input, output, cost
+
+    def add(self, record: dict, now: float):
+        period = int(now // self.bucket_seconds)
+        slot = period % self.num_buckets
+        if self._periods[slot] != period:
+            self._periods[slot] = period
+            self._values[slot] = [0, 0, 0, 0.0]
+        values = self._values[slot]
+        values[0] += record["calls"]
+        values[1] += record["input_tokens"]
+        values[2] += record["output_tokens"]
+        values[3] += record["cost_usd"]
+
+    def window(self, seconds: int, now: float) -> dict:
+        """Totals over the trailing `seconds` (bucket-aligned)"""
+        current = int(now // self.bucket_seconds)
+        oldest = current - min(self.num_buckets, -(-seconds // self.bucket_seconds)) + 1
+        totals = [0, 0, 0, 0.0]
+        for period, values in zip(self._periods, self._values):
+            if oldest <= period <= current:
+                for i in range(4):
+                    totals[i] += values[i]
+        return {
+            "calls": totals[0],
+            "input_tokens": totals[1],
+            "output_tokens": totals[2],
+            "cost_usd": round(totals[3], 6)
+        }
+
+
+class TokenLedger:
+    """
+    Process-wide token usage totals by intent, conversation state, tenant
+    and call source, plus rolling windows overall and per tenant.
+
+    Per-session totals live in each session's state (token_usage), so they
+    are persisted by the checkpointer and travel with captured leads.
+    """
+
+    DIMENSIONS = ("intent", "conversation_state", "tenant", "source")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.totals: Dict[str, dict] = {}
+        self.by: Dict[str, Dict[str, dict]] = {dimension: {} for dimension in self.DIMENSIONS}
+        self.window_total = RollingCounter()
+        self.window_by_tenant: Dict[str, RollingCounter] = {}
+        self.leads_captured: Dict[str, int] = {}
+
+    def record(self, record: dict, intent: str, conversation_state: str, tenant: str, source: str):
+        """
+        Add one call's usage record
+
+        Args:
+            record: usage_record() output
+            intent: Intent of the turn the call served
+            conversation_state: Funnel stage the turn started in
+            tenant: Tenant the session belongs to
+            source: Call site ("respond", "intent")
+        """
+        now = time.time()
+        labels = {"intent": intent, "conversation_state": conversation_state, "tenant": tenant, "source": source}
+        with self._lock:
+            self.totals = add_usage(self.totals, record)
+            for dimension, value in labels.items():
+                bucket = self.by[dimension]
+                bucket[value] = add_usage(bucket.get(value), record)
+            self.window_total.add(record, now)
+            tenant_window = self.window_by_tenant.get(tenant)
+            if tenant_window is None:
+                tenant_window = self.window_by_tenant[tenant] = RollingCounter()
+            tenant_window.add(record, now)
+
+    def record_lead(self, tenant: str):
+        """Count a captured lead, for cost per qualified lead"""
+        with self._lock:
+            self.leads_captured[tenant] = self.leads_captured.get(tenant, 0) + 1
+
+    def summary(self) -> dict:
+        """Totals, breakdowns, rolling windows and cost per captured lead"""
+        now = time.time()
+        with self._lock:
+            leads = sum(self.leads_captured.values())
+            total_cost = self.totals.get("cost_usd", 0.0)
+            return {
+                "totals": _rounded(self.totals),
+                **{f"by_{dimension}": {key: _rounded(value) for key, value in self.by[dimension].items()}
+                   for dimension in self.DIMENSIONS},
+                "windows": {name: self.window_total.window(seconds, now) for name, seconds in WINDOWS.items()},
+                "windows_by_tenant": {
+                    tenant: {name: counter.window(seconds, now) for name, seconds in WINDOWS.items()}
+                    for tenant, counter in self.window_by_tenant.items()
+                },
+                "leads_captured": leads,
+                "cost_per_captured_lead_usd": round(total_cost / leads, 6) if leads else None,
+                "cost_per_captured_lead_by_tenant_usd": {
+                    tenant: round(self.by["tenant"].get(tenant, {}).get("cost_usd", 0.0) / count, 6)
+                    for tenant, count in self.leads_captured.items() if count
+                }
+            }
+
+
+def _rounded(usage: dict) -> dict:
+    return {key: round(value, 6) if isinstance(value, float) else value for key, value in usage.items()}
+
+
+# Singleton instance
+token_ledger = TokenLedger()
@@ -1,24 +1,76 @@
 """
 YouTube Channel Analysis Tool
-Extracts channel information from URL for personalized recommendations
+Async channel enrichment with canonical channel keys, a TTL cache and coalesced lookups
 """
+import asyncio
+import functools
+import logging
 import re
-from typing import Optional, Dict
+import time
+from collections import OrderedDict
+from typing import Optional, Dict, Tuple
+import httpx
+from app.config import config
+
+logger = logging.getLogger(__name__)
+
+# Cached in place of an analysis for a channel that was not found or whose lookup failed
+_MISS: Dict = {}
+
+# Site paths that are not legacy youtube.com/<name> channel URLs
+_SITE_PATHS = (
+    "watch", "shorts", "channel", "c", "user", "playlist", "results", "feed", "embed", "live",
+    "hashtag", "redirect", "account", "premium", "about", "t", "gaming", "music", "kids", "post"
+)
+
+_CHANNEL_PATTERN = re.compile(
+    r'(?:youtube\.com/(?:(@)|(channel)/|(c)/|(user)/|(?:watch\?(?:\S*?&)?v=)|(shorts)/'
+    r'|(?!(?:' + "|".join(_SITE_PATHS) + r')(?![\w.-]))())|youtu\.be/())([\w.-]+)',
+    re.IGNORECASE
+)
+
+def parse_channel_ref(youtube_url: str) -> Optional[str]:
+    """
+    Canonical reference for a YouTube URL, so the same channel written
+    differently (scheme, www, case, trailing path or query) compares equal
+
+    Returns:
+        "@handle", "channel/<id>", "c/<name>" (also for legacy
+        youtube.com/<name> URLs), "user/<name>", or "video/<id>" for
+        watch, shorts and youtu.be links (the channel is only known once
+        the video is looked up); None if no match
+    """
+    match = _CHANNEL_PATTERN.search(youtube_url or "")
+    if not match:
+        return None
+    handle, channel, custom, user, shorts, legacy, short_link, ident = match.groups()
+    if handle is not None:
+        return "@" + ident.lower()
+    if channel:
+        # Channel and video IDs are case-sensitive
+        return "channel/" + ident
+    if custom or legacy is not None:
+        # Legacy youtube.com/<name> URLs resolve like /c/<name>, through search
+        return "c/" + ident.lower()
+    if user:
+        return "user/" + ident.lower()
+    return "video/" + ident
+
+def canonical_channel(youtube_url: str) -> Optional[str]:
+    """Canonical channel key of a URL, or None if it does not name a channel directly"""
+    ref = parse_channel_ref(youtube_url)
+    if ref is None or ref.startswith("video/"):
+        return None
+    return ref
 
 def extract_channel_info(youtube_url: str) -> Dict[str, str]:
     """
     Extract channel information from YouTube URL
-    Returns mock data for demo - in production would use YouTube API
+    Returns mock data for demo (used when no YOUTUBE_API_KEY is configured)
     """
-    # Extract channel ID or username from URL
-    channel_match = re.search(r'youtube\.com/@([^/\s]+)', youtube_url)
-    if not channel_match:
-        channel_match = re.search(r'youtube\.com/channel/([^/\s]+)', youtube_url)
-    if not channel_match:
-        channel_match = re.search(r'youtube\.com/c/([^/\s]+)', youtube_url)
-    
-    channel_identifier = channel_match.group(1) if channel_match else "Unknown"
-    
+    ref = parse_channel_ref(youtube_url)
+    channel_identifier = ref.split("/", 1)[-1].lstrip("@") if ref else "Unknown"
+
     # Mock channel data - in production use YouTube Data API
     channel_data = {
         "channel_name": channel_identifier,
@@ -30,7 +82,7 @@ def extract_channel_info(youtube_url: str) -> Dict[str, str]:
         "video_quality": "Mix of 720p and 1080p",
         "recommendation": "Pro Plan Recommended"
     }
-    
+
     return channel_data
 
 def analyze_for_pro_benefits(channel_data: Dict[str, str]) -> Dict[str, str]:
@@ -43,40 +95,232 @@ def analyze_for_pro_benefits(channel_data: Dict[str, str]) -> Dict[str, str]:
         "captions_benefit": "AI captions improve SEO and accessibility for broader reach",
         "support_benefit": "Priority support ensures quick resolution for time-sensitive uploads"
     }
-    
+
     return benefits
 
 class YouTubeAnalyzer:
-    """YouTube channel analyzer for personalized recommendations"""
-    
-    def __init__(self):
-        pass
-    
-    def analyze_channel(self, youtube_url: str) -> Dict:
+    """
+    YouTube channel analyzer for personalized recommendations
+
+    Lookups are keyed by canonical channel reference, cached for
+    YOUTUBE_CACHE_TTL seconds, and coalesced: concurrent requests for the
+    same channel share one in-flight API call. A channel that was not
+    found, or whose lookup failed, is remembered for YOUTUBE_NEGATIVE_TTL
+    seconds so every later turn does not spend quota on it again.
+    """
+
+    def __init__(self, api_key: str = None, base_url: str = None, transport: httpx.AsyncBaseTransport = None):
+        """
+        Args:
+            api_key: YouTube Data API key (mock analysis when empty)
+            base_url: API base URL (point at a local fake server for tests)
+            transport: Optional httpx transport (e.g. httpx.MockTransport for benchmarks)
+        """
+        self.api_key = config.YOUTUBE_API_KEY if api_key is None else api_key
+        self.base_url = (base_url or config.YOUTUBE_API_BASE_URL).rstrip("/")
+        self.ttl = config.YOUTUBE_CACHE_TTL
+        self.negative_ttl = config.YOUTUBE_NEGATIVE_TTL
+        self.max_entries = config.YOUTUBE_CACHE_SIZE
+        self._cache: OrderedDict[str, Tuple[float, Dict]] = OrderedDict()
+        self._inflight: Dict[str, asyncio.Task] = {}
+        # Callers currently awaiting each in-flight lookup through analyze()
+        self._waiters: Dict[str, int] = {}
+        self._client: Optional[httpx.AsyncClient] = None
+        self._client_loop = None
+        self._transport = transport
+        self.counters = {"cache_hits": 0, "negative_hits": 0, "coalesced": 0, "misses": 0, "api_calls": 0,
+                         "errors": 0, "not_found": 0, "cancelled": 0}
+
+    def _cache_get(self, ref: str) -> Optional[Dict]:
+        entry = self._cache.get(ref)
+        if entry is None:
+            return None
+        expires, analysis = entry
+        if expires < time.monotonic():
+            del self._cache[ref]
+            return None
+        self._cache.move_to_end(ref)
+        return analysis
+
+    def _cache_put(self, ref: str, analysis: Dict):
+        ttl = self.negative_ttl if analysis is _MISS else self.ttl
+        self._cache[ref] = (time.monotonic() + ttl, analysis)
+        self._cache.move_to_end(ref)
+        while len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+
+    def cached(self, youtube_url: str) -> Optional[Dict]:
+        """Analysis for a URL if it is already cached (never waits)"""
+        ref = parse_channel_ref(youtube_url)
+        return (self._cache_get(ref) or None) if ref else None
+
+    def prefetch(self, youtube_url: str) -> Optional[asyncio.Task]:
+        """
+        Start an analysis in the background on the running loop, if not cached or in flight
+
+        Returns:
+            The lookup task if this call started one
+        """
+        ref = parse_channel_ref(youtube_url)
+        if not ref:
+            return None
+        cached = self._cache_get(ref)
+        if cached is _MISS:
+            self.counters["negative_hits"] += 1
+        elif cached is not None:
+            self.counters["cache_hits"] += 1
+        elif ref in self._inflight:
+            self.counters["coalesced"] += 1
+        else:
+            return self._start(ref, youtube_url)
+        return None
+
+    def discard(self, task: asyncio.Task):
+        """Cancel a prefetch whose turn was abandoned, unless someone is awaiting it"""
+        if task.done():
+            return
+        for ref, inflight in self._inflight.items():
+            if inflight is task:
+                if not self._waiters.get(ref):
+                    task.cancel()
+                    self.counters["cancelled"] += 1
+                return
+
+    async def analyze(self, youtube_url: str) -> Optional[Dict]:
         """
         Analyze YouTube channel and return insights
+
+        Returns:
+            Analysis dict, or None for an unrecognized URL or a failed lookup
         """
-        if not youtube_url:
+        ref = parse_channel_ref(youtube_url)
+        if not ref:
+            return None
+
+        analysis = self._cache_get(ref)
+        if analysis is _MISS:
+            self.counters["negative_hits"] += 1
+            return None
+        if analysis is not None:
+            self.counters["cache_hits"] += 1
+            return analysis
+
+        if ref in self._inflight and self._inflight[ref].get_loop() is asyncio.get_running_loop():
+            self.counters["coalesced"] += 1
+        # Shielded so one caller giving up does not cancel the lookup for the others
+        task = self._start(ref, youtube_url)
+        self._waiters[ref] = self._waiters.get(ref, 0) + 1
+        try:
+            return await asyncio.shield(task)
+        finally:
+            self._waiters[ref] -= 1
+            if not self._waiters[ref]:
+                del self._waiters[ref]
+
+    def _start(self, ref: str, youtube_url: str) -> asyncio.Task:
+        """Return the in-flight lookup for ref, starting one if needed"""
+        loop = asyncio.get_running_loop()
+        task = self._inflight.get(ref)
+        if task is None or task.get_loop() is not loop:
+            task = loop.create_task(self._lookup(ref, youtube_url))
+            self._inflight[ref] = task
+            task.add_done_callback(functools.partial(self._forget, ref))
+        return task
+
+    def _forget(self, ref: str, task: asyncio.Task):
+        if self._inflight.get(ref) is task:
+            del self._inflight[ref]
+
+    async def _lookup(self, ref: str, youtube_url: str) -> Optional[Dict]:
+        self.counters["misses"] += 1
+        try:
+            if self.api_key:
+                channel_info = await self._fetch_channel(ref, youtube_url)
+            else:
+                channel_info = extract_channel_info(youtube_url)
+        except Exception as e:
+            self.counters["errors"] += 1
+            logger.warning("YouTube lookup failed", extra={"channel": ref, "error": str(e)})
+            self._cache_put(ref, _MISS)
+            return None
+        if channel_info is None:
+            self.counters["not_found"] += 1
+            self._cache_put(ref, _MISS)
             return None
-        
-        # Extract channel info
-        channel_info = extract_channel_info(youtube_url)
-        
-        # Get Pro benefits
-        pro_benefits = analyze_for_pro_benefits(channel_info)
-        
-        # Combine for display
+
         analysis = {
             "channel_info": channel_info,
-            "pro_benefits": pro_benefits,
+            "pro_benefits": analyze_for_pro_benefits(channel_info),
             "recommendation": "Based on your channel, Pro plan offers better value for growth"
         }
-        
-        print(f"YouTube Channel Analysis:")
-        print(f"Channel: {channel_info['channel_name']}")
-        print(f"Recommendation: {analysis['recommendation']}")
-        
+        self._cache_put(ref, analysis)
+        channel_id = channel_info.get("channel_id")
+        if channel_id and ref != "channel/" + channel_id:
+            self._cache_put("channel/" + channel_id, analysis)
         return analysis
 
+    def _http(self) -> httpx.AsyncClient:
+        """Connection-pooled client, one per event loop"""
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._client_loop is not loop:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                timeout=config.YOUTUBE_API_TIMEOUT,
+                limits=httpx.Limits(max_connections=config.YOUTUBE_MAX_CONNECTIONS),
+                transport=self._transport
+            )
+            self._client_loop = loop
+        return self._client
+
+    async def _get(self, path: str, **params) -> dict:
+        self.counters["api_calls"] += 1
+        response = await self._http().get(path, params={**params, "key": self.api_key})
+        response.raise_for_status()
+        return response.json()
+
+    async def _fetch_channel(self, ref: str, youtube_url: str) -> Optional[Dict[str, str]]:
+        """Resolve a canonical reference through the YouTube Data API v3"""
+        kind, _, ident = ref.partition("/")
+        if ref.startswith("@"):
+            query = {"forHandle": ref}
+        elif kind == "channel":
+            query = {"id": ident}
+        elif kind == "user":
+            query = {"forUsername": ident}
+        elif kind == "video":
+            videos = await self._get("/videos", part="snippet", id=ident)
+            if not videos.get("items"):
+                return None
+            query = {"id": videos["items"][0]["snippet"]["channelId"]}
+        else:
+            # Legacy /c/ custom URLs have no direct lookup; take the top channel search hit
+            search = await self._get("/search", part="snippet", type="channel", q=ident, maxResults=1)
+            if not search.get("items"):
+                return None
+            query = {"id": search["items"][0]["snippet"]["channelId"]}
+
+        channels = await self._get("/channels", part="snippet,statistics", **query)
+        if not channels.get("items"):
+            return None
+        item = channels["items"][0]
+        snippet, stats = item.get("snippet", {}), item.get("statistics", {})
+        videos = int(stats.get("videoCount", 0) or 0)
+
+        return {
+            "channel_id": item["id"],
+            "channel_name": snippet.get("title", ident),
+            "channel_url": youtube_url,
+            "estimated_subscribers": stats.get("subscriberCount", "Hidden"),
+            "estimated_videos": str(videos),
+            "content_type": "YouTube Creator",
+            "upload_frequency": "Regular uploads detected" if videos >= 50 else "Growing channel",
+            "video_quality": "Mix of 720p and 1080p",
+            "recommendation": "Pro Plan Recommended"
+        }
+
+    def stats(self) -> Dict[str, int]:
+        """Cache size, in-flight lookups and lookup counters"""
+        return {"cached": len(self._cache), "inflight": len(self._inflight), **self.counters}
+
 # Singleton instance
 youtube_analyzer = YouTubeAnalyzer()
@@ -0,0 +1,121 @@
+"""
+Bulk YouTube Channel Analysis
+Canonicalizes, deduplicates and analyzes uploaded lists of channel URLs with a bounded worker pool
+"""
+import asyncio
+import re
+import time
+from typing import AsyncIterator, Dict, Iterable
+from app.config import config
+from app.agent.youtube_analyzer import YouTubeAnalyzer, youtube_analyzer, parse_channel_ref
+
+# Any YouTube URL in a line, whatever the column layout (CSV, TSV, one per line)
+_URL_PATTERN = re.compile(
+    r'(?:https?://)?(?:www\.|m\.)?(?:youtube\.com|youtu\.be)/[^\s,;"\'<>]+', re.IGNORECASE
+)
+
+_DONE = object()
+
+
+async def bulk_analyze(
+    lines: Iterable[str],
+    concurrency: int = None,
+    analyzer: YouTubeAnalyzer = None,
+    max_channels: int = None
+) -> AsyncIterator[dict]:
+    """
+    Analyze every channel referenced in `lines`, yielding one status record
+    per URL as soon as it is known, then a final summary record
+
+    Lines are read lazily and only `concurrency` lookups are in flight at a
+    time, so memory is bounded by the queue sizes plus the set of channels
+    seen. Lookups go through the analyzer's shared TTL cache and coalescing,
+    so channels already looked up by chat sessions are not fetched again.
+    Channels past the first `max_channels` unique ones are not looked up,
+    which bounds the API quota one upload can spend.
+
+    Args:
+        lines: Uploaded file, line by line
+        concurrency: Worker pool size (defaults to YOUTUBE_BULK_CONCURRENCY)
+        analyzer: Analyzer to use (defaults to the shared singleton)
+        max_channels: Unique channels looked up (defaults to YOUTUBE_BULK_MAX_CHANNELS)
+
+    Yields:
+        {"line", "url", "channel", "status", ...} records where status is
+        "ok", "duplicate", "invalid", "error" or "over_limit", then {"summary": {...}}
+    """
+    concurrency = concurrency or config.YOUTUBE_BULK_CONCURRENCY
+    max_channels = max_channels or config.YOUTUBE_BULK_MAX_CHANNELS
+    analyzer = analyzer or youtube_analyzer
+    started = time.perf_counter()
+
+    jobs: asyncio.Queue = asyncio.Queue(maxsize=concurrency * 4)
+    results: asyncio.Queue = asyncio.Queue(maxsize=concurrency * 4)
+    first_seen: Dict[str, int] = {}
+    counts = {"ok": 0, "duplicate": 0, "invalid": 0, "error": 0, "over_limit": 0}
+
+    async def produce():
+        for line_no, line in enumerate(lines, 1):
+            urls = _URL_PATTERN.findall(line)
+            if not urls:
+                if line.strip():
+                    await results.put({"line": line_no, "input": line.strip()[:200], "status": "invalid"})
+                continue
+            for url in urls:
+                ref = parse_channel_ref(url)
+                if ref is None:
+                    await results.put({"line": line_no, "url": url, "status": "invalid"})
+                elif ref in first_seen:
+                    await results.put({
+                        "line": line_no, "url": url, "channel": ref,
+                        "status": "duplicate", "duplicate_of_line": first_seen[ref]
+                    })
+                elif len(first_seen) >= max_channels:
+                    await results.put({"line": line_no, "url": url, "channel": ref, "status": "over_limit"})
+                else:
+                    first_seen[ref] = line_no
+                    await jobs.put((line_no, url, ref))
+        for _ in range(concurrency):
+            await jobs.put(None)
+
+    async def work():
+        while True:
+            job = await jobs.get()
+            if job is None:
+                await results.put(_DONE)
+                return
+            line_no, url, ref = job
+            record = {"line": line_no, "url": url, "channel": ref}
+            try:
+                analysis = await analyzer.analyze(url)
+            except Exception as e:
+                analysis = None
+                record["error"] = str(e)
+            if analysis:
+                record["status"] = "ok"
+                record["channel_info"] = analysis["channel_info"]
+            else:
+                record["status"] = "error"
+            await results.put(record)
+
+    producer = asyncio.create_task(produce())
+    workers = [asyncio.create_task(work()) for _ in range(concurrency)]
+    try:
+        finished = 0
+        while finished < concurrency:
+            record = await results.get()
+            if record is _DONE:
+                finished += 1
+                continue
+            counts[record["status"]] += 1
+            yield record
+        await producer
+    finally:
+        for task in [producer, *workers]:
+            task.cancel()
+
+    yield {"summary": {
+        **counts,
+        "unique_channels": len(first_seen),
+        "elapsed_s": round(time.perf_counter() - started, 3)
+    }}
@@ -0,0 +1,90 @@
+"""
+Fake YouTube Data API
+Local stand-in for the /channels, /videos and /search endpoints used by the channel analyzer
+
+Run with `python -m app.agent.youtube_fake_api` and set
+YOUTUBE_API_BASE_URL=http://127.0.0.1:8765 and any YOUTUBE_API_KEY, or
+pass httpx.ASGITransport(app=app) to YouTubeAnalyzer (tests). Channels and
+videos named "deleted..." are not found.
+"""
+import asyncio
+import hashlib
+import os
+from typing import Optional
+from fastapi import FastAPI
+
+# Simulated API latency in seconds
+LATENCY = float(os.getenv("FAKE_YOUTUBE_LATENCY", "0.2"))
+
+# Names that look up as deleted or never existing
+_MISSING_PREFIX = "deleted"
+
+app = FastAPI(title="Fake YouTube Data API")
+app.state.requests = 0
+
+
+def _channel_id(name: str) -> str:
+    """Deterministic UC-style channel id for a handle or name"""
+    return "UC" + hashlib.sha1(name.lower().lstrip("@").encode("utf-8")).hexdigest()[:22]
+
+
+def _channel(channel_id: str, title: str) -> dict:
+    seed = int(channel_id[2:10], 16)
+    return {
+        "id": channel_id,
+        "snippet": {"title": title, "customUrl": "@" + title.lower()},
+        "statistics": {
+            "subscriberCount": str(seed % 2_000_000),
+            "videoCount": str(seed % 900)
+        }
+    }
+
+
+async def _simulate_latency():
+    app.state.requests += 1
+    if LATENCY:
+        await asyncio.sleep(LATENCY)
+
+
+@app.get("/channels")
+async def channels(
+    part: str = "snippet",
+    id: Optional[str] = None,
+    forHandle: Optional[str] = None,
+    forUsername: Optional[str] = None,
+    key: Optional[str] = None
+):
+    await _simulate_latency()
+    if forHandle or forUsername:
+        name = (forHandle or forUsername).lstrip("@")
+        if name.lower().startswith(_MISSING_PREFIX):
+            return {"items": []}
+        return {"items": [_channel(_channel_id(name), name)]}
+    if id and not id.lower().startswith(_MISSING_PREFIX):
+        return {"items": [_channel(id, id)]}
+    return {"items": []}
+
+
+@app.get("/videos")
+async def videos(part: str = "snippet", id: str = "", key: Optional[str] = None):
+    await _simulate_latency()
+    if id.lower().startswith(_MISSING_PREFIX):
+        return {"items": []}
+    return {"items": [{"id": id, "snippet": {"channelId": _channel_id("video-" + id)}}]}
+
+
+@app.get("/search")
+async def search(part: str = "snippet", q: str = "", type: str = "channel", maxResults: int = 1, key: Optional[str] = None):
+    await _simulate_latency()
+    return {"items": [{"snippet": {"channelId": _channel_id(q)}}]}
+
+
+@app.get("/_stats")
+async def stats():
+    """Requests served, for checking cache and coalescing behaviour"""
+    return {"requests": app.state.requests}
+
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run(app, host="127.0.0.1", port=int(os.getenv("FAKE_YOUTUBE_PORT", "8765")))
@@ -2,12 +2,43 @@
 API Endpoints for AutoStream AI Assistant
 Handles /chat endpoint with session management
 """
-from fastapi import APIRouter, HTTPException
+import asyncio
+import contextlib
+import logging
+import os
+from fastapi import APIRouter, Header, HTTPException, Query, Request, Response
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from pydantic import BaseModel, Field
-from typing import Optional
-from langchain_core.messages import HumanMessage
+from typing import Awaitable, Literal, Optional
+from datetime import datetime, timezone
+import io
+import json
+import tempfile
+import uuid
 from app.agent.graph import autostream_graph
 from app.memory.session_store import session_store
+from app.agent.timing import pipeline_timings
+from app.agent.youtube_analyzer import youtube_analyzer
+from app.agent.youtube_bulk import bulk_analyze
+from app.agent.intent import intent_classifier
+from app.agent.metrics import metrics_registry
+from app.agent.usage import token_ledger
+from app.agent.funnel_stats import funnel_stats
+from app.agent.circuit_breaker import llm_breaker, STATE_VALUES
+from app.agent.model_router import model_router
+from app.agent.deadline import Deadline, budget_stats, current_deadline
+from app.agent.quick_replies import quick_replies
+from app.agent.faq import faq_index
+from app.log import request_id_var, session_id_var
+from app.profiling import request_profiler
+from app.idempotency import chat_requests, request_key
+from app.ratelimit import chat_rate_limiter, client_ip
+from app.config import config
+from app.leads.outbox import lead_outbox
+from app.leads.dedup import lead_dedup
+from app.export import lead_rows, session_rows, encode, aencode, LEAD_COLUMNS, SESSION_COLUMNS, MEDIA_TYPES
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
@@ -23,90 +54,195 @@ class ChatResponse(BaseModel):
     state: dict = Field(..., description="Current conversation state")
     ui_components: dict = Field(default={}, description="UI components to display")
 
+def ui_components(updated_state: dict) -> dict:
+    """UI components the frontend should show after a turn"""
+    components = {}
+    intent = updated_state.get("intent", "greeting")
+    
+    # Show pricing cards for pricing intent
+    if intent == "pricing" and not updated_state.get("selected_plan"):
+        components["show_pricing_cards"] = True
+    
+    # Show plan comparison when Basic is selected
+    if updated_state.get("selected_plan") == "basic":
+        components["show_plan_comparison"] = True
+    
+    # Show YouTube permission request on the turn a channel is first detected
+    if updated_state.get("show_youtube_permission"):
+        components["show_youtube_permission"] = True
+        components["youtube_channel"] = updated_state.get("yt_channel")
+    
+    # Show confirmation when all fields collected
+    if (updated_state.get("name") and 
+        updated_state.get("email") and 
+        updated_state.get("platform") and 
+        not updated_state.get("lead_captured")):
+        components["show_confirmation"] = True
+    
+    # Show success when lead captured
+    if updated_state.get("lead_captured"):
+        components["show_success"] = True
+    
+    # Show YouTube analysis in right panel
+    if updated_state.get("yt_analysis"):
+        components["youtube_analysis"] = updated_state.get("yt_analysis")
+    
+    return components
+
+def public_state(updated_state: dict) -> dict:
+    """Conversation fields exposed to the frontend"""
+    return {
+        "selected_plan": updated_state.get("selected_plan"),
+        "name": updated_state.get("name"),
+        "email": updated_state.get("email"),
+        "platform": updated_state.get("platform"),
+        "yt_channel": updated_state.get("yt_channel"),
+        "lead_captured": updated_state.get("lead_captured", False),
+        "turn_count": updated_state.get("turn_count", 0),
+        "conversation_state": updated_state.get("conversation_state", "DISCOVERY")
+    }
+
+async def _until_disconnected(http_request: Request):
+    """Return once the client has gone away (the body is already read, so only a disconnect can arrive)"""
+    while (await http_request.receive())["type"] != "http.disconnect":
+        pass
+
+async def _cancel_on_disconnect(http_request: Request, work: Awaitable):
+    """
+    Await work, cancelling it if the client disconnects first
+    
+    Raises:
+        HTTPException 499 when the client went away (never seen by it; for logs)
+    """
+    task = asyncio.ensure_future(work)
+    watcher = asyncio.ensure_future(_until_disconnected(http_request))
+    try:
+        await asyncio.wait({task, watcher}, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        watcher.cancel()
+    if not task.done():
+        task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await task
+        logger.info("Client disconnected, turn cancelled")
+        raise HTTPException(status_code=499, detail="Client closed request")
+    return task.result()
+
 @router.post("/chat", response_model=ChatResponse)
-async def chat(request: ChatRequest) -> ChatResponse:
+async def chat(
+    request: ChatRequest,
+    response: Response,
+    http_request: Request,
+    x_tenant_id: Optional[str] = Header(None),
+    x_profile: Optional[str] = Header(None),
+    x_admin_token: Optional[str] = Header(None),
+    idempotency_key: Optional[str] = Header(None),
+    x_deadline_ms: Optional[str] = Header(None)
+) -> ChatResponse:
     """
     Process chat message and return AI response
     
+    A repeated submission (same Idempotency-Key, or without one the same
+    session, message and turn) does not run a second turn: it waits for
+    the one in flight or gets its stored response. X-Idempotency-Status
+    says which: executed, coalesced or replayed.
+    
+    Turns are rate limited per session, client IP and tenant; the tenant
+    is the one the session was created under, and an X-Tenant-ID naming
+    another is refused (403). Over a limit
+    the response is 429 with Retry-After. Repeats answered from the
+    in-flight or stored turn are not charged.
+    
+    If the client disconnects before the reply is ready (and no duplicate
+    is waiting on the same turn), the turn is cancelled: the LLM call and
+    background lookups stop, and the session keeps the user's message but
+    no reply.
+    
+    The turn has X-Deadline-Ms (default TURN_DEADLINE_MS) from arrival to
+    answer: retrieval and enrichment are cut short when time runs low, and
+    the LLM is skipped for a knowledge-base reply when too little is left.
+    
     Args:
         request: ChatRequest with session_id and message
+        x_tenant_id: Tenant a new session is created under (X-Tenant-ID header, optional)
+        x_profile: Set to profile this request (X-Profile header, needs X-Admin-Token)
+        x_admin_token: Admin token (X-Admin-Token header)
+        idempotency_key: Client key for this submission (Idempotency-Key header, optional)
+        x_deadline_ms: Milliseconds the client will wait (X-Deadline-Ms header, optional)
         
     Returns:
         ChatResponse with reply, intent, state, and ui_components
     """
-    try:
-        # Get or create session
-        session = session_store.get_or_create(request.session_id)
+    session_id_var.set(request.session_id)
+    current_deadline.set(Deadline.for_request(x_deadline_ms))
+    tenant_id = session_store.tenant_for(request.session_id, x_tenant_id)
+    if tenant_id is None:
+        raise HTTPException(status_code=403, detail="X-Tenant-ID does not match the session's tenant")
+    on_result = None
+    if idempotency_key:
+        key = request_key(request.session_id, idempotency_key)
+    else:
+        # Kept by the session store, so a repeat check never loads the checkpoint
+        key = request_key(request.session_id, message=request.message,
+                          turn_count=session_store.turn_count(request.session_id))
         
-        # Add user message to state
-        user_message = HumanMessage(content=request.message)
-        session["messages"].append(user_message)
-        
-        # Run graph
-        updated_state = autostream_graph.run(session)
+        def on_result(result: ChatResponse):
+            # A retry arriving after the turn finished sees the next turn count;
+            # replay only briefly, since the user may really be repeating themselves
+            retry_key = request_key(request.session_id, message=request.message,
+                                    turn_count=result.state.get("turn_count", 0))
+            chat_requests.put(retry_key, result, ttl=config.IDEMPOTENCY_RETRY_WINDOW)
+    
+    def admit():
+        # Charged only when a turn actually starts
+        ip = client_ip(http_request.client.host if http_request.client else None,
+                       http_request.headers.get("x-forwarded-for"))
+        decision = chat_rate_limiter.check(request.session_id, ip, tenant_id)
+        if not decision.allowed:
+            logger.info("Chat turn rate limited", extra={"scope": decision.scope})
+            raise HTTPException(
+                status_code=429, detail=f"Too many messages ({decision.scope} limit)",
+                headers={"Retry-After": decision.retry_after_header}
+            )
+    
+    async def run_turn() -> ChatResponse:
+        if not request_profiler.should_profile(x_profile, x_admin_token):
+            return await _chat_turn(request, tenant_id)
+        request_id = request_id_var.get() or uuid.uuid4().hex
+        async with request_profiler.profile(request_id, request.session_id):
+            return await _chat_turn(request, tenant_id)
+    
+    result, status = await _cancel_on_disconnect(http_request, chat_requests.run(key, run_turn, on_result, admit))
+    response.headers["X-Idempotency-Status"] = status
+    return result
+
+async def _chat_turn(request: ChatRequest, tenant_id: str) -> ChatResponse:
+    """Run the turn and build the chat response"""
+    try:
+        # Register activity (LRU / expiry); state itself lives in the checkpointer
+        new_session = await session_store.touch(request.session_id, tenant_id)
         
-        # Update session store
-        session_store.update_session(request.session_id, updated_state)
+        # Run graph with just the new user message
+        updated_state = await autostream_graph.arun(
+            request.session_id, request.message, new_session, tenant_id
+        )
         
         # Get assistant's reply (last message)
         messages = updated_state.get("messages", [])
         assistant_reply = messages[-1].content if messages else "I'm sorry, I didn't understand that."
         
-        # Determine UI components to show
-        ui_components = {}
-        intent = updated_state.get("intent", "greeting")
-        
-        # Show pricing cards for pricing intent
-        if intent == "pricing" and not updated_state.get("selected_plan"):
-            ui_components["show_pricing_cards"] = True
-        
-        # Show plan comparison when Basic is selected
-        if updated_state.get("selected_plan") == "basic":
-            ui_components["show_plan_comparison"] = True
-        
-        # Show YouTube permission request if channel detected
-        if updated_state.get("yt_channel") and not updated_state.get("yt_permission_asked"):
-            ui_components["show_youtube_permission"] = True
-            ui_components["youtube_channel"] = updated_state.get("yt_channel")
-            updated_state["yt_permission_asked"] = True
-            session_store.update_session(request.session_id, updated_state)
-        
-        # Show confirmation when all fields collected
-        if (updated_state.get("name") and 
-            updated_state.get("email") and 
-            updated_state.get("platform") and 
-            not updated_state.get("lead_captured")):
-            ui_components["show_confirmation"] = True
-        
-        # Show success when lead captured
-        if updated_state.get("lead_captured"):
-            ui_components["show_success"] = True
-        
-        # Show YouTube analysis in right panel
-        if updated_state.get("yt_analysis"):
-            ui_components["youtube_analysis"] = updated_state.get("yt_analysis")
-        
         # Build response
         response = ChatResponse(
             reply=assistant_reply,
-            intent=intent,
-            state={
-                "selected_plan": updated_state.get("selected_plan"),
-                "name": updated_state.get("name"),
-                "email": updated_state.get("email"),
-                "platform": updated_state.get("platform"),
-                "yt_channel": updated_state.get("yt_channel"),
-                "lead_captured": updated_state.get("lead_captured", False),
-                "turn_count": updated_state.get("turn_count", 0),
-                "conversation_state": updated_state.get("conversation_state", "DISCOVERY")
-            },
-            ui_components=ui_components
+            intent=updated_state.get("intent", "greeting"),
+            state=public_state(updated_state),
+            ui_components=ui_components(updated_state)
         )
         
         return response
         
     except Exception as e:
-        print(f"Chat endpoint error: {e}")
+        logger.exception("Chat endpoint error")
         raise HTTPException(
             status_code=500,
             detail=f"Internal server error: {str(e)}"
@@ -123,7 +259,7 @@ async def get_session(session_id: str):
     Returns:
         Current session state
     """
-    session = session_store.get_session(session_id)
+    session = await session_store.get_session(session_id)
     
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
@@ -137,7 +273,9 @@ async def get_session(session_id: str):
         "platform": session.get("platform"),
         "lead_captured": session.get("lead_captured", False),
         "turn_count": session.get("turn_count", 0),
-        "message_count": len(session.get("messages", []))
+        "message_count": len(session.get("messages", [])),
+        "tenant_id": session.get("tenant_id", "default"),
+        "token_usage": session.get("token_usage", {})
     }
 
 @router.delete("/session/{session_id}")
@@ -151,10 +289,223 @@ async def delete_session(session_id: str):
     Returns:
         Success confirmation
     """
-    session_store.delete_session(session_id)
+    await session_store.delete_session(session_id)
     return {"message": f"Session {session_id} deleted"}
 
+def _ratio(hits: float, total: float) -> float:
+    return hits / total if total else 0.0
+
+@metrics_registry.collector
+def component_metrics():
+    """Session store size, cache hit ratios and lead pipeline counts, read at scrape time"""
+    sessions = session_store.get_stats()
+    youtube = youtube_analyzer.stats()
+    dedup = lead_dedup.stats()
+    intents = intent_classifier.counters
+    duplicates = chat_requests.stats()
+    breaker = llm_breaker.stats()
+    cancellations = autostream_graph.cancellations
+    rate_limits = chat_rate_limiter.stats()
+    youtube_lookups = youtube["cache_hits"] + youtube["coalesced"] + youtube["misses"]
+    dedup_lookups = dedup["bloom_negatives"] + dedup["cache_hits"] + dedup["store_lookups"]
+    return [
+        ("autostream_sessions_active", "gauge", "Live sessions in the session store",
+         [({}, sessions["total_sessions"])]),
+        ("autostream_sessions_max", "gauge", "Session store capacity before LRU eviction",
+         [({}, sessions["max_sessions"])]),
+        ("autostream_cache_hits_total", "counter", "Lookups answered without the backing service",
+         [({"cache": "youtube"}, youtube["cache_hits"] + youtube["coalesced"]),
+          ({"cache": "lead_dedup"}, dedup["bloom_negatives"] + dedup["cache_hits"]),
+          ({"cache": "intent_local"}, intents["local"])]),
+        ("autostream_cache_lookups_total", "counter", "Lookups made against each cache",
+         [({"cache": "youtube"}, youtube_lookups),
+          ({"cache": "lead_dedup"}, dedup_lookups),
+          ({"cache": "intent_local"}, intents["local"] + intents["llm"])]),
+        ("autostream_cache_hit_ratio", "gauge", "Share of lookups answered by each cache",
+         [({"cache": "youtube"}, _ratio(youtube["cache_hits"] + youtube["coalesced"], youtube_lookups)),
+          ({"cache": "lead_dedup"}, _ratio(dedup["bloom_negatives"] + dedup["cache_hits"], dedup_lookups)),
+          ({"cache": "intent_local"}, _ratio(intents["local"], intents["local"] + intents["llm"]))]),
+        ("autostream_funnel_sessions", "gauge", "Live sessions per funnel state",
+         [({"state": state}, count) for state, count in funnel_stats.live().items()]),
+        ("autostream_chat_duplicates_total", "counter", "Repeated chat submissions answered without a new turn",
+         [({"kind": "coalesced"}, duplicates["coalesced"]),
+          ({"kind": "replayed"}, duplicates["replayed"])]),
+        ("autostream_llm_circuit_state", "gauge", "LLM circuit breaker state (0 closed, 1 half-open, 2 open)",
+         [({}, STATE_VALUES[breaker["state"]])]),
+        ("autostream_llm_degraded_replies_total", "counter", "Turns answered from templates and retrieval without the LLM",
+         [({}, autostream_graph.degraded_replies)]),
+        ("autostream_cancelled_turns_total", "counter", "Chat turns cancelled because the client went away",
+         [({}, cancellations["turns"])]),
+        ("autostream_cancelled_llm_calls_total", "counter", "Reply LLM calls cancelled mid-flight",
+         [({}, cancellations["llm_calls"])]),
+        ("autostream_cancelled_output_tokens_total", "counter", "Estimated reply tokens not generated thanks to cancellation",
+         [({}, cancellations["output_tokens_saved"])]),
+        ("autostream_cancelled_seconds_saved_total", "counter", "Estimated LLM seconds not spent thanks to cancellation",
+         [({}, cancellations["seconds_saved"])]),
+        ("autostream_rate_limited_total", "counter", "Chat turns refused with 429, by the limit hit",
+         [({"scope": scope}, count) for scope, count in rate_limits["refused"].items()]),
+        ("autostream_rate_limit_keys", "gauge", "Sessions, client IPs and tenants the rate limiter is tracking",
+         [({}, rate_limits["tracked_keys"])]),
+        ("autostream_youtube_cache_entries", "gauge", "Channel analyses cached",
+         [({}, youtube["cached"])]),
+        ("autostream_lead_outbox", "gauge", "Leads in the outbox per delivery status",
+         [({"status": status}, count) for status, count in lead_outbox.stats().items()]),
+    ]
+
 @router.get("/stats")
 async def get_stats():
-    """Get session store statistics"""
-    return session_store.get_stats()
+    """
+    Get session store, turn pipeline, lead delivery, enrichment, token usage, duplicate request, LLM breaker, model routing, cancellation, stage budget, rate limit, quick reply and FAQ statistics
+    
+    Session counts and lead outbox totals come from shared storage; every
+    other section counts the answering worker only (worker_pid).
+    """
+    return {
+        "worker_pid": os.getpid(),
+        **session_store.get_stats(),
+        "pipeline": pipeline_timings.summary(),
+        "lead_outbox": lead_outbox.stats(),
+        "lead_dedup": lead_dedup.stats(),
+        "youtube": youtube_analyzer.stats(),
+        "tokens": token_ledger.summary(),
+        "idempotency": chat_requests.stats(),
+        "llm_breaker": {**llm_breaker.stats(), "degraded_replies": autostream_graph.degraded_replies},
+        "model_routing": model_router.stats(),
+        "cancellations": {key: round(value, 2) for key, value in autostream_graph.cancellations.items()},
+        "deadlines": budget_stats.summary(),
+        "rate_limits": chat_rate_limiter.stats(),
+        "quick_replies": quick_replies.stats(),
+        "faq": faq_index.stats()
+    }
+
+@router.get("/funnel")
+async def get_funnel():
+    """
+    Funnel analytics: live sessions per state, transition counts, conversion
+    by plan and platform, and 5m / 1h / 24h windows
+    
+    Maintained incrementally on every state change, so this does not scan
+    sessions. Counts cover the answering worker only (worker_pid).
+    """
+    return {"worker_pid": os.getpid(), **funnel_stats.summary()}
+
+def _require_admin(token: Optional[str]):
+    """Reject the request unless an admin token is configured and matches"""
+    if not config.ADMIN_TOKEN or token != config.ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin token required")
+
+@router.get("/profiles")
+async def list_profiles(x_admin_token: Optional[str] = Header(None)):
+    """Recent request profiles, newest first (admin only)"""
+    _require_admin(x_admin_token)
+    return {"profiles": request_profiler.list_profiles()}
+
+@router.get("/profiles/{request_id}")
+async def get_profile(request_id: str, x_admin_token: Optional[str] = Header(None)):
+    """
+    One request's profile as collapsed stacks (admin only)
+    
+    Render with flamegraph.pl, or drop the file into speedscope.
+    """
+    _require_admin(x_admin_token)
+    path = request_profiler.profile_path(request_id)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    with open(path, encoding="utf-8") as f:
+        return PlainTextResponse(f.read())
+
+def _epoch(value: Optional[datetime]) -> Optional[float]:
+    """Query datetime to epoch seconds (naive values are taken as UTC)"""
+    if value is None:
+        return None
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+@router.get("/leads/export")
+async def export_leads(
+    format: Literal["ndjson", "csv"] = "ndjson",
+    cursor: int = Query(0, ge=0, description="Return leads after this id (last row's id)"),
+    limit: Optional[int] = Query(None, ge=1, description="Maximum rows in this page"),
+    since: Optional[datetime] = Query(None, description="Captured at or after (ISO 8601 or epoch)"),
+    until: Optional[datetime] = Query(None, description="Captured at or before (ISO 8601 or epoch)"),
+    plan: Optional[str] = None,
+    platform: Optional[str] = None,
+    x_admin_token: Optional[str] = Header(None)
+):
+    """
+    Stream captured leads as NDJSON or CSV (admin only)
+    
+    Rows are read from the lead outbox in keyset pages and written as they
+    are read, so memory use does not grow with the export size.
+    """
+    _require_admin(x_admin_token)
+    rows = lead_rows(cursor, _epoch(since), _epoch(until), plan, platform, limit)
+    return StreamingResponse(
+        encode(rows, format, LEAD_COLUMNS),
+        media_type=MEDIA_TYPES[format],
+        headers={"Content-Disposition": f"attachment; filename=leads.{format}"}
+    )
+
+@router.get("/sessions/export")
+async def export_sessions(
+    format: Literal["ndjson", "csv"] = "ndjson",
+    cursor: Optional[str] = Query(None, description="Return sessions after this id (last row's session_id)"),
+    limit: Optional[int] = Query(None, ge=1, description="Maximum rows in this page"),
+    since: Optional[datetime] = Query(None, description="Last active at or after (ISO 8601 or epoch)"),
+    until: Optional[datetime] = Query(None, description="Last active at or before (ISO 8601 or epoch)"),
+    plan: Optional[str] = None,
+    platform: Optional[str] = None,
+    x_admin_token: Optional[str] = Header(None)
+):
+    """
+    Stream live session summaries as NDJSON or CSV (admin only)
+    
+    Session states are loaded one at a time between chat turns; live
+    traffic is never blocked for the length of the export.
+    """
+    _require_admin(x_admin_token)
+    rows = session_rows(cursor, _epoch(since), _epoch(until), plan, platform, limit)
+    return StreamingResponse(
+        aencode(rows, format, SESSION_COLUMNS),
+        media_type=MEDIA_TYPES[format],
+        headers={"Content-Disposition": f"attachment; filename=sessions.{format}"}
+    )
+
+@router.post("/youtube/bulk")
+async def bulk_youtube_analysis(
+    request: Request,
+    concurrency: Optional[int] = Query(None, ge=1, le=200),
+    x_admin_token: Optional[str] = Header(None)
+):
+    """
+    Analyze an uploaded list of YouTube channel URLs (admin only)
+    
+    The request body is the raw file (CSV or one URL per line; any column
+    may hold the URL). It is streamed to a spooled temp file, so large
+    uploads do not sit in memory, then channels are canonicalized,
+    deduplicated and analyzed by a bounded worker pool. Results stream back
+    as NDJSON, one record per URL with its status, then a summary record.
+    At most YOUTUBE_BULK_MAX_CHANNELS unique channels are looked up; the
+    rest are reported as over_limit.
+    """
+    _require_admin(x_admin_token)
+    upload = tempfile.SpooledTemporaryFile(max_size=1024 * 1024)
+    size = 0
+    async for chunk in request.stream():
+        size += len(chunk)
+        if size > config.YOUTUBE_BULK_MAX_BYTES:
+            upload.close()
+            raise HTTPException(status_code=413, detail="Upload too large")
+        upload.write(chunk)
+    upload.seek(0)
+    
+    async def results():
+        try:
+            lines = io.TextIOWrapper(upload, encoding="utf-8", errors="replace", newline="")
+            async for record in bulk_analyze(lines, concurrency):
+                yield json.dumps(record) + "\n"
+        finally:
+            upload.close()
+    
+    return StreamingResponse(results(), media_type=MEDIA_TYPES["ndjson"])
@@ -19,19 +19,137 @@ class Config:
     TEMPERATURE = 0.4
     MAX_TOKENS = 1024
     
+    # Model routing (see agent/model_router.py): cheap turns go to a small fast model
+    MODEL_ROUTING = os.getenv("MODEL_ROUTING", "true").lower() == "true"  # false: GROQ_MODEL for every turn
+    GROQ_FAST_MODEL = os.getenv("GROQ_FAST_MODEL", "llama-3.1-8b-instant")
+    GROQ_BASE_URL = os.getenv("GROQ_BASE_URL", "")  # empty for Groq; point at a local stand-in for tests
+    FAST_TEMPERATURE = 0.3
+    FAST_MAX_TOKENS = 320
+    
+    # Turn deadline (X-Deadline-Ms header, capped) and per-stage budgets within it
+    TURN_DEADLINE_MS = float(os.getenv("TURN_DEADLINE_MS", "10000"))  # leaves the LLM more than LLM_TIMEOUT
+    TURN_DEADLINE_MAX_MS = float(os.getenv("TURN_DEADLINE_MAX_MS", "30000"))
+    STAGE_BUDGET_RETRIEVAL_MS = float(os.getenv("STAGE_BUDGET_RETRIEVAL_MS", "400"))
+    STAGE_BUDGET_YOUTUBE_MS = float(os.getenv("STAGE_BUDGET_YOUTUBE_MS", "0"))  # wait for an in-flight channel lookup
+    STAGE_BUDGET_LEAD_CAPTURE_MS = float(os.getenv("STAGE_BUDGET_LEAD_CAPTURE_MS", "200"))
+    LLM_MIN_BUDGET_MS = float(os.getenv("LLM_MIN_BUDGET_MS", "800"))  # less left: answer without the LLM
+    STAGE_MIN_BUDGET_MS = float(os.getenv("STAGE_MIN_BUDGET_MS", "50"))  # less left: skip an optional stage
+    
+    # LLM circuit breaker: answer from the knowledge base while Groq fails or is slow
+    LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "8"))  # seconds before a reply call counts as failed
+    LLM_SLOW_CALL_SECONDS = float(os.getenv("LLM_SLOW_CALL_SECONDS", "5"))
+    LLM_BREAKER_WINDOW = float(os.getenv("LLM_BREAKER_WINDOW", "60"))  # seconds of outcomes considered
+    LLM_BREAKER_MIN_CALLS = int(os.getenv("LLM_BREAKER_MIN_CALLS", "10"))
+    LLM_BREAKER_FAILURE_RATE = float(os.getenv("LLM_BREAKER_FAILURE_RATE", "0.5"))
+    LLM_BREAKER_SLOW_RATE = float(os.getenv("LLM_BREAKER_SLOW_RATE", "0.8"))
+    LLM_BREAKER_OPEN_SECONDS = float(os.getenv("LLM_BREAKER_OPEN_SECONDS", "30"))  # before probing again
+    LLM_BREAKER_PROBES = int(os.getenv("LLM_BREAKER_PROBES", "2"))  # successes needed to close
+    
+    # LLM pricing for cost accounting (USD per million tokens)
+    LLM_INPUT_COST_PER_MTOK = float(os.getenv("LLM_INPUT_COST_PER_MTOK", "0.59"))
+    LLM_OUTPUT_COST_PER_MTOK = float(os.getenv("LLM_OUTPUT_COST_PER_MTOK", "0.79"))
+    LLM_FAST_INPUT_COST_PER_MTOK = float(os.getenv("LLM_FAST_INPUT_COST_PER_MTOK", "0.05"))
+    LLM_FAST_OUTPUT_COST_PER_MTOK = float(os.getenv("LLM_FAST_OUTPUT_COST_PER_MTOK", "0.08"))
+    
     # Memory Configuration
     MAX_CONVERSATION_TURNS = 6
     SESSION_TIMEOUT = 3600  # 1 hour in seconds
     
+    # Logging (queued to a background thread)
+    LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+    LOG_FORMAT = os.getenv("LOG_FORMAT", "json")  # "json" or "text"
+    LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "1.0"))  # share of DEBUG/INFO records kept
+    
+    # Request profiling (off unless asked for with X-Profile + X-Admin-Token, or sampled)
+    ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+    PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))  # share of chat requests profiled
+    PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+    PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "1"))
+    PROFILE_KEEP = 200  # most recent profiles kept on disk
+    
+    # Prefork serving (python -m app.prefork): workers forked from one preloaded master
+    WEB_WORKERS = int(os.getenv("WEB_WORKERS", "4"))
+    
+    # Duplicate chat submissions (Idempotency-Key header, else session + message + turn)
+    IDEMPOTENCY_TTL = int(os.getenv("IDEMPOTENCY_TTL", "300"))  # seconds a finished turn is replayed
+    IDEMPOTENCY_RETRY_WINDOW = int(os.getenv("IDEMPOTENCY_RETRY_WINDOW", "10"))  # seconds, requests without a key
+    IDEMPOTENCY_CACHE_SIZE = int(os.getenv("IDEMPOTENCY_CACHE_SIZE", "10000"))
+    
+    # Chat turn rate limits (GCRA: sustained rate per minute plus a burst), per session, client IP and tenant
+    RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+    RATE_LIMIT_SESSION_PER_MINUTE = float(os.getenv("RATE_LIMIT_SESSION_PER_MINUTE", "20"))
+    RATE_LIMIT_SESSION_BURST = int(os.getenv("RATE_LIMIT_SESSION_BURST", "5"))
+    RATE_LIMIT_IP_PER_MINUTE = float(os.getenv("RATE_LIMIT_IP_PER_MINUTE", "60"))
+    RATE_LIMIT_IP_BURST = int(os.getenv("RATE_LIMIT_IP_BURST", "20"))
+    RATE_LIMIT_TENANT_PER_MINUTE = float(os.getenv("RATE_LIMIT_TENANT_PER_MINUTE", "1200"))
+    RATE_LIMIT_TENANT_BURST = int(os.getenv("RATE_LIMIT_TENANT_BURST", "200"))
+    RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")  # "sqlite": shared by prefork workers
+    RATE_LIMIT_DB_PATH = os.getenv("RATE_LIMIT_DB_PATH", "rate_limits.sqlite")
+    RATE_LIMIT_SHARDS = int(os.getenv("RATE_LIMIT_SHARDS", "64"))
+    RATE_LIMIT_TRUST_FORWARDED = os.getenv("RATE_LIMIT_TRUST_FORWARDED", "false").lower() == "true"  # behind a proxy
+    
+    # Conversation state persistence: "memory" or "sqlite"
+    CHECKPOINTER = os.getenv("CHECKPOINTER", "memory")
+    CHECKPOINT_DB_PATH = os.getenv("CHECKPOINT_DB_PATH", "checkpoints.sqlite")
+    CHECKPOINTS_PER_SESSION = 2  # the latest, plus the one a cancelled turn is rewound to
+    
     # RAG Configuration
     EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
     CHUNK_SIZE = 500
     CHUNK_OVERLAP = 50
     TOP_K_RESULTS = 3
+    QUERY_EMBEDDING_CACHE_SIZE = 256  # recent message embeddings kept for reuse
     
     # Knowledge Base Path
     KNOWLEDGE_BASE_PATH = "app/data/knowledge.md"
     
+    # YouTube Channel Enrichment (mock analysis when no API key is set)
+    YOUTUBE_API_KEY = os.getenv("YOUTUBE_API_KEY", "")
+    YOUTUBE_API_BASE_URL = os.getenv("YOUTUBE_API_BASE_URL", "https://www.googleapis.com/youtube/v3")
+    YOUTUBE_API_TIMEOUT = 5.0
+    YOUTUBE_MAX_CONNECTIONS = 20
+    YOUTUBE_CACHE_TTL = int(os.getenv("YOUTUBE_CACHE_TTL", "86400"))  # seconds
+    YOUTUBE_NEGATIVE_TTL = int(os.getenv("YOUTUBE_NEGATIVE_TTL", "600"))  # seconds a not-found or failed lookup is kept
+    YOUTUBE_CACHE_SIZE = 100_000
+    YOUTUBE_BULK_CONCURRENCY = int(os.getenv("YOUTUBE_BULK_CONCURRENCY", "20"))  # lookups in flight per upload
+    YOUTUBE_BULK_MAX_BYTES = 50 * 1024 * 1024
+    YOUTUBE_BULK_MAX_CHANNELS = int(os.getenv("YOUTUBE_BULK_MAX_CHANNELS", "5000"))  # unique channels looked up per upload
+    
+    # Lead Delivery (outbox + background dispatcher)
+    LEAD_OUTBOX_PATH = os.getenv("LEAD_OUTBOX_PATH", "leads_outbox.sqlite")
+    LEAD_SINK = os.getenv("LEAD_SINK", "file")  # "file" (local stand-in) or "webhook"
+    LEAD_SINK_FILE = os.getenv("LEAD_SINK_FILE", "leads_delivered.jsonl")
+    LEAD_WEBHOOK_URL = os.getenv("LEAD_WEBHOOK_URL", "")
+    LEAD_BATCH_SIZE = 50
+    LEAD_DISPATCH_INTERVAL = 1.0  # seconds between outbox polls
+    LEAD_MAX_ATTEMPTS = 8
+    LEAD_RETRY_BACKOFF = 2.0  # seconds, doubled per attempt
+    
+    # Cross-session lead deduplication within a tenant (normalized email, optionally YouTube channel)
+    LEAD_DEDUP_BY_CHANNEL = os.getenv("LEAD_DEDUP_BY_CHANNEL", "false").lower() == "true"
+    LEAD_DEDUP_CACHE_SIZE = 100_000  # identity keys kept in memory
+    LEAD_DEDUP_BLOOM_CAPACITY = 1_000_000
+    LEAD_DEDUP_BLOOM_ERROR = 0.01
+    
+    # Precomputed replies to the frontend's quick-reply buttons (python -m app.agent.quick_replies builds them)
+    QUICK_REPLIES_ENABLED = os.getenv("QUICK_REPLIES_ENABLED", "true").lower() == "true"
+    QUICK_REPLIES_SOURCE_PATH = "app/data/quick_replies.json"  # button texts and states to precompute
+    QUICK_REPLIES_ARTIFACT_PATH = os.getenv("QUICK_REPLIES_ARTIFACT_PATH", "quick_replies.artifact.json")
+    QUICK_REPLIES_BUILD_ON_STARTUP = os.getenv("QUICK_REPLIES_BUILD_ON_STARTUP", "true").lower() == "true"  # when missing or stale
+    
+    # Local Intent Classification (falls back to the LLM below these thresholds)
+    INTENT_EXAMPLES_PATH = "app/data/intent_examples.json"
+    INTENT_EVAL_PATH = "app/data/intent_eval.json"
+    INTENT_LOCAL_MIN_SIMILARITY = float(os.getenv("INTENT_LOCAL_MIN_SIMILARITY", "0.45"))
+    INTENT_LOCAL_MIN_MARGIN = float(os.getenv("INTENT_LOCAL_MIN_MARGIN", "0.05"))
+    
+    # FAQ direct answers from the knowledge base (skip retrieval and the LLM above these thresholds)
+    FAQ_ENABLED = os.getenv("FAQ_ENABLED", "true").lower() == "true"
+    FAQ_PATH = "app/data/faq.json"  # sections to answer from, intents and extra phrasings
+    FAQ_EVAL_PATH = "app/data/faq_eval.json"
+    FAQ_MIN_SIMILARITY = float(os.getenv("FAQ_MIN_SIMILARITY", "0.8"))
+    FAQ_MIN_MARGIN = float(os.getenv("FAQ_MIN_MARGIN", "0.05"))  # over the next-best FAQ entry
+    
     @classmethod
     def validate(cls):
         """Validate required configuration"""
@@ -0,0 +1,150 @@
+"""
+Export Streams
+Row generators and NDJSON/CSV encoders for the lead and session export endpoints
+"""
+import csv
+import io
+import json
+from datetime import datetime, timezone
+from typing import AsyncIterator, Iterable, Iterator, List, Optional
+from app.leads.outbox import lead_outbox
+from app.memory.session_store import session_store
+
+LEAD_COLUMNS = [
+    "id", "lead_id", "name", "email", "platform", "selected_plan", "yt_channel",
+    "session_id", "tenant_id", "captured_at", "status", "attempts", "delivered_at", "revision",
+    "llm_calls", "input_tokens", "output_tokens", "llm_cost_usd"
+]
+
+SESSION_COLUMNS = [
+    "session_id", "tenant_id", "last_active", "conversation_state", "intent", "name", "email",
+    "platform", "selected_plan", "yt_channel", "lead_captured", "turn_count", "message_count",
+    "llm_calls", "input_tokens", "output_tokens", "llm_cost_usd"
+]
+
+MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+
+def _iso(timestamp: Optional[float]) -> Optional[str]:
+    if timestamp is None:
+        return None
+    return datetime.fromtimestamp(timestamp, tz=timezone.utc).isoformat()
+
+
+def _usage_columns(usage: Optional[dict]) -> dict:
+    usage = usage or {}
+    return {
+        "llm_calls": usage.get("calls", 0),
+        "input_tokens": usage.get("input_tokens", 0),
+        "output_tokens": usage.get("output_tokens", 0),
+        "llm_cost_usd": round(usage.get("cost_usd", 0.0), 6)
+    }
+
+
+def lead_rows(
+    after_id: int = 0,
+    since: Optional[float] = None,
+    until: Optional[float] = None,
+    plan: Optional[str] = None,
+    platform: Optional[str] = None,
+    limit: Optional[int] = None
+) -> Iterator[dict]:
+    """
+    Flattened lead rows from the outbox, oldest first
+
+    Pass the last row's "id" as after_id to fetch the next page.
+    """
+    for count, entry in enumerate(lead_outbox.iter_leads(after_id, since, until, plan, platform)):
+        if limit is not None and count >= limit:
+            return
+        lead = entry["lead"]
+        yield {
+            "id": entry["id"],
+            "lead_id": entry["lead_id"],
+            "name": lead.get("name"),
+            "email": lead.get("email"),
+            "platform": lead.get("platform"),
+            "selected_plan": lead.get("selected_plan"),
+            "yt_channel": lead.get("yt_channel"),
+            "session_id": lead.get("session_id"),
+            "tenant_id": lead.get("tenant_id", "default"),
+            "captured_at": _iso(lead.get("captured_at")),
+            "status": entry["status"],
+            "attempts": entry["attempts"],
+            "delivered_at": _iso(entry["delivered_at"]),
+            "revision": lead.get("revision", 0),
+            **_usage_columns(lead.get("token_usage"))
+        }
+
+
+async def session_rows(
+    after: Optional[str] = None,
+    since: Optional[float] = None,
+    until: Optional[float] = None,
+    plan: Optional[str] = None,
+    platform: Optional[str] = None,
+    limit: Optional[int] = None
+) -> AsyncIterator[dict]:
+    """
+    Live session summaries in session_id order, filtered by last activity,
+    plan and platform
+
+    Pass the last row's "session_id" as after to fetch the next page.
+    """
+    count = 0
+    async for session_id, last_access, state in session_store.iter_sessions(after):
+        if limit is not None and count >= limit:
+            return
+        if since is not None and last_access < since:
+            continue
+        if until is not None and last_access > until:
+            continue
+        if plan and (state.get("selected_plan") or "").lower() != plan.lower():
+            continue
+        if platform and (state.get("platform") or "").lower() != platform.lower():
+            continue
+        count += 1
+        yield {
+            "session_id": session_id,
+            "tenant_id": state.get("tenant_id", "default"),
+            "last_active": _iso(last_access),
+            "conversation_state": state.get("conversation_state", "DISCOVERY"),
+            "intent": state.get("intent"),
+            "name": state.get("name"),
+            "email": state.get("email"),
+            "platform": state.get("platform"),
+            "selected_plan": state.get("selected_plan"),
+            "yt_channel": state.get("yt_channel"),
+            "lead_captured": state.get("lead_captured", False),
+            "turn_count": state.get("turn_count", 0),
+            "message_count": len(state.get("messages", [])),
+            **_usage_columns(state.get("token_usage"))
+        }
+
+
+def _csv_line(values: list) -> str:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerow(values)
+    return buffer.getvalue()
+
+
+def encode(rows: Iterable[dict], fmt: str, columns: List[str]) -> Iterator[str]:
+    """Encode rows one line at a time as NDJSON or CSV (with a header row)"""
+    if fmt == "csv":
+        yield _csv_line(columns)
+        for row in rows:
+            yield _csv_line([row.get(column) for column in columns])
+    else:
+        for row in rows:
+            yield json.dumps(row) + "\n"
+
+
+async def aencode(rows: AsyncIterator[dict], fmt: str, columns: List[str]) -> AsyncIterator[str]:
+    """Async counterpart of encode()"""
+    if fmt == "csv":
+        yield _csv_line(columns)
+        async for row in rows:
+            yield _csv_line([row.get(column) for column in columns])
+    else:
+        async for row in rows:
+            yield json.dumps(row) + "\n"
@@ -0,0 +1,152 @@
+"""
+Idempotent Requests
+Duplicate chat submissions attach to the in-flight turn or replay its recent result
+"""
+import asyncio
+import functools
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+from app.config import config
+
+
+def request_key(session_id: str, idempotency_key: Optional[str] = None,
+                message: Optional[str] = None, turn_count: int = 0) -> str:
+    """
+    Key identifying one logical chat submission
+
+    Args:
+        session_id: Session the message was sent to (keys never cross sessions)
+        idempotency_key: Client-supplied Idempotency-Key header, if any
+        message: User message (fallback key)
+        turn_count: Session turn count the message was sent against (fallback key)
+    """
+    if idempotency_key:
+        return f"{session_id}:k:{idempotency_key}"
+    digest = hashlib.sha256(f"{turn_count}\x00{message}".encode("utf-8")).hexdigest()[:32]
+    return f"{session_id}:h:{digest}"
+
+
+class IdempotentRequests:
+    """
+    Runs each logical request once.
+
+    A request whose key is already running awaits that computation instead
+    of starting its own; one whose key completed recently gets the stored
+    result. Results live in a TTL table capped at IDEMPOTENCY_CACHE_SIZE
+    entries (oldest dropped first). Failures are not stored, so a retry
+    after an error runs again.
+
+    The computation runs in its own task and callers await it shielded,
+    so the client that started it going away does not cancel it for the
+    duplicates waiting on it. Once every caller awaiting a computation has
+    been cancelled, it is cancelled too.
+    """
+
+    def __init__(self, ttl: float = None, max_entries: int = None):
+        self.ttl = config.IDEMPOTENCY_TTL if ttl is None else ttl
+        self.max_entries = config.IDEMPOTENCY_CACHE_SIZE if max_entries is None else max_entries
+        self._results: OrderedDict[str, Tuple[float, Any]] = OrderedDict()
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._waiters: Dict[str, int] = {}
+        self.counters = {"executed": 0, "coalesced": 0, "replayed": 0, "failed": 0, "cancelled": 0}
+
+    def _get(self, key: str) -> Tuple[bool, Any]:
+        entry = self._results.get(key)
+        if entry is None:
+            return False, None
+        expires, result = entry
+        if expires < time.monotonic():
+            del self._results[key]
+            return False, None
+        return True, result
+
+    def put(self, key: str, result: Any, ttl: float = None):
+        """Store a result for key (also used to alias a finished turn under a second key)"""
+        self._results[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), result)
+        self._results.move_to_end(key)
+        while len(self._results) > self.max_entries:
+            self._results.popitem(last=False)
+
+    async def run(self, key: str, compute: Callable[[], Awaitable[Any]],
+                  on_result: Optional[Callable[[Any], None]] = None,
+                  admit: Optional[Callable[[], None]] = None) -> Tuple[Any, str]:
+        """
+        Result for key, computing it at most once
+
+        Args:
+            key: Request key (see request_key)
+            compute: Produces the result when nothing is in flight or stored
+            on_result: Called once with a fresh result after it is stored
+            admit: Called just before a new computation starts (never for a
+                replay or a coalesced duplicate); raising refuses the request
+
+        Returns:
+            (result, how) where how is "executed", "coalesced" or "replayed"
+        """
+        found, result = self._get(key)
+        if found:
+            self.counters["replayed"] += 1
+            return result, "replayed"
+
+        task = self._inflight.get(key)
+        if task is not None and task.get_loop() is asyncio.get_running_loop():
+            self.counters["coalesced"] += 1
+            how = "coalesced"
+        else:
+            if admit is not None:
+                admit()
+            self.counters["executed"] += 1
+            task = asyncio.create_task(self._compute(key, compute, on_result))
+            self._inflight[key] = task
+            task.add_done_callback(functools.partial(self._forget, key))
+            how = "executed"
+
+        self._waiters[key] = self._waiters.get(key, 0) + 1
+        try:
+            return await asyncio.shield(task), how
+        except asyncio.CancelledError:
+            # This caller gave up; stop the work if nobody else is waiting for it
+            if self._waiters[key] == 1 and not task.done():
+                task.cancel()
+            raise
+        finally:
+            self._waiters[key] -= 1
+            if not self._waiters[key]:
+                del self._waiters[key]
+
+    async def _compute(self, key: str, compute: Callable[[], Awaitable[Any]],
+                       on_result: Optional[Callable[[Any], None]]) -> Any:
+        try:
+            result = await compute()
+        except asyncio.CancelledError:
+            self.counters["cancelled"] += 1
+            raise
+        except Exception:
+            self.counters["failed"] += 1
+            raise
+        self.put(key, result)
+        if on_result is not None:
+            on_result(result)
+        return result
+
+    def _forget(self, key: str, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # Nobody may be left awaiting a failed computation
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self) -> dict:
+        """Duplicate-suppression counters and table sizes"""
+        return {
+            **self.counters,
+            "stored": len(self._results),
+            "in_flight": len(self._inflight),
+            "max_entries": self.max_entries
+        }
+
+
+# Singleton instance
+chat_requests = IdempotentRequests()
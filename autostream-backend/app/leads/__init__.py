@@ -0,0 +1 @@
+"""Leads module initialization"""
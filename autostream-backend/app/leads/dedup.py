@@ -0,0 +1,283 @@
+"""
+Lead Deduplication Index
+Per-tenant index of captured leads by normalized email and canonical YouTube channel
+"""
+import hashlib
+import math
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+from app.config import config
+from app.agent.youtube_analyzer import canonical_channel
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS lead_index (
+    dedup_key TEXT PRIMARY KEY,
+    lead_key TEXT NOT NULL,
+    created_at REAL NOT NULL
+) WITHOUT ROWID;
+"""
+
+# Mailbox providers that ignore dots in the local part
+_DOTLESS_DOMAINS = {"gmail.com", "googlemail.com"}
+
+
+def normalize_email(email: str) -> str:
+    """
+    Normalize an email address for identity comparison
+
+    Lowercases, drops "+tag" sub-addresses, and drops dots in the local part
+    for providers that ignore them ("Jane.Doe+yt@gmail.com" -> "janedoe@gmail.com").
+    """
+    email = email.strip().lower()
+    local, sep, domain = email.rpartition("@")
+    if not sep:
+        return email
+    local = local.split("+", 1)[0]
+    if domain == "googlemail.com":
+        domain = "gmail.com"
+    if domain in _DOTLESS_DOMAINS:
+        local = local.replace(".", "")
+    return f"{local}@{domain}"
+
+
+def dedup_keys(email: Optional[str], yt_channel: Optional[str] = None, tenant_id: Optional[str] = None) -> List[str]:
+    """Index keys identifying a lead within its tenant: its email, and its channel when enabled"""
+    prefix = f"{tenant_id or 'default'}|"
+    keys = []
+    if email:
+        keys.append(prefix + "email:" + normalize_email(email))
+    if yt_channel and config.LEAD_DEDUP_BY_CHANNEL:
+        channel = canonical_channel(yt_channel)
+        if channel:
+            keys.append(prefix + "yt:" + channel)
+    return keys
+
+
+class BloomFilter:
+    """
+    Fixed-size Bloom filter over strings.
+
+    Sized for `capacity` keys at `error_rate` false positives; k bit
+    positions come from one 128-bit blake2b digest by double hashing.
+    """
+
+    def __init__(self, capacity: int, error_rate: float = 0.01):
+        self.capacity = max(1, capacity)
+        self.error_rate = error_rate
+        self.num_bits = max(8, int(-self.capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.num_hashes = max(1, round(self.num_bits / self.capacity * math.log(2)))
+        self.bits = bytearray((self.num_bits + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key: str):
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.num_bits for i in range(self.num_hashes)]
+
+    def add(self, key: str):
+        for pos in self._positions(key):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, key: str) -> bool:
+        bits = self.bits
+        return all(bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+
+class LeadDedupIndex:
+    """
+    Maps dedup keys (normalized email, canonical channel, both scoped to
+    the tenant) to the outbox key of the lead that first claimed them.
+
+    Lookups go Bloom filter -> in-memory LRU map -> SQLite. A key that was
+    never seen is rejected by the Bloom filter without touching the
+    database, which is the common case for a new lead; the LRU keeps
+    recently seen leads in memory without holding millions of keys.
+    """
+
+    def __init__(self, path: str = None):
+        """
+        Args:
+            path: SQLite database file (":memory:" for a throwaway index)
+        """
+        self.path = path or config.LEAD_OUTBOX_PATH
+        self.cache_size = config.LEAD_DEDUP_CACHE_SIZE
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._cache: OrderedDict[str, str] = OrderedDict()
+        self.counters = {
+            "bloom_negatives": 0,
+            "cache_hits": 0,
+            "store_lookups": 0,
+            "bloom_false_positives": 0,
+            "duplicates": 0
+        }
+        self._load_bloom(config.LEAD_DEDUP_BLOOM_CAPACITY)
+
+    def _load_bloom(self, capacity: int):
+        """(Re)build the Bloom filter from every persisted key"""
+        total = self._conn.execute("SELECT COUNT(*) FROM lead_index").fetchone()[0]
+        self._bloom = BloomFilter(max(capacity, total * 2), config.LEAD_DEDUP_BLOOM_ERROR)
+        for (key,) in self._conn.execute("SELECT dedup_key FROM lead_index"):
+            self._bloom.add(key)
+
+    def _remember(self, key: str, lead_key: str):
+        self._cache[key] = lead_key
+        self._cache.move_to_end(key)
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def _lookup(self, key: str) -> Optional[str]:
+        if key not in self._bloom:
+            self.counters["bloom_negatives"] += 1
+            return None
+        lead_key = self._cache.get(key)
+        if lead_key is not None:
+            self.counters["cache_hits"] += 1
+            self._cache.move_to_end(key)
+            return lead_key
+        self.counters["store_lookups"] += 1
+        row = self._conn.execute(
+            "SELECT lead_key FROM lead_index WHERE dedup_key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            self.counters["bloom_false_positives"] += 1
+            return None
+        self._remember(key, row[0])
+        return row[0]
+
+    def find(self, email: Optional[str], yt_channel: Optional[str] = None,
+             tenant_id: Optional[str] = None) -> Optional[str]:
+        """
+        Look up an existing lead
+
+        Returns:
+            Outbox key of the matching lead, or None
+        """
+        with self._lock:
+            for key in dedup_keys(email, yt_channel, tenant_id):
+                lead_key = self._lookup(key)
+                if lead_key:
+                    return lead_key
+        return None
+
+    def claim(self, lead_key: str, email: Optional[str], yt_channel: Optional[str] = None,
+              tenant_id: Optional[str] = None) -> Optional[str]:
+        """
+        Atomically match a lead against the index or register it as new
+
+        Any identity key not yet in the index is attached to the matched
+        lead (or the new one), so a returning user who adds a channel can
+        later be matched by either. A new lead must be stored under
+        `lead_key` afterwards, or the claim given back with release().
+
+        Args:
+            lead_key: Outbox key the lead will be stored under if it is new
+
+        Returns:
+            Outbox key of the existing lead it duplicates, or None if it is new
+        """
+        keys = dedup_keys(email, yt_channel, tenant_id)
+        with self._lock:
+            existing = None
+            for key in keys:
+                existing = self._lookup(key)
+                if existing:
+                    break
+            while True:
+                owner = existing or lead_key
+                inserted, taken = self._insert_keys(keys, owner, check=existing is None)
+                if taken is None:
+                    break
+                # Another worker process registered this key after our Bloom
+                # filter was built: the lead is theirs
+                existing = taken
+            for key in inserted:
+                self._bloom.add(key)
+                self._remember(key, owner)
+            if existing:
+                self.counters["duplicates"] += 1
+            if self._bloom.count > self._bloom.capacity:
+                self._load_bloom(self._bloom.capacity * 2)
+        return existing
+
+    def release(self, lead_key: str, email: Optional[str], yt_channel: Optional[str] = None,
+                tenant_id: Optional[str] = None):
+        """
+        Give back the keys a new lead claimed when it could not be stored,
+        so the index never points at a lead that does not exist
+
+        The Bloom filter keeps the keys; a later lookup just goes to SQLite.
+        """
+        keys = dedup_keys(email, yt_channel, tenant_id)
+        with self._lock:
+            self._conn.executemany(
+                "DELETE FROM lead_index WHERE dedup_key = ? AND lead_key = ?",
+                ((key, lead_key) for key in keys)
+            )
+            for key in keys:
+                if self._cache.get(key) == lead_key:
+                    del self._cache[key]
+
+    def _insert_keys(self, keys: List[str], owner: str, check: bool) -> Tuple[List[str], Optional[str]]:
+        """
+        Insert the keys for `owner` in one transaction
+
+        Args:
+            check: Roll back if a key already belongs to another lead (a new lead claiming keys)
+
+        Returns:
+            (keys inserted, owner of the first key found taken, or None)
+        """
+        now = time.time()
+        inserted = []
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            for key in keys:
+                if key in self._cache and self._cache[key] == owner:
+                    continue
+                cursor = self._conn.execute(
+                    "INSERT OR IGNORE INTO lead_index (dedup_key, lead_key, created_at) VALUES (?, ?, ?)",
+                    (key, owner, now)
+                )
+                if cursor.rowcount == 1:
+                    inserted.append(key)
+                elif check:
+                    taken = self._conn.execute(
+                        "SELECT lead_key FROM lead_index WHERE dedup_key = ?", (key,)
+                    ).fetchone()[0]
+                    self._conn.execute("ROLLBACK")
+                    self._bloom.add(key)
+                    self._remember(key, taken)
+                    return [], taken
+            self._conn.execute("COMMIT")
+        except Exception:
+            self._conn.execute("ROLLBACK")
+            raise
+        return inserted, None
+
+    def stats(self) -> Dict[str, int]:
+        """Index size, lookup path counters and memory footprint"""
+        with self._lock:
+            return {
+                "keys": self._bloom.count,
+                "cached_keys": len(self._cache),
+                "bloom_bytes": len(self._bloom.bits),
+                **self.counters
+            }
+
+    def close(self):
+        """Close the database connection"""
+        with self._lock:
+            self._conn.close()
+
+
+# Singleton instance
+lead_dedup = LeadDedupIndex()
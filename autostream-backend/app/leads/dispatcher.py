@@ -0,0 +1,87 @@
+"""
+Lead Dispatcher
+Background thread that drains the lead outbox into the CRM sink in batches
+"""
+import logging
+import threading
+from typing import Optional
+from app.config import config
+from app.leads.outbox import LeadOutbox, lead_outbox
+from app.leads.sinks import LeadSink, build_sink
+
+logger = logging.getLogger(__name__)
+
+
+class LeadDispatcher:
+    """
+    Delivers outbox entries off the request path.
+
+    Wakes up when a lead is appended (notify) or every poll interval, claims
+    a batch, and hands it to the sink. Failed batches are retried with
+    exponential backoff; the sink deduplicates on idempotency keys.
+    """
+
+    def __init__(self, outbox: LeadOutbox, sink: LeadSink = None):
+        self.outbox = outbox
+        self.sink = sink
+        self.batch_size = config.LEAD_BATCH_SIZE
+        self.poll_interval = config.LEAD_DISPATCH_INTERVAL
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        """Start the background delivery thread"""
+        if self._thread and self._thread.is_alive():
+            return
+        if self.sink is None:
+            self.sink = build_sink()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="lead-dispatcher", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        """Stop after the in-flight batch; undelivered leads stay in the outbox"""
+        self._stop.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout)
+
+    def notify(self):
+        """Wake the dispatcher after an append instead of waiting for the next poll"""
+        self._wake.set()
+
+    def dispatch_once(self) -> int:
+        """
+        Deliver one batch
+
+        Returns:
+            Number of leads claimed
+        """
+        batch = self.outbox.claim_batch(self.batch_size, max_attempts=config.LEAD_MAX_ATTEMPTS)
+        if not batch:
+            return 0
+
+        ids = [entry["id"] for entry in batch]
+        try:
+            self.sink.deliver(batch)
+            self.outbox.mark_delivered(ids)
+        except Exception as e:
+            logger.warning("Lead delivery failed", extra={"sink": self.sink.name, "leads": len(batch), "error": str(e)})
+            self.outbox.mark_failed(ids, str(e), config.LEAD_MAX_ATTEMPTS, config.LEAD_RETRY_BACKOFF)
+        return len(batch)
+
+    def _run(self):
+        while not self._stop.is_set():
+            # Drain full batches back to back, then sleep until notified or polled
+            self._wake.clear()
+            try:
+                if self.dispatch_once() >= self.batch_size:
+                    continue
+            except Exception as e:
+                logger.exception("Lead dispatcher error")
+            self._wake.wait(self.poll_interval)
+
+
+# Singleton instance
+lead_dispatcher = LeadDispatcher(lead_outbox)
@@ -0,0 +1,330 @@
+"""
+Lead Outbox
+Append-only SQLite log of captured leads awaiting delivery to the CRM
+"""
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterator, List, Optional
+from app.config import config
+from app.leads.dedup import normalize_email
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS lead_outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    idempotency_key TEXT NOT NULL UNIQUE,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL,
+    lease_until REAL,
+    created_at REAL NOT NULL,
+    delivered_at REAL,
+    last_error TEXT
+);
+CREATE INDEX IF NOT EXISTS lead_outbox_due ON lead_outbox (status, next_attempt_at);
+"""
+
+
+def idempotency_key(session_id: Optional[str], email: str) -> str:
+    """Stable key for one capture, so a retried capture never creates a second CRM record"""
+    raw = f"{session_id or ''}|{email.strip().lower()}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:32]
+
+
+class LeadOutbox:
+    """
+    Durable queue between the chat turn and the CRM.
+
+    The chat turn only pays for a local append; delivery happens later in
+    LeadDispatcher. WAL mode with synchronous=NORMAL means commits are not
+    fsynced one by one: the WAL is synced at checkpoints, batching fsyncs
+    across many appends while staying crash-safe for the database itself.
+    """
+
+    def __init__(self, path: str = None):
+        """
+        Args:
+            path: SQLite database file (":memory:" for a throwaway outbox)
+        """
+        self.path = path or config.LEAD_OUTBOX_PATH
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+
+    def append(self, lead: dict, key: str) -> bool:
+        """
+        Append a lead for delivery
+
+        Args:
+            lead: Lead record (JSON-serializable)
+            key: Idempotency key; appending the same key twice is a no-op
+
+        Returns:
+            True if the lead was new
+        """
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT OR IGNORE INTO lead_outbox (idempotency_key, payload, next_attempt_at, created_at) "
+                "VALUES (?, ?, ?, ?)",
+                (key, json.dumps(lead), now, now)
+            )
+        return cursor.rowcount == 1
+
+    def merge(self, key: str, lead: dict) -> bool:
+        """
+        Merge a duplicate capture into an existing lead and queue the
+        merged record for (re-)delivery as a new revision
+
+        When the duplicate has the lead's email it is the same person, and
+        its fields win when present (a returning user may have picked
+        another plan). A duplicate matched by channel under another email
+        may be someone else on the same channel, so the lead's fields are
+        kept and only that email is added to other_emails. The sessions it
+        came from and their token usage are accumulated either way.
+
+        Args:
+            key: Idempotency key of the existing lead
+            lead: Duplicate lead record
+
+        Returns:
+            False if no lead exists under `key`
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT payload FROM lead_outbox WHERE idempotency_key = ?", (key,)
+                ).fetchone()
+                if row is None:
+                    self._conn.execute("ROLLBACK")
+                    return False
+
+                merged = json.loads(row[0])
+                sessions = merged.get("session_ids") or [merged.get("session_id")]
+                email = lead.get("email")
+                same_person = bool(email) and normalize_email(email) == normalize_email(merged.get("email", ""))
+                if same_person:
+                    for field, value in lead.items():
+                        if value and field not in ("email", "session_id", "tenant_id", "captured_at", "token_usage"):
+                            merged[field] = value
+                # Token spend accumulates across the sessions that produced the lead
+                if lead.get("token_usage"):
+                    usage = dict(merged.get("token_usage") or {})
+                    for field, value in lead["token_usage"].items():
+                        usage[field] = usage.get(field, 0) + value
+                    merged["token_usage"] = usage
+                # The first email stays the lead's identity; others matched by channel are kept
+                if email and not same_person:
+                    merged["other_emails"] = sorted(set(merged.get("other_emails", [])) | {email})
+                if lead.get("session_id") and lead["session_id"] not in sessions:
+                    sessions.append(lead["session_id"])
+                merged["session_ids"] = [s for s in sessions if s]
+                merged["revision"] = merged.get("revision", 0) + 1
+                merged["updated_at"] = now
+
+                # Back to pending whatever the status; an in-flight delivery of the
+                # previous revision will no longer settle this row (see mark_delivered)
+                self._conn.execute(
+                    "UPDATE lead_outbox SET payload = ?, status = 'pending', attempts = 0, "
+                    "next_attempt_at = ?, lease_until = NULL, last_error = NULL WHERE idempotency_key = ?",
+                    (json.dumps(merged), now, key)
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return True
+
+    def claim_batch(self, limit: int, lease_seconds: float = 60.0, max_attempts: int = None) -> List[dict]:
+        """
+        Lease up to `limit` due leads for delivery
+
+        A lease that is not settled before it expires (e.g. the process died
+        mid-delivery) makes the lead due again. That delivery never reported
+        back, so it counts as a failed attempt: a lead that keeps killing its
+        dispatcher is parked as 'dead' after max_attempts, as in mark_failed.
+
+        Args:
+            limit: Most leads to lease
+            lease_seconds: How long the lease holds before the lead is due again
+            max_attempts: Attempts before a lead is parked (default LEAD_MAX_ATTEMPTS)
+
+        Returns:
+            List of {"id", "lead_id", "idempotency_key", "attempts", "lead"} dicts;
+            merged revisions get their own idempotency key so the CRM applies them
+        """
+        max_attempts = max_attempts or config.LEAD_MAX_ATTEMPTS
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                due = self._conn.execute(
+                    "SELECT id, idempotency_key, status, attempts, payload FROM lead_outbox "
+                    "WHERE (status = 'pending' AND next_attempt_at <= ?) "
+                    "   OR (status = 'sending' AND lease_until < ?) "
+                    "ORDER BY id LIMIT ?",
+                    (now, now, limit)
+                ).fetchall()
+                rows, dead = [], []
+                for lead_id, key, status, attempts, payload in due:
+                    if status == "sending":
+                        attempts += 1
+                        if attempts >= max_attempts:
+                            dead.append((attempts, lead_id))
+                            continue
+                    rows.append((lead_id, key, attempts, payload))
+                if dead:
+                    self._conn.executemany(
+                        "UPDATE lead_outbox SET status = 'dead', attempts = ?, lease_until = NULL, "
+                        "last_error = 'lease expired before delivery was settled' WHERE id = ?",
+                        dead
+                    )
+                if rows:
+                    self._conn.executemany(
+                        "UPDATE lead_outbox SET status = 'sending', attempts = ?, lease_until = ? WHERE id = ?",
+                        [(row[2], now + lease_seconds, row[0]) for row in rows]
+                    )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+        batch = []
+        for lead_id, key, attempts, payload in rows:
+            lead = json.loads(payload)
+            revision = lead.get("revision", 0)
+            batch.append({
+                "id": lead_id,
+                "lead_id": key,
+                "idempotency_key": f"{key}:{revision}" if revision else key,
+                "attempts": attempts,
+                "lead": lead
+            })
+        return batch
+
+    def mark_delivered(self, ids: List[int]):
+        """Settle a delivered batch"""
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE lead_outbox SET status = 'delivered', delivered_at = ?, lease_until = NULL "
+                "WHERE id = ? AND status = 'sending'",
+                [(now, i) for i in ids]
+            )
+
+    def mark_failed(self, ids: List[int], error: str, max_attempts: int, base_backoff: float):
+        """
+        Schedule a failed batch for retry with exponential backoff,
+        or park it as 'dead' once it has used up its attempts
+        """
+        now = time.time()
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT id, attempts FROM lead_outbox WHERE status = 'sending' "
+                f"AND id IN ({','.join('?' * len(ids))})", ids
+            ).fetchall()
+            updates = []
+            for lead_id, attempts in rows:
+                attempts += 1
+                status = "dead" if attempts >= max_attempts else "pending"
+                next_attempt = now + base_backoff * (2 ** (attempts - 1))
+                updates.append((status, attempts, next_attempt, error[:500], lead_id))
+            self._conn.executemany(
+                "UPDATE lead_outbox SET status = ?, attempts = ?, next_attempt_at = ?, "
+                "last_error = ?, lease_until = NULL WHERE id = ?",
+                updates
+            )
+
+    def iter_leads(
+        self,
+        after_id: int = 0,
+        since: Optional[float] = None,
+        until: Optional[float] = None,
+        plan: Optional[str] = None,
+        platform: Optional[str] = None,
+        page_size: int = 500
+    ) -> Iterator[dict]:
+        """
+        Iterate leads in id order with keyset pagination
+
+        Each page is a separate short read on its own connection, so an
+        export never holds the writer lock and, in WAL mode, never blocks
+        captures or the dispatcher. Memory stays at one page.
+
+        Args:
+            after_id: Only leads with a larger outbox id (the export cursor)
+            since, until: Capture time bounds (epoch seconds, inclusive)
+            plan: Selected plan, e.g. "pro"
+            platform: Platform, case-insensitive
+
+        Yields:
+            {"id", "lead_id", "status", "attempts", "delivered_at", "lead"} dicts
+        """
+        where = ["id > ?"]
+        params: list = []
+        if since is not None:
+            where.append("created_at >= ?")
+            params.append(since)
+        if until is not None:
+            where.append("created_at <= ?")
+            params.append(until)
+        if plan:
+            where.append("lower(json_extract(payload, '$.selected_plan')) = ?")
+            params.append(plan.lower())
+        if platform:
+            where.append("lower(json_extract(payload, '$.platform')) = ?")
+            params.append(platform.lower())
+        query = (
+            "SELECT id, idempotency_key, status, attempts, delivered_at, payload FROM lead_outbox "
+            f"WHERE {' AND '.join(where)} ORDER BY id LIMIT ?"
+        )
+
+        shared = self.path == ":memory:"
+        conn = self._conn if shared else sqlite3.connect(self.path, check_same_thread=False)
+        try:
+            cursor = after_id
+            while True:
+                if shared:
+                    with self._lock:
+                        rows = conn.execute(query, (cursor, *params, page_size)).fetchall()
+                else:
+                    rows = conn.execute(query, (cursor, *params, page_size)).fetchall()
+                for lead_id, key, status, attempts, delivered_at, payload in rows:
+                    yield {
+                        "id": lead_id,
+                        "lead_id": key,
+                        "status": status,
+                        "attempts": attempts,
+                        "delivered_at": delivered_at,
+                        "lead": json.loads(payload)
+                    }
+                if len(rows) < page_size:
+                    return
+                cursor = rows[-1][0]
+        finally:
+            if not shared:
+                conn.close()
+
+    def stats(self) -> Dict[str, int]:
+        """Lead counts per delivery status"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT status, COUNT(*) FROM lead_outbox GROUP BY status"
+            ).fetchall()
+        return {status: count for status, count in rows}
+
+    def close(self):
+        """Close the database connection"""
+        with self._lock:
+            self._conn.close()
+
+
+# Singleton instance
+lead_outbox = LeadOutbox()
@@ -0,0 +1,73 @@
+"""
+Lead Delivery Sinks
+Destinations the lead dispatcher delivers batches to
+"""
+import json
+import os
+from typing import List
+import httpx
+from app.config import config
+
+
+class LeadSink:
+    """Delivers a batch of leads; raising marks the whole batch for retry"""
+
+    name = "base"
+
+    def deliver(self, batch: List[dict]):
+        """
+        Args:
+            batch: Outbox entries with "lead_id", "idempotency_key" and "lead"
+        """
+        raise NotImplementedError
+
+
+class WebhookSink(LeadSink):
+    """
+    POSTs batches to a CRM webhook as {"leads": [...]}.
+    Every lead carries its idempotency key so the receiver can drop
+    re-deliveries after a timeout or a partial failure, and a stable
+    lead_id to upsert merged revisions of the same lead onto.
+    """
+
+    name = "webhook"
+
+    def __init__(self, url: str, timeout: float = 10.0):
+        self.url = url
+        self.client = httpx.Client(timeout=timeout)
+
+    def deliver(self, batch: List[dict]):
+        response = self.client.post(self.url, json={
+            "leads": [
+                {"lead_id": entry["lead_id"], "idempotency_key": entry["idempotency_key"], **entry["lead"]}
+                for entry in batch
+            ]
+        })
+        response.raise_for_status()
+
+
+class FileSink(LeadSink):
+    """Local stand-in for the CRM: appends delivered leads to a JSONL file"""
+
+    name = "file"
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def deliver(self, batch: List[dict]):
+        with open(self.path, "a", encoding="utf-8") as f:
+            for entry in batch:
+                f.write(json.dumps({
+                    "lead_id": entry["lead_id"], "idempotency_key": entry["idempotency_key"], **entry["lead"]
+                }) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+
+def build_sink() -> LeadSink:
+    """Create the sink selected by LEAD_SINK ("webhook" or "file")"""
+    if config.LEAD_SINK == "webhook":
+        if not config.LEAD_WEBHOOK_URL:
+            raise ValueError("LEAD_WEBHOOK_URL is required when LEAD_SINK=webhook")
+        return WebhookSink(config.LEAD_WEBHOOK_URL)
+    return FileSink(config.LEAD_SINK_FILE)
@@ -0,0 +1,182 @@
+"""
+Structured Logging
+Non-blocking JSON logging with sampling and request/session correlation IDs
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import uuid
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Optional
+from app.config import config
+
+# Correlation IDs for the request being handled (set by CorrelationMiddleware and the chat endpoint)
+request_id_var: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+session_id_var: ContextVar[Optional[str]] = ContextVar("session_id", default=None)
+
+# Attributes every LogRecord has; anything else passed via extra= is emitted as a field
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, message, correlation IDs and extra fields"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage()
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and value is not None:
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """Human-readable lines for local development"""
+
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)-7s %(name)s: %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        ids = " ".join(
+            f"{key}={getattr(record, key)}" for key in ("request_id", "session_id") if getattr(record, key, None)
+        )
+        return f"{line} [{ids}]" if ids else line
+
+
+class CorrelationFilter(logging.Filter):
+    """Stamp records with the current request and session IDs (runs on the logging thread's caller)"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        record.session_id = session_id_var.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keep only a fraction of records below WARNING; warnings and errors
+    are never dropped
+    """
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return record.levelno >= logging.WARNING or self.rate >= 1.0 or random.random() < self.rate
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that does the minimum on the caller's thread: resolve
+    the message and enqueue. Formatting and I/O happen on the listener
+    thread (the stock prepare() formats the whole record up front).
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        return record
+
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_settings: dict = {}
+
+
+def setup_logging(level: str = None, fmt: str = None, sample_rate: float = None, stream=None):
+    """
+    Route the app's loggers ("app.*") through a queue to a background thread
+
+    Args:
+        level: Minimum level (LOG_LEVEL)
+        fmt: "json" or "text" (LOG_FORMAT)
+        sample_rate: Share of DEBUG/INFO records kept (LOG_SAMPLE_RATE)
+        stream: Output stream (stdout)
+    """
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+    _settings.update(level=level, fmt=fmt, sample_rate=sample_rate, stream=stream)
+
+    output = logging.StreamHandler(stream or sys.stdout)
+    output.setFormatter(JsonFormatter() if (fmt or config.LOG_FORMAT) == "json" else TextFormatter())
+
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    handler = NonBlockingQueueHandler(log_queue)
+    handler.addFilter(SamplingFilter(config.LOG_SAMPLE_RATE if sample_rate is None else sample_rate))
+    handler.addFilter(CorrelationFilter())
+
+    logger = logging.getLogger("app")
+    logger.handlers = [handler]
+    logger.setLevel((level or config.LOG_LEVEL).upper())
+    logger.propagate = False
+
+    _listener = logging.handlers.QueueListener(log_queue, output)
+    _listener.start()
+
+
+def shutdown_logging():
+    """Flush queued records and stop the background thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def _restart_after_fork():
+    """The listener thread does not survive fork(): give a forked worker its own"""
+    global _listener
+    if _listener is not None:
+        _listener = None
+        setup_logging(**_settings)
+
+
+atexit.register(shutdown_logging)
+os.register_at_fork(after_in_child=_restart_after_fork)
+
+
+class CorrelationMiddleware:
+    """
+    ASGI middleware giving every HTTP request a request ID (taken from the
+    X-Request-ID header or generated) and echoing it on the response
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        request_id = None
+        for name, value in scope.get("headers", []):
+            if name == b"x-request-id":
+                request_id = value.decode("latin-1")[:64]
+                break
+        request_id = request_id or uuid.uuid4().hex
+        token = request_id_var.set(request_id)
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [(b"x-request-id", request_id.encode("latin-1"))]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            request_id_var.reset(token)
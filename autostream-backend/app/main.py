@@ -2,10 +2,29 @@
 FastAPI Main Application
 Entry point for AutoStream AI Assistant backend
 """
+import asyncio
+import logging
+from app.log import setup_logging, shutdown_logging, CorrelationMiddleware
+
+# Configure logging before the app modules load (the RAG pipeline logs on import)
+setup_logging()
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from app.api import router
+from app.ws import router as ws_router
 from app.config import config
+from app.memory.session_store import session_store
+from app.leads.dispatcher import lead_dispatcher
+from app.agent.metrics import metrics_registry
+from app.agent.model_router import model_router
+from app.agent.quick_replies import quick_replies
+from app.agent.faq import faq_index
+from app.agent.intent_embedding import embedding_intent_classifier
+from app.agent.graph import autostream_graph
+
+logger = logging.getLogger(__name__)
 
 # Create FastAPI app
 app = FastAPI(
@@ -23,10 +42,15 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Request-ID"],
 )
 
+# Request correlation IDs for logs (X-Request-ID in, echoed on the response)
+app.add_middleware(CorrelationMiddleware)
+
 # Include API router
 app.include_router(router, prefix="/api", tags=["chat"])
+app.include_router(ws_router, prefix="/api", tags=["chat"])
 
 @app.on_event("startup")
 async def startup_event():
@@ -34,25 +58,51 @@ async def startup_event():
     try:
         # Validate configuration
         config.validate()
-        print("✓ Configuration validated")
+        logger.info("Configuration validated")
+        
+        # Open the conversation checkpointer (memory or SQLite)
+        await session_store.open()
+        logger.info("Checkpointer ready", extra={"checkpointer": config.CHECKPOINTER})
         
-        # Initialize RAG pipeline (happens in rag.py on import)
-        print("✓ RAG pipeline initialized")
+        # Start background lead delivery
+        lead_dispatcher.start()
+        logger.info("Lead dispatcher started", extra={"sink": lead_dispatcher.sink.name})
         
-        print("=" * 60)
-        print("AutoStream AI Assistant Backend")
-        print("=" * 60)
-        print(f"Model: {config.GROQ_MODEL}")
-        print(f"Max conversation turns: {config.MAX_CONVERSATION_TURNS}")
-        print(f"Session timeout: {config.SESSION_TIMEOUT}s")
-        print("=" * 60)
-        print("Server ready! 🚀")
-        print("=" * 60)
+        # Precomputed quick-reply answers (rebuilt in the background when missing or stale)
+        if not quick_replies.load() and config.QUICK_REPLIES_BUILD_ON_STARTUP:
+            quick_replies.start_build(autostream_graph)
         
-    except Exception as e:
-        print(f"Startup error: {e}")
+        # FAQ direct answers: embed the knowledge base questions before the first message needs them
+        if faq_index.enabled:
+            await asyncio.to_thread(faq_index.build)
+            logger.info("FAQ index ready", extra={"entries": len(faq_index.entries)})
+        
+        # Intent centroids for model routing, degraded replies and untagged LLM replies, so no turn waits on them
+        await asyncio.to_thread(embedding_intent_classifier.warm_up)
+        
+        # RAG pipeline is initialized in rag.py on import
+        logger.info("AutoStream AI Assistant backend ready", extra={
+            "models": {name: route.model for name, route in model_router.routes.items()},
+            "max_conversation_turns": config.MAX_CONVERSATION_TURNS,
+            "session_timeout_s": config.SESSION_TIMEOUT
+        })
+        
+    except Exception:
+        logger.exception("Startup failed")
         raise
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Release resources on shutdown"""
+    lead_dispatcher.stop()
+    await session_store.close()
+    shutdown_logging()
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus scrape endpoint"""
+    return PlainTextResponse(metrics_registry.render(), media_type="text/plain; version=0.0.4")
+
 @app.get("/")
 async def root():
     """Root endpoint - health check"""
@@ -62,8 +112,11 @@ async def root():
         "version": "1.0.0",
         "endpoints": {
             "chat": "/api/chat",
+            "chat_ws": "/api/ws/{session_id}",
             "session": "/api/session/{session_id}",
             "stats": "/api/stats",
+            "funnel": "/api/funnel",
+            "metrics": "/metrics",
             "docs": "/docs"
         }
     }
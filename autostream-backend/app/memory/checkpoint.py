@@ -0,0 +1,95 @@
+"""
+LangGraph Checkpointer Factory
+Selects in-memory or SQLite persistence for conversation state, keeping only each session's latest checkpoints
+"""
+import logging
+from langgraph.checkpoint.base import BaseCheckpointSaver
+from langgraph.checkpoint.memory import InMemorySaver
+from app.config import config
+
+logger = logging.getLogger(__name__)
+
+
+class PrunedInMemorySaver(InMemorySaver):
+    """
+    InMemorySaver that keeps only the newest `keep` checkpoints per thread.
+
+    Every checkpoint holds the session's message window, and InMemorySaver
+    never drops one, so memory grew with turns rather than with sessions.
+    Older checkpoints are dropped with their pending writes and every
+    channel blob only they referenced. The default keeps two: the latest,
+    and the one before it that a cancelled turn is rewound to.
+    """
+
+    def __init__(self, keep: int = None):
+        super().__init__()
+        self.keep = config.CHECKPOINTS_PER_SESSION if keep is None else keep
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        saved = super().put(config, checkpoint, metadata, new_versions)
+        self._prune(saved["configurable"]["thread_id"], saved["configurable"]["checkpoint_ns"])
+        return saved
+
+    def _prune(self, thread_id: str, checkpoint_ns: str):
+        checkpoints = self.storage[thread_id][checkpoint_ns]
+        if len(checkpoints) <= self.keep:
+            return
+        # Checkpoint ids sort by creation time
+        dropped = [checkpoints.pop(checkpoint_id)[0] for checkpoint_id in sorted(checkpoints)[:-self.keep]]
+        live = set()
+        for serialized, _, _ in checkpoints.values():
+            live.update(self.serde.loads_typed(serialized)["channel_versions"].items())
+        for serialized in dropped:
+            checkpoint = self.serde.loads_typed(serialized)
+            self.writes.pop((thread_id, checkpoint_ns, checkpoint["id"]), None)
+            # Every blob is named by the versions of the checkpoint that wrote it
+            for channel, version in checkpoint["channel_versions"].items():
+                if (channel, version) not in live:
+                    self.blobs.pop((thread_id, checkpoint_ns, channel, version), None)
+
+
+def _pruned_sqlite_saver(path: str) -> BaseCheckpointSaver:
+    """AsyncSqliteSaver that prunes like PrunedInMemorySaver (raises ImportError without the optional package)"""
+    import aiosqlite
+    from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+
+    class PrunedSqliteSaver(AsyncSqliteSaver):
+        keep = config.CHECKPOINTS_PER_SESSION
+
+        async def aput(self, config, checkpoint, metadata, new_versions):
+            saved = await super().aput(config, checkpoint, metadata, new_versions)
+            thread_id = str(saved["configurable"]["thread_id"])
+            checkpoint_ns = saved["configurable"]["checkpoint_ns"]
+            async with self.lock:
+                await self.conn.execute(
+                    "DELETE FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id NOT IN "
+                    "(SELECT checkpoint_id FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? "
+                    "ORDER BY checkpoint_id DESC LIMIT ?)",
+                    (thread_id, checkpoint_ns, thread_id, checkpoint_ns, self.keep)
+                )
+                await self.conn.execute(
+                    "DELETE FROM writes WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id NOT IN "
+                    "(SELECT checkpoint_id FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ?)",
+                    (thread_id, checkpoint_ns, thread_id, checkpoint_ns)
+                )
+                await self.conn.commit()
+            return saved
+
+    # The connection is opened lazily on first use inside the event loop
+    return PrunedSqliteSaver(aiosqlite.connect(path))
+
+
+def build_checkpointer() -> BaseCheckpointSaver:
+    """
+    Create the checkpointer configured by CHECKPOINTER ("memory" or "sqlite")
+
+    SQLite needs the optional langgraph-checkpoint-sqlite package; without it
+    the service falls back to in-memory checkpoints.
+    """
+    if config.CHECKPOINTER == "sqlite":
+        try:
+            return _pruned_sqlite_saver(config.CHECKPOINT_DB_PATH)
+        except ImportError:
+            logger.warning("langgraph-checkpoint-sqlite not installed, using in-memory checkpoints")
+
+    return PrunedInMemorySaver()
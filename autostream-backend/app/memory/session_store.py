@@ -1,169 +1,365 @@
 """
 Session Memory Store
-Manages per-session conversation state with LRU cache
+Tracks live sessions with LRU eviction; conversation state is persisted by the LangGraph checkpointer
 """
+import heapq
+import sqlite3
+import threading
 import time
-from typing import Dict, Optional
+from typing import AsyncIterator, Dict, List, Optional, Tuple
 from collections import OrderedDict
 from app.agent.state import AgentState
+from app.agent.funnel_stats import funnel_stats
 from app.config import config
+from langgraph.checkpoint.base import BaseCheckpointSaver
+from langgraph.checkpoint.memory import InMemorySaver
+from app.memory.checkpoint import build_checkpointer
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS session_access (
+    session_id TEXT PRIMARY KEY,
+    last_access REAL NOT NULL,
+    tenant_id TEXT NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS session_access_by_time ON session_access (last_access);
+"""
+
+
+class SharedAccessLog:
+    """
+    Last access per session in a SQLite table shared by every worker
+    process (python -m app.prefork), next to the checkpoints.
+
+    Each worker only sees the turns it served, so eviction and expiry are
+    decided here: a session another worker is serving is recent in this
+    table and never picked as the oldest. Each touch is one IMMEDIATE
+    transaction; wall-clock time is used since all processes agree on it.
+    """
+
+    def __init__(self, path: str = None):
+        self.path = path or config.CHECKPOINT_DB_PATH
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=5.0)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+
+    def touch(self, session_id: str, now: float, max_sessions: int, timeout: float,
+              tenant_id: str) -> Tuple[bool, List[str]]:
+        """
+        Record activity on a session, making room for it if it is new
+        (a new session is recorded under `tenant_id`)
+
+        Returns:
+            (whether the session is new or had expired, sessions whose
+            checkpoints the caller must delete: the expired one and any evicted)
+        """
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT last_access FROM session_access WHERE session_id = ?", (session_id,)
+                ).fetchone()
+                if row is not None and now - row[0] <= timeout:
+                    self._conn.execute(
+                        "UPDATE session_access SET last_access = ? WHERE session_id = ?", (now, session_id)
+                    )
+                    self._conn.execute("COMMIT")
+                    return False, []
+
+                stale = []
+                if row is not None:
+                    self._conn.execute("DELETE FROM session_access WHERE session_id = ?", (session_id,))
+                    stale.append(session_id)
+                excess = self._conn.execute("SELECT COUNT(*) FROM session_access").fetchone()[0] - max_sessions + 1
+                if excess > 0:
+                    oldest = [sid for (sid,) in self._conn.execute(
+                        "SELECT session_id FROM session_access ORDER BY last_access LIMIT ?", (excess,)
+                    )]
+                    self._conn.executemany("DELETE FROM session_access WHERE session_id = ?", [(sid,) for sid in oldest])
+                    stale.extend(oldest)
+                self._conn.execute(
+                    "INSERT INTO session_access (session_id, last_access, tenant_id) VALUES (?, ?, ?)",
+                    (session_id, now, tenant_id)
+                )
+                self._conn.execute("COMMIT")
+                return True, stale
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def get(self, session_id: str) -> Optional[float]:
+        """A session's last access (None when it is not live)"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT last_access FROM session_access WHERE session_id = ?", (session_id,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def tenant(self, session_id: str) -> Optional[str]:
+        """The tenant a live session was created under"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT tenant_id FROM session_access WHERE session_id = ?", (session_id,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def page(self, after: str, limit: int) -> List[Tuple[str, float]]:
+        """(session_id, last_access) for the next `limit` sessions by id"""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT session_id, last_access FROM session_access WHERE session_id > ? ORDER BY session_id LIMIT ?",
+                (after, limit)
+            ).fetchall()
+
+    def delete(self, session_id: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM session_access WHERE session_id = ?", (session_id,))
+
+    def stats(self) -> Tuple[int, Optional[str]]:
+        """(live sessions, least recently used session)"""
+        with self._lock:
+            count = self._conn.execute("SELECT COUNT(*) FROM session_access").fetchone()[0]
+            oldest = self._conn.execute(
+                "SELECT session_id FROM session_access ORDER BY last_access LIMIT 1"
+            ).fetchone()
+        return count, oldest[0] if oldest else None
+
+    def close(self):
+        """Close the database connection"""
+        with self._lock:
+            self._conn.close()
+
 
 class SessionStore:
     """
-    In-memory session store with LRU eviction
-    Stores AgentState per session_id
+    Session registry with LRU eviction and expiry
+
+    The graph reads and writes each session's AgentState through the
+    checkpointer (one thread per session_id), so a turn only sends the new
+    user message in and only changed channels are written back. This class
+    decides which threads are live and drops the checkpoints of evicted or
+    expired ones.
+
+    With a SQLite checkpointer, which prefork workers share, which
+    sessions are live is kept in a SharedAccessLog instead, so no worker
+    evicts a session another one is serving. `last_access` then only
+    mirrors the sessions this worker has served, for turn counts.
     """
-    
+
     def __init__(self, max_sessions: int = 100):
         """
         Initialize session store
-        
+
         Args:
             max_sessions: Maximum number of sessions to store (LRU eviction)
         """
-        self.sessions: OrderedDict[str, Dict] = OrderedDict()
+        self.checkpointer: Optional[BaseCheckpointSaver] = None
         self.max_sessions = max_sessions
-        self.last_access: Dict[str, float] = {}
-    
-    def get_session(self, session_id: str) -> Optional[AgentState]:
+        self.last_access: OrderedDict[str, float] = OrderedDict()
+        self.shared: Optional[SharedAccessLog] = None
+        # Turns completed per live session, so callers need not load the checkpoint for it
+        self.turn_counts: Dict[str, int] = {}
+        # Tenant each live session was created under (rate limits are charged to it)
+        self.tenants: Dict[str, str] = {}
+
+    async def open(self) -> BaseCheckpointSaver:
+        """Create the checkpointer on first use (SQLite needs a running event loop)"""
+        if self.checkpointer is None:
+            self.checkpointer = build_checkpointer()
+            if not isinstance(self.checkpointer, InMemorySaver):
+                self.shared = SharedAccessLog()
+        return self.checkpointer
+
+    async def close(self):
+        """Close the checkpointer's database connection, if it has one"""
+        conn = getattr(self.checkpointer, "conn", None)
+        if conn is not None:
+            await conn.close()
+        if self.shared is not None:
+            self.shared.close()
+            self.shared = None
+        self.checkpointer = None
+
+    @staticmethod
+    def thread_config(session_id: str) -> dict:
+        """LangGraph config addressing a session's checkpoint thread"""
+        return {"configurable": {"thread_id": session_id}}
+
+    async def touch(self, session_id: str, tenant_id: Optional[str] = None) -> bool:
         """
-        Retrieve session state
-        
+        Record activity on a session, evicting the least recently used
+        session if the store is full
+
         Args:
             session_id: Unique session identifier
-            
+            tenant_id: Tenant a new session is created under ("default" when None)
+
         Returns:
-            AgentState or None if not found
+            True if the session is new (or had expired and was reset)
         """
-        # Check if session exists
-        if session_id not in self.sessions:
-            return None
-        
-        # Check if session expired
-        if self._is_expired(session_id):
-            self.delete_session(session_id)
-            return None
-        
-        # Update access time
+        await self.open()
+        if self.shared is not None:
+            now = time.time()
+            is_new, stale = self.shared.touch(
+                session_id, now, self.max_sessions, config.SESSION_TIMEOUT, tenant_id or "default"
+            )
+            for stale_id in stale:
+                await self._drop(stale_id)
+            if is_new:
+                self.turn_counts.pop(session_id, None)
+            self.last_access[session_id] = now
+            self.last_access.move_to_end(session_id)
+            # Only a mirror: forgetting a session here leaves it live for the other workers
+            while len(self.last_access) > self.max_sessions:
+                forgotten, _ = self.last_access.popitem(last=False)
+                self.turn_counts.pop(forgotten, None)
+            return is_new
+
+        if session_id in self.last_access:
+            if not self._is_expired(session_id):
+                self.last_access[session_id] = time.time()
+                self.last_access.move_to_end(session_id)
+                return False
+            await self.delete_session(session_id)
+
+        # Enforce LRU eviction
+        while len(self.last_access) >= self.max_sessions:
+            oldest_id = next(iter(self.last_access))
+            await self.delete_session(oldest_id)
+
         self.last_access[session_id] = time.time()
-        
-        # Move to end (most recently used)
-        self.sessions.move_to_end(session_id)
-        
-        return self.sessions[session_id]
-    
-    def create_session(self, session_id: str) -> AgentState:
+        self.tenants[session_id] = tenant_id or "default"
+        return True
+
+    def tenant(self, session_id: str) -> Optional[str]:
+        """The tenant a live session was created under (None for an unknown session)"""
+        if self.shared is not None:
+            return self.shared.tenant(session_id)
+        return self.tenants.get(session_id)
+
+    def tenant_for(self, session_id: str, claimed: Optional[str]) -> Optional[str]:
+        """
+        Tenant a request to a session is charged to: the session's own, or
+        for a new session the one the client names
+
+        Args:
+            claimed: Tenant the client sent (X-Tenant-ID), unauthenticated
+
+        Returns:
+            The tenant, or None when `claimed` names another tenant than the session's
+        """
+        recorded = self.tenant(session_id)
+        if recorded is None:
+            return claimed or "default"
+        if claimed and claimed != recorded:
+            return None
+        return recorded
+
+    def turn_count(self, session_id: str) -> int:
+        """Turns completed in a session as of its last turn here (0 when unknown)"""
+        return self.turn_counts.get(session_id, 0)
+
+    def record_turn(self, session_id: str, turn_count: int):
+        """Remember a live session's turn count after a turn"""
+        if session_id in self.last_access:
+            self.turn_counts[session_id] = turn_count
+
+    async def get_session(self, session_id: str) -> Optional[AgentState]:
         """
-        Create new session with default state
-        
+        Retrieve session state from the checkpointer
+
         Args:
             session_id: Unique session identifier
-            
+
         Returns:
-            New AgentState
+            AgentState or None if not found
         """
-        # Enforce LRU eviction
-        if len(self.sessions) >= self.max_sessions:
-            # Remove oldest session
-            oldest_id = next(iter(self.sessions))
-            self.delete_session(oldest_id)
-        
-        # Create default state
-        default_state: AgentState = {
-            "messages": [],
-            "intent": "greeting",
-            "selected_plan": None,
-            "name": None,
-            "email": None,
-            "platform": None,
-            "yt_channel": None,
-            "lead_captured": False,
-            "session_id": session_id,
-            "turn_count": 0,
-            "retrieved_context": None
-        }
-        
-        # Store session
-        self.sessions[session_id] = default_state
-        self.last_access[session_id] = time.time()
-        
-        return default_state
-    
-    def update_session(self, session_id: str, updates: dict):
+        checkpointer = await self.open()
+        if self._last_access(session_id) is not None and self._is_expired(session_id):
+            await self.delete_session(session_id)
+            return None
+
+        checkpoint = await checkpointer.aget_tuple(self.thread_config(session_id))
+        if checkpoint is None:
+            return None
+
+        return checkpoint.checkpoint["channel_values"]
+
+    async def iter_sessions(
+        self, after: Optional[str] = None, page_size: int = 100
+    ) -> AsyncIterator[Tuple[str, float, AgentState]]:
         """
-        Update session state
-        
+        Iterate live sessions in session_id order with keyset pagination
+
+        Each page of ids is picked in one synchronous step (no await, so
+        no chat turn can interleave and nothing is copied beyond the page);
+        states are then loaded one at a time through the checkpointer.
+        Sessions evicted while the export runs are skipped.
+
         Args:
-            session_id: Session to update
-            updates: Dictionary of state updates
+            after: Only sessions with a larger id (the export cursor)
+
+        Yields:
+            (session_id, last_access, state)
         """
-        if session_id not in self.sessions:
-            # Create if doesn't exist
-            self.create_session(session_id)
-        
-        # Update state
-        self.sessions[session_id].update(updates)
-        
-        # Update access time
-        self.last_access[session_id] = time.time()
-        
-        # Move to end
-        self.sessions.move_to_end(session_id)
-        
-        # Enforce conversation turn limit
-        self._enforce_turn_limit(session_id)
-    
-    def delete_session(self, session_id: str):
-        """Delete a session"""
-        if session_id in self.sessions:
-            del self.sessions[session_id]
-        if session_id in self.last_access:
-            del self.last_access[session_id]
-    
+        checkpointer = await self.open()
+        cursor = after or ""
+        while True:
+            if self.shared is not None:
+                page = [sid for sid, _ in self.shared.page(cursor, page_size)]
+            else:
+                page = heapq.nsmallest(page_size, (sid for sid in self.last_access if sid > cursor))
+            for session_id in page:
+                last_access = self._last_access(session_id)
+                if last_access is None:
+                    continue
+                checkpoint = await checkpointer.aget_tuple(self.thread_config(session_id))
+                if checkpoint is not None:
+                    yield session_id, last_access, checkpoint.checkpoint["channel_values"]
+            if len(page) < page_size:
+                return
+            cursor = page[-1]
+
+    async def delete_session(self, session_id: str):
+        """Delete a session and its checkpoints"""
+        await self.open()
+        if self.shared is not None:
+            self.shared.delete(session_id)
+        await self._drop(session_id)
+
+    async def _drop(self, session_id: str):
+        """Forget a session here and delete its checkpoints"""
+        self.last_access.pop(session_id, None)
+        self.turn_counts.pop(session_id, None)
+        self.tenants.pop(session_id, None)
+        funnel_stats.end_session(session_id)
+        checkpointer = await self.open()
+        await checkpointer.adelete_thread(session_id)
+
+    def _last_access(self, session_id: str) -> Optional[float]:
+        if self.shared is not None:
+            return self.shared.get(session_id)
+        return self.last_access.get(session_id)
+
     def _is_expired(self, session_id: str) -> bool:
         """Check if session has expired"""
-        if session_id not in self.last_access:
+        last_access = self._last_access(session_id)
+        if last_access is None:
             return True
-        
-        elapsed = time.time() - self.last_access[session_id]
+
+        elapsed = time.time() - last_access
         return elapsed > config.SESSION_TIMEOUT
-    
-    def _enforce_turn_limit(self, session_id: str):
-        """
-        Enforce maximum conversation turn limit
-        Keeps only the last N turns to prevent memory bloat
-        """
-        if session_id not in self.sessions:
-            return
-        
-        messages = self.sessions[session_id].get("messages", [])
-        max_turns = config.MAX_CONVERSATION_TURNS
-        
-        # Keep last N*2 messages (N user + N assistant)
-        if len(messages) > max_turns * 2:
-            self.sessions[session_id]["messages"] = messages[-(max_turns * 2):]
-    
-    def get_or_create(self, session_id: str) -> AgentState:
-        """
-        Get session or create if doesn't exist
-        
-        Args:
-            session_id: Session identifier
-            
-        Returns:
-            AgentState
-        """
-        session = self.get_session(session_id)
-        if session is None:
-            session = self.create_session(session_id)
-        return session
-    
+
     def get_stats(self) -> dict:
         """Get store statistics"""
+        if self.shared is not None:
+            total, oldest = self.shared.stats()
+        else:
+            total, oldest = len(self.last_access), next(iter(self.last_access)) if self.last_access else None
         return {
-            "total_sessions": len(self.sessions),
+            "total_sessions": total,
             "max_sessions": self.max_sessions,
-            "oldest_session": next(iter(self.sessions)) if self.sessions else None
+            "oldest_session": oldest
         }
 
 # Singleton instance
@@ -0,0 +1,223 @@
+"""
+Prefork Server
+Loads the embedding model and vector index once, then forks uvicorn workers that share them copy-on-write
+"""
+import argparse
+import gc
+import importlib
+import logging
+import os
+import signal
+import socket
+import time
+from typing import Callable, Dict, List
+from app.config import config
+from app.log import setup_logging
+
+logger = logging.getLogger(__name__)
+
+# Heavy library modules imported in the master, so their code and data pages are shared too
+PRELOAD_MODULES = ("numpy", "httpx", "fastapi", "uvicorn", "langgraph.graph", "langchain_groq")
+
+
+def preload():
+    """
+    Load everything workers can share read-only, then freeze the heap
+
+    Only the RAG pipeline (embedding model and FAISS index) and library
+    modules load here. App singletons that open SQLite connections or
+    start threads are created in each worker after the fork.
+
+    Two things keep the shared pages shared. The model's weights and the
+    index's vectors live in tensor/FAISS buffers, which no refcount or GC
+    bookkeeping ever writes to. The remaining Python objects are moved to
+    the permanent generation with gc.freeze(), so a worker's garbage
+    collections never walk them and rewrite their GC headers. Collection
+    is disabled while loading so freed objects do not leave holes in
+    shared pages for workers' allocations to fill.
+    """
+    # The tokenizers thread pool does not survive fork()
+    os.environ.setdefault("TOKENIZERS_PARALLELISM", "false")
+    gc.disable()
+    for module in PRELOAD_MODULES:
+        importlib.import_module(module)
+    from app.agent.rag import rag_pipeline
+    rag_pipeline.prepare_for_fork()
+    gc.freeze()
+
+
+def _after_fork(workers: int):
+    """Per-worker setup: collection back on, one CPU's worth of torch threads each"""
+    gc.enable()
+    try:
+        import torch
+        torch.set_num_threads(max(1, (os.cpu_count() or 1) // workers))
+    except ImportError:
+        pass
+
+
+def unshared_state() -> List[str]:
+    """
+    Settings that keep per-process state workers would disagree on
+
+    Conversation state and session liveness need the SQLite checkpointer
+    (and its package), rate limits the SQLite backend. Anything else
+    per-process (metrics, caches) only affects reporting or hit rates.
+    """
+    problems = []
+    if config.CHECKPOINTER != "sqlite":
+        problems.append("CHECKPOINTER=sqlite")
+    else:
+        try:
+            importlib.import_module("langgraph.checkpoint.sqlite.aio")
+        except ImportError:
+            problems.append("langgraph-checkpoint-sqlite installed")
+    if config.RATE_LIMIT_BACKEND != "sqlite":
+        problems.append("RATE_LIMIT_BACKEND=sqlite")
+    return problems
+
+
+def _build_quick_replies():
+    """
+    Builder body: load the quick-reply artifact, or build it when missing or stale
+
+    Runs in a child of the master before the workers fork, so the LLM is
+    called once per deploy rather than once per worker, and the master
+    never opens the connections importing the graph does.
+    """
+    import asyncio
+    _after_fork(1)
+    from app.agent.quick_replies import quick_replies
+    if quick_replies.load():
+        return
+    from app.agent.graph import autostream_graph
+    asyncio.run(quick_replies.build(autostream_graph))
+
+
+def _serve_worker(sock: socket.socket, workers: int):
+    """Worker body: import the app (fresh connections and threads) and serve the shared socket"""
+    import uvicorn
+    _after_fork(workers)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    from app.main import app
+    server = uvicorn.Server(uvicorn.Config(app, log_config=None))
+    server.run(sockets=[sock])
+
+
+def _spawn(target: Callable, *args) -> int:
+    pid = os.fork()
+    if pid == 0:
+        code = 0
+        try:
+            target(*args)
+        except Exception:
+            logger.exception("Worker crashed")
+            code = 1
+        finally:
+            logging.shutdown()
+            os._exit(code)
+    return pid
+
+
+def memory_report(pids: List[int]) -> Dict[int, dict]:
+    """
+    RSS and PSS per process from /proc/<pid>/smaps_rollup, in MB
+
+    RSS counts every resident page a process maps; PSS divides each
+    shared page between the processes sharing it, so PSS summed over
+    workers is their real footprint.
+    """
+    report = {}
+    for pid in pids:
+        fields = {}
+        try:
+            with open(f"/proc/{pid}/smaps_rollup") as f:
+                for line in f:
+                    name, _, value = line.partition(":")
+                    if value.strip().endswith("kB"):
+                        fields[name] = int(value.split()[0])
+        except OSError:
+            continue
+        report[pid] = {
+            "rss_mb": round(fields.get("Rss", 0) / 1024, 1),
+            "pss_mb": round(fields.get("Pss", 0) / 1024, 1),
+            "shared_mb": round((fields.get("Shared_Clean", 0) + fields.get("Shared_Dirty", 0)) / 1024, 1),
+            "private_mb": round((fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0)) / 1024, 1)
+        }
+    return report
+
+
+def serve(workers: int = None, host: str = "0.0.0.0", port: int = 8000):
+    """
+    Run the master: preload, bind, fork workers and keep them running
+
+    SIGTERM / SIGINT stop the workers (uvicorn shuts each down gracefully)
+    and then the master. SIGUSR1 logs RSS/PSS for the master and workers.
+
+    More than one worker needs shared conversation state and rate limits
+    (see unshared_state); without them one worker is started. A missing
+    or stale quick-reply artifact is built once before the workers start,
+    and workers only load it.
+    """
+    workers = workers or config.WEB_WORKERS
+    setup_logging()
+    problems = unshared_state()
+    if workers > 1 and problems:
+        logger.warning("Workers would not share state, starting one", extra={"workers": workers, "requires": problems})
+        workers = 1
+    started = time.perf_counter()
+    preload()
+    logger.info("Preloaded model and index", extra={"seconds": round(time.perf_counter() - started, 2)})
+
+    if config.QUICK_REPLIES_ENABLED and config.QUICK_REPLIES_BUILD_ON_STARTUP:
+        _, status = os.waitpid(_spawn(_build_quick_replies), 0)
+        if status:
+            logger.warning("Quick reply build failed, serving without it", extra={"status": status})
+        config.QUICK_REPLIES_BUILD_ON_STARTUP = False
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+
+    children = {_spawn(_serve_worker, sock, workers) for _ in range(workers)}
+    logger.info("Workers started", extra={"workers": workers, "host": host, "port": port})
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def report(signum, frame):
+        logger.info("Worker memory", extra={"memory": memory_report([os.getpid(), *children])})
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGUSR1, report)
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        children.discard(pid)
+        if not stopping:
+            logger.warning("Worker exited, restarting", extra={"pid": pid, "status": status})
+            children.add(_spawn(_serve_worker, sock, workers))
+    sock.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    args = parser.parse_args()
+    serve(args.workers, args.host, args.port)
@@ -0,0 +1,210 @@
+"""
+Request Profiling
+Opt-in sampling profiler for single requests, written as flamegraph-compatible collapsed stacks
+"""
+import asyncio
+import logging
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter, deque
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Set
+from app.config import config
+
+logger = logging.getLogger(__name__)
+
+
+class ProfileSession:
+    """Samples collected for one request"""
+
+    def __init__(self, request_id: str, session_id: Optional[str] = None):
+        self.request_id = request_id
+        self.session_id = session_id
+        self.started_at = time.time()
+        self.started = time.perf_counter()
+        # Where the request's code can be running: tasks on the event loop
+        # (the request's own and graph node tasks) and worker threads (sync nodes)
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.loop_thread: Optional[int] = None
+        self.tasks: Set[asyncio.Task] = set()
+        self.threads: Set[int] = set()
+        self.stacks: Counter = Counter()
+        self.samples = 0
+
+
+# Profile of the request currently running (None when not profiling)
+current_profile: ContextVar[Optional[ProfileSession]] = ContextVar("current_profile", default=None)
+
+
+def _collapse(frame) -> str:
+    """Root-first "func (file:line);..." stack, the collapsed format flamegraph.pl and speedscope read"""
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+class RequestProfiler:
+    """
+    Sampling profiler scoped to individual requests.
+
+    A sampler thread runs only while at least one request is being
+    profiled. Every PROFILE_INTERVAL_MS it takes the stack of the event
+    loop thread when one of the request's tasks is the running task, and
+    the stacks of worker threads currently running the request's sync
+    graph nodes. Time the request spends awaiting I/O has no samples, so
+    wall_ms minus samples * interval is roughly its time off the CPU.
+    With no profiled request there is no thread, no hook and no per-call
+    cost beyond a header check.
+    """
+
+    def __init__(self):
+        self.directory = config.PROFILE_DIR
+        self.interval = config.PROFILE_INTERVAL_MS / 1000
+        self.sample_rate = config.PROFILE_SAMPLE_RATE
+        self._lock = threading.Lock()
+        self._active: Dict[str, ProfileSession] = {}
+        self._thread: Optional[threading.Thread] = None
+        self.recent: deque = deque(maxlen=config.PROFILE_KEEP)
+
+    def should_profile(self, requested: Optional[str], admin_token: Optional[str]) -> bool:
+        """
+        Decide whether to profile a request
+
+        Args:
+            requested: X-Profile header value; honoured only with a valid admin token
+            admin_token: X-Admin-Token header value
+        """
+        if requested and requested not in ("0", "false"):
+            return bool(config.ADMIN_TOKEN) and admin_token == config.ADMIN_TOKEN
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def _begin(self, session: ProfileSession):
+        with self._lock:
+            self._active[session.request_id] = session
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._sample_loop, name="request-profiler", daemon=True)
+                self._thread.start()
+
+    def _end(self, session: ProfileSession) -> dict:
+        with self._lock:
+            self._active.pop(session.request_id, None)
+        return self._write(session)
+
+    @asynccontextmanager
+    async def profile(self, request_id: str, session_id: Optional[str] = None):
+        """Profile the enclosed block of the current task (and graph nodes it runs)"""
+        session = ProfileSession(request_id, session_id)
+        session.loop = asyncio.get_running_loop()
+        session.loop_thread = threading.get_ident()
+        session.tasks.add(asyncio.current_task())
+        token = current_profile.set(session)
+        self._begin(session)
+        try:
+            yield session
+        finally:
+            current_profile.reset(token)
+            self._end(session)
+
+    @contextmanager
+    def profile_sync(self, request_id: str, session_id: Optional[str] = None):
+        """Profile the enclosed block of the current thread (for blocking callers)"""
+        session = ProfileSession(request_id, session_id)
+        session.threads.add(threading.get_ident())
+        token = current_profile.set(session)
+        self._begin(session)
+        try:
+            yield session
+        finally:
+            current_profile.reset(token)
+            self._end(session)
+
+    def _sample_loop(self):
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                sessions = list(self._active.values())
+                if not sessions:
+                    self._thread = None
+                    return
+            frames = sys._current_frames()
+            me = threading.get_ident()
+            for session in sessions:
+                thread_ids = [tid for tid in list(session.threads) if tid != me]
+                if session.loop is not None and asyncio.current_task(session.loop) in session.tasks:
+                    thread_ids.append(session.loop_thread)
+                for tid in thread_ids:
+                    frame = frames.get(tid)
+                    if frame is not None:
+                        session.stacks[_collapse(frame)] += 1
+                        session.samples += 1
+
+    def _write(self, session: ProfileSession) -> dict:
+        """Write the collapsed stacks to PROFILE_DIR/<request_id>.collapsed and index the profile"""
+        os.makedirs(self.directory, exist_ok=True)
+        safe_id = "".join(c for c in session.request_id if c.isalnum() or c in "-_")[:64] or "request"
+        path = os.path.join(self.directory, f"{safe_id}.collapsed")
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in session.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+        entry = {
+            "request_id": safe_id,
+            "session_id": session.session_id,
+            "started_at": session.started_at,
+            "wall_ms": round((time.perf_counter() - session.started) * 1000, 2),
+            "samples": session.samples,
+            "interval_ms": self.interval * 1000,
+            "path": path
+        }
+        if len(self.recent) == self.recent.maxlen:
+            evicted = self.recent[0]
+            try:
+                os.remove(evicted["path"])
+            except OSError:
+                pass
+        self.recent.append(entry)
+        logger.info("Request profiled", extra={"profile": path, "samples": session.samples})
+        return entry
+
+    def list_profiles(self) -> List[dict]:
+        """Most recent profiles first"""
+        return list(reversed(self.recent))
+
+    def profile_path(self, request_id: str) -> Optional[str]:
+        for entry in self.recent:
+            if entry["request_id"] == request_id:
+                return entry["path"]
+        return None
+
+
+def track_task():
+    """Let the sampler see the running task as part of the current profile (graph node tasks)"""
+    session = current_profile.get()
+    if session is not None:
+        session.tasks.add(asyncio.current_task())
+
+
+@contextmanager
+def track_thread():
+    """Let the sampler see this worker thread as part of the current profile while it runs a sync node"""
+    session = current_profile.get()
+    if session is None:
+        yield
+        return
+    tid = threading.get_ident()
+    session.threads.add(tid)
+    try:
+        yield
+    finally:
+        session.threads.discard(tid)
+
+
+# Singleton instance
+request_profiler = RequestProfiler()
@@ -0,0 +1,276 @@
+"""
+Rate Limiting
+GCRA limits on chat turns per session, client IP and tenant, kept in sharded memory or a shared SQLite table
+"""
+import math
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Dict, List, Optional, Sequence, Tuple
+from app.config import config
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS rate_limits (
+    key TEXT PRIMARY KEY,
+    tat REAL NOT NULL
+) WITHOUT ROWID;
+"""
+
+
+class Limit:
+    """
+    A rate with a burst allowance, as GCRA parameters
+
+    A key's theoretical arrival time (TAT) advances by `interval` per
+    request; a request is allowed while the TAT stays within `tolerance`
+    of now. That admits `burst` requests at once and `per_minute` after.
+    """
+
+    def __init__(self, scope: str, per_minute: float, burst: int):
+        self.scope = scope
+        self.per_minute = per_minute
+        self.burst = max(1, burst)
+        self.interval = 60.0 / per_minute
+        self.tolerance = self.interval * self.burst
+
+
+class Decision:
+    """Outcome of a rate limit check"""
+
+    def __init__(self, allowed: bool, retry_after: float = 0.0, scope: Optional[str] = None):
+        self.allowed = allowed
+        self.retry_after = retry_after
+        self.scope = scope
+
+    @property
+    def retry_after_header(self) -> str:
+        """Retry-After value (whole seconds, at least 1)"""
+        return str(max(1, math.ceil(self.retry_after)))
+
+
+def _gcra(tat: Optional[float], now: float, limit: Limit) -> Tuple[float, float]:
+    """New TAT if this request is admitted, and how long to wait if it is not (0: admit)"""
+    new_tat = max(tat or now, now) + limit.interval
+    return new_tat, max(0.0, new_tat - now - limit.tolerance)
+
+
+def _decide(checks: Sequence[Tuple[str, Limit]], tats: Sequence[Optional[float]],
+            now: float) -> Tuple[Decision, List[float]]:
+    """All-or-nothing over several keys: a request refused by one limit is charged to none"""
+    new_tats = []
+    denied = Decision(True)
+    for (key, limit), tat in zip(checks, tats):
+        new_tat, wait = _gcra(tat, now, limit)
+        if wait > denied.retry_after:
+            denied = Decision(False, wait, limit.scope)
+        new_tats.append(new_tat)
+    return denied, new_tats
+
+
+class RateLimitBackend:
+    """Stores each key's TAT; acquire must check and charge all keys atomically"""
+
+    name = "base"
+
+    def acquire(self, checks: Sequence[Tuple[str, Limit]]) -> Decision:
+        """
+        Args:
+            checks: (key, limit) pairs that must all admit the request
+        """
+        raise NotImplementedError
+
+    def size(self) -> int:
+        """Keys currently tracked"""
+        raise NotImplementedError
+
+
+class MemoryBackend(RateLimitBackend):
+    """
+    Per-process TATs in hash-sharded dicts, one lock per shard.
+
+    A key whose TAT has passed is back to a full burst and carries no
+    information, so each shard drops those keys whenever it has grown by
+    `sweep_every` since its last sweep; memory tracks active keys only.
+    """
+
+    name = "memory"
+
+    def __init__(self, shards: int = None, sweep_every: int = 4096):
+        self.shards = shards or config.RATE_LIMIT_SHARDS
+        self.sweep_every = sweep_every
+        self._tats: List[Dict[str, float]] = [{} for _ in range(self.shards)]
+        self._locks = [threading.Lock() for _ in range(self.shards)]
+        self._swept_at = [0] * self.shards
+
+    def _shard(self, key: str) -> int:
+        return zlib.crc32(key.encode("utf-8")) % self.shards
+
+    def acquire(self, checks: Sequence[Tuple[str, Limit]]) -> Decision:
+        shards = [self._shard(key) for key, _ in checks]
+        # Locks in shard order, so requests sharing shards cannot deadlock
+        held = sorted(set(shards))
+        for shard in held:
+            self._locks[shard].acquire()
+        try:
+            now = time.monotonic()
+            tats = [self._tats[shard].get(key) for shard, (key, _) in zip(shards, checks)]
+            decision, new_tats = _decide(checks, tats, now)
+            if decision.allowed:
+                for shard, (key, _), new_tat in zip(shards, checks, new_tats):
+                    table = self._tats[shard]
+                    table[key] = new_tat
+                    if len(table) - self._swept_at[shard] > self.sweep_every:
+                        self._sweep(shard, now)
+            return decision
+        finally:
+            for shard in held:
+                self._locks[shard].release()
+
+    def _sweep(self, shard: int, now: float):
+        table = self._tats[shard]
+        for key in [key for key, tat in table.items() if tat <= now]:
+            del table[key]
+        self._swept_at[shard] = len(table)
+
+    def size(self) -> int:
+        return sum(len(table) for table in self._tats)
+
+
+class SQLiteBackend(RateLimitBackend):
+    """
+    TATs in a SQLite table shared by every worker process (python -m app.prefork).
+
+    Each check is one IMMEDIATE transaction, so workers charging the same
+    key serialize on the database. Wall-clock time is used since it is the
+    clock all processes agree on. Expired keys are deleted every
+    `sweep_every` admitted requests.
+    """
+
+    name = "sqlite"
+
+    def __init__(self, path: str = None, sweep_every: int = 10_000):
+        self.path = path or config.RATE_LIMIT_DB_PATH
+        self.sweep_every = sweep_every
+        self._admitted = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=5.0)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=OFF")
+        self._conn.executescript(_SCHEMA)
+
+    def acquire(self, checks: Sequence[Tuple[str, Limit]]) -> Decision:
+        keys = [key for key, _ in checks]
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                now = time.time()
+                rows = dict(self._conn.execute(
+                    f"SELECT key, tat FROM rate_limits WHERE key IN ({','.join('?' * len(keys))})", keys
+                ))
+                decision, new_tats = _decide(checks, [rows.get(key) for key in keys], now)
+                if decision.allowed:
+                    self._conn.executemany(
+                        "INSERT INTO rate_limits (key, tat) VALUES (?, ?) "
+                        "ON CONFLICT(key) DO UPDATE SET tat = excluded.tat",
+                        zip(keys, new_tats)
+                    )
+                    self._admitted += 1
+                    if self._admitted % self.sweep_every == 0:
+                        self._conn.execute("DELETE FROM rate_limits WHERE tat <= ?", (now,))
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return decision
+
+    def size(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM rate_limits").fetchone()[0]
+
+    def close(self):
+        """Close the database connection"""
+        with self._lock:
+            self._conn.close()
+
+
+def build_backend() -> RateLimitBackend:
+    """Create the backend selected by RATE_LIMIT_BACKEND ("memory" or "sqlite")"""
+    if config.RATE_LIMIT_BACKEND == "sqlite":
+        return SQLiteBackend()
+    return MemoryBackend()
+
+
+class ChatRateLimiter:
+    """
+    Limits chat turns per session, per client IP and per tenant.
+
+    A turn must be admitted by all three; one refused by any limit is not
+    charged to the others, so a throttled client does not eat into its
+    tenant's allowance.
+    """
+
+    def __init__(self, backend: RateLimitBackend = None, enabled: bool = None):
+        self.enabled = config.RATE_LIMIT_ENABLED if enabled is None else enabled
+        self._backend = backend
+        self.limits = {
+            "session": Limit("session", config.RATE_LIMIT_SESSION_PER_MINUTE, config.RATE_LIMIT_SESSION_BURST),
+            "ip": Limit("ip", config.RATE_LIMIT_IP_PER_MINUTE, config.RATE_LIMIT_IP_BURST),
+            "tenant": Limit("tenant", config.RATE_LIMIT_TENANT_PER_MINUTE, config.RATE_LIMIT_TENANT_BURST),
+        }
+        self.counters = {"allowed": 0, "session": 0, "ip": 0, "tenant": 0}
+
+    @property
+    def backend(self) -> RateLimitBackend:
+        # Created on first use, so a prefork master never opens the database
+        if self._backend is None:
+            self._backend = build_backend()
+        return self._backend
+
+    def check(self, session_id: str, client_ip: Optional[str], tenant_id: Optional[str]) -> Decision:
+        """
+        Charge one chat turn
+
+        Args:
+            session_id: Session the message was sent to
+            client_ip: Client address (None: not limited by IP)
+            tenant_id: Tenant the session belongs to ("default" when None)
+
+        Returns:
+            Decision; when refused, scope names the limit hit
+        """
+        if not self.enabled:
+            return Decision(True)
+        checks = [(f"s:{session_id}", self.limits["session"]),
+                  (f"t:{tenant_id or 'default'}", self.limits["tenant"])]
+        if client_ip:
+            checks.append((f"i:{client_ip}", self.limits["ip"]))
+        decision = self.backend.acquire(checks)
+        self.counters["allowed" if decision.allowed else decision.scope] += 1
+        return decision
+
+    def stats(self) -> dict:
+        """Admitted and refused (by limit) counts, and the limits"""
+        return {
+            "enabled": self.enabled,
+            "backend": self.backend.name,
+            "tracked_keys": self.backend.size(),
+            "allowed": self.counters["allowed"],
+            "refused": {scope: self.counters[scope] for scope in self.limits},
+            "limits": {scope: {"per_minute": limit.per_minute, "burst": limit.burst}
+                       for scope, limit in self.limits.items()}
+        }
+
+
+def client_ip(host: Optional[str], forwarded_for: Optional[str]) -> Optional[str]:
+    """
+    Address to limit by: the first X-Forwarded-For hop when
+    RATE_LIMIT_TRUST_FORWARDED is set (behind a proxy), else the peer
+    """
+    if config.RATE_LIMIT_TRUST_FORWARDED and forwarded_for:
+        return forwarded_for.split(",")[0].strip() or host
+    return host
+
+
+# Singleton instance
+chat_rate_limiter = ChatRateLimiter()
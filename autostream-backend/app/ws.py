@@ -0,0 +1,262 @@
+"""
+WebSocket Chat
+Persistent per-session chat transport that streams reply tokens, state diffs and late results
+"""
+import asyncio
+import contextlib
+import json
+import logging
+from typing import Optional
+from fastapi import APIRouter, Query, WebSocket, WebSocketDisconnect
+from app.agent.graph import autostream_graph
+from app.agent.youtube_analyzer import youtube_analyzer
+from app.api import public_state, ui_components
+from app.log import session_id_var
+from app.ratelimit import chat_rate_limiter, client_ip
+from app.memory.session_store import session_store
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+_UNSET = object()
+
+# Ends a turn's token queue (None in the queue is a reset)
+_END = object()
+
+
+class ChatSocket:
+    """
+    One connected session. Turns run one at a time, in arrival order.
+
+    Client -> server: {"message": "...", "stream": true}
+    ("stream": false skips token events; the reply event then carries the text)
+
+    Server -> client, JSON objects with a "type":
+        token   {"text"}              reply text as the LLM streams it
+        reset   {}                    the tokens sent so far are void (the LLM call
+                                      failed mid-reply); the fallback reply follows
+        reply   {"intent", "text"?}   end of the reply; "text" only when it differs
+                                      from the streamed tokens (e.g. the closing message)
+        state   {"changes"}           public state fields changed since the last state event
+        ui      {"component", "value"} one per UI component for the turn
+        done    {"turn"}              end of the turn
+        error   {"detail", "retry_after"?}  retry_after (seconds) when rate limited
+
+    A channel analysis still running when the turn ends is pushed later as
+    its own ui event (component "youtube_analysis") and saved to the session.
+    A turn still running when the client disconnects is cancelled and left
+    in the session as just the user's message, as for POST /api/chat.
+    """
+
+    def __init__(self, websocket: WebSocket, session_id: str, tenant_id: Optional[str] = None):
+        self.websocket = websocket
+        self.session_id = session_id
+        self.tenant_id = tenant_id
+        self.sent_state: dict = {}
+        self.analysis_sent = False
+        self._send_lock = asyncio.Lock()
+        self._turn_lock = asyncio.Lock()
+        self._late: Optional[asyncio.Task] = None
+        self.disconnected = asyncio.Event()
+
+    async def send(self, event: dict):
+        """Send one event (ASGI sends must not interleave)"""
+        async with self._send_lock:
+            await self.websocket.send_text(json.dumps(event))
+
+    async def _pump_tokens(self, queue: asyncio.Queue, streamed: list):
+        """Forward streamed text, merging whatever queued up while the last frame was sent"""
+        done = False
+        while not done:
+            items = [await queue.get()]
+            while not queue.empty():
+                items.append(queue.get_nowait())
+            parts = []
+            for item in items:
+                if item is _END:
+                    done = True
+                elif item is None:
+                    parts.clear()
+                    streamed.clear()
+                    await self.send({"type": "reset"})
+                else:
+                    parts.append(item)
+            if parts:
+                text = "".join(parts)
+                streamed.append(text)
+                await self.send({"type": "token", "text": text})
+
+    async def turn(self, message: str, stream: bool = True):
+        """
+        Run one turn, streaming its events
+
+        Args:
+            stream: Send token events (otherwise the reply event carries the text)
+        """
+        async with self._turn_lock:
+            new_session = await session_store.touch(self.session_id, self.tenant_id)
+            tokens: asyncio.Queue = asyncio.Queue()
+            streamed: list = []
+            pump = asyncio.create_task(self._pump_tokens(tokens, streamed))
+            loop = asyncio.get_running_loop()
+            
+            def on_token(text: Optional[str]):
+                # Replies not from the LLM are sent from graph worker threads
+                loop.call_soon_threadsafe(tokens.put_nowait, text)
+            
+            cancelled = False
+            try:
+                state = await autostream_graph.arun(
+                    self.session_id, message, new_session, self.tenant_id,
+                    on_token=on_token if stream else None
+                )
+            except asyncio.CancelledError:
+                # The client is gone: nothing left to send
+                cancelled = True
+                pump.cancel()
+                raise
+            finally:
+                if not cancelled:
+                    # Queued behind any tokens still being handed over
+                    loop.call_soon(tokens.put_nowait, _END)
+                    await pump
+
+        messages = state.get("messages", [])
+        reply = messages[-1].content if messages else "I'm sorry, I didn't understand that."
+        event = {"type": "reply", "intent": state.get("intent", "greeting")}
+        if reply != "".join(streamed):
+            event["text"] = reply
+        await self.send(event)
+
+        current = public_state(state)
+        changes = {key: value for key, value in current.items() if self.sent_state.get(key, _UNSET) != value}
+        if changes:
+            self.sent_state.update(changes)
+            await self.send({"type": "state", "changes": changes})
+
+        for component, value in ui_components(state).items():
+            if component == "youtube_analysis":
+                if self.analysis_sent:
+                    continue
+                self.analysis_sent = True
+            await self.send({"type": "ui", "component": component, "value": value})
+
+        await self.send({"type": "done", "turn": current["turn_count"]})
+
+        channel = state.get("yt_channel")
+        if channel and not state.get("yt_analysis_done") and (self._late is None or self._late.done()):
+            self._late = asyncio.create_task(self._push_analysis(channel))
+
+    async def run_turn(self, message: str, stream: bool = True):
+        """
+        Run one turn, cancelling it if the client disconnects first
+
+        Raises:
+            WebSocketDisconnect when the client went away mid-turn
+        """
+        task = asyncio.ensure_future(self.turn(message, stream))
+        watcher = asyncio.ensure_future(self.disconnected.wait())
+        try:
+            await asyncio.wait({task, watcher}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            watcher.cancel()
+        if not task.done():
+            task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await task
+            logger.info("Client disconnected, turn cancelled")
+            raise WebSocketDisconnect(code=1001)
+        return task.result()
+
+    async def receive(self, inbox: asyncio.Queue):
+        """
+        Read frames as they arrive, so a disconnect is seen while a turn
+        runs; None in the inbox marks the end of the connection
+        """
+        try:
+            while True:
+                inbox.put_nowait(await self.websocket.receive_text())
+        except (WebSocketDisconnect, RuntimeError):
+            pass
+        finally:
+            self.disconnected.set()
+            inbox.put_nowait(None)
+
+    async def _push_analysis(self, channel: str):
+        """Wait for the channel lookup, save it to the session and push it"""
+        try:
+            analysis = await youtube_analyzer.analyze(channel)
+            if not analysis or self.analysis_sent:
+                return
+            # Not during a turn, so the turn's checkpoint cannot overwrite it
+            async with self._turn_lock:
+                await autostream_graph.attach_analysis(self.session_id, analysis)
+            self.analysis_sent = True
+            await self.send({"type": "ui", "component": "youtube_analysis", "value": analysis})
+        except (WebSocketDisconnect, RuntimeError):
+            pass
+        except Exception:
+            logger.exception("Late channel analysis failed")
+
+    def close(self):
+        if self._late is not None:
+            self._late.cancel()
+
+
+@router.websocket("/ws/{session_id}")
+async def chat_socket(websocket: WebSocket, session_id: str, tenant: Optional[str] = Query(None)):
+    """
+    Chat over a persistent WebSocket (see ChatSocket for the protocol)
+
+    The tenant comes from the ?tenant= query parameter or the
+    X-Tenant-ID header of the handshake; for an existing session it must
+    be the session's own (otherwise the socket is closed with 1008).
+    """
+    await websocket.accept()
+    session_id_var.set(session_id)
+    tenant_id = session_store.tenant_for(session_id, tenant or websocket.headers.get("x-tenant-id"))
+    if tenant_id is None:
+        await websocket.send_text(json.dumps({"type": "error", "detail": "Tenant does not match the session's tenant"}))
+        await websocket.close(code=1008)
+        return
+    socket = ChatSocket(websocket, session_id, tenant_id)
+    inbox: asyncio.Queue = asyncio.Queue()
+    reader = asyncio.create_task(socket.receive(inbox))
+    try:
+        while True:
+            raw = await inbox.get()
+            if raw is None:
+                break
+            try:
+                request = json.loads(raw)
+                message = str(request.get("message") or "").strip()
+            except (ValueError, AttributeError):
+                message = ""
+            if not message:
+                await socket.send({"type": "error", "detail": 'Expected {"message": "..."}'})
+                continue
+            decision = chat_rate_limiter.check(
+                session_id,
+                client_ip(websocket.client.host if websocket.client else None,
+                          websocket.headers.get("x-forwarded-for")),
+                socket.tenant_id
+            )
+            if not decision.allowed:
+                await socket.send({
+                    "type": "error", "detail": f"Too many messages ({decision.scope} limit)",
+                    "retry_after": int(decision.retry_after_header)
+                })
+                continue
+            try:
+                await socket.run_turn(message, stream=request.get("stream", True) is not False)
+            except WebSocketDisconnect:
+                raise
+            except Exception as e:
+                logger.exception("WebSocket turn failed")
+                await socket.send({"type": "error", "detail": f"Internal server error: {str(e)}"})
+    except WebSocketDisconnect:
+        pass
+    finally:
+        reader.cancel()
+        socket.close()
@@ -0,0 +1,4 @@
+"""
+Benchmarks
+Each module runs one benchmark and prints a JSON report: python -m bench.<module>, in its own process
+"""
@@ -0,0 +1,64 @@
+"""
+Checkpoint Memory Benchmark
+Per-session checkpoint bytes after many turns, InMemorySaver against PrunedInMemorySaver
+"""
+import asyncio
+import json
+from langchain_core.messages import AIMessage, HumanMessage
+from langgraph.checkpoint.memory import InMemorySaver
+from langgraph.graph import StateGraph, START, END
+from app.agent.state import AgentState
+from app.memory.checkpoint import PrunedInMemorySaver
+
+
+def footprint(saver: InMemorySaver, thread_id: str) -> int:
+    """Serialized bytes an in-memory saver holds for one thread (checkpoints, writes and blobs)"""
+    size = sum(
+        len(checkpoint[1]) + len(metadata[1])
+        for namespace in saver.storage.get(thread_id, {}).values()
+        for checkpoint, metadata, _ in namespace.values()
+    )
+    size += sum(len(value[1]) for key, value in saver.blobs.items() if key[0] == thread_id)
+    size += sum(
+        len(write[2][1]) for key, writes in saver.writes.items() if key[0] == thread_id for write in writes.values()
+    )
+    return size
+
+
+def benchmark(turns=(1, 6, 20, 100), reply_chars: int = 400) -> list:
+    """
+    Per-session checkpoint memory after a number of turns, InMemorySaver
+    against PrunedInMemorySaver
+
+    Each turn adds a user message and a reply of `reply_chars` characters
+    through a one-node graph over AgentState (message window and all), run
+    with durability="exit" like the real graph.
+
+    Returns:
+        One {"turns", "in_memory_bytes", "pruned_bytes"} row per turn count
+    """
+    def respond(state: AgentState) -> AgentState:
+        return {"messages": [AIMessage(content="x" * reply_chars)], "turn_count": state.get("turn_count", 0) + 1}
+
+    builder = StateGraph(AgentState)
+    builder.add_node("respond", respond)
+    builder.add_edge(START, "respond")
+    builder.add_edge("respond", END)
+
+    async def run(saver: InMemorySaver, count: int) -> int:
+        graph = builder.compile(checkpointer=saver)
+        thread = {"configurable": {"thread_id": "bench"}}
+        for turn in range(count):
+            await graph.ainvoke({"messages": [HumanMessage(content=f"message {turn}")]}, thread, durability="exit")
+        return footprint(saver, "bench")
+
+    return [
+        {"turns": count,
+         "in_memory_bytes": asyncio.run(run(InMemorySaver(), count)),
+         "pruned_bytes": asyncio.run(run(PrunedInMemorySaver(), count))}
+        for count in turns
+    ]
+
+
+if __name__ == "__main__":
+    print(json.dumps(benchmark(), indent=2))
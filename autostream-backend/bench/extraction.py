@@ -0,0 +1,60 @@
+"""
+Extraction Benchmark
+The single compiled pass against the per-field scans it replaced
+"""
+import json
+import re
+import time
+from app.agent.extraction import extraction_engine
+
+
+def _multi_scan(text: str) -> dict:
+    """The per-field scans the single pass replaced"""
+    low_text = text.lower()
+    hits = {}
+    email = re.search(r'[\w\.-]+@[\w\.-]+\.\w+', text)
+    hits["email"] = email.group(0) if email else None
+    hits["plan"] = "pro" if "pro" in low_text else "basic" if "basic" in low_text else None
+    for p in ["youtube", "tiktok", "instagram"]:
+        if p in low_text:
+            hits["platform"] = p
+    name = re.search(r"(?:my name is|i'm|i am|call me) ([\w\s]+)", low_text)
+    hits["name"] = name.group(1).strip().split()[0] if name else None
+    if "youtube.com" in low_text or "youtu.be" in low_text:
+        hits["yt"] = re.search(r'(?:https?://)?(?:www\.)?youtube\.com/\S+|youtu\.be/\S+', text)
+    hits["discovery"] = any(w in low_text for w in ["youtube", "tiktok", "instagram", "weekly", "daily", "monthly"])
+    hits["pricing"] = any(w in low_text for w in ["price", "cost", "plan", "how much"])
+    hits["agreement"] = any(w in low_text for w in ["sounds good", "okay", "interested", "like it"])
+    return hits
+
+
+def benchmark(iterations: int = 20000) -> dict:
+    """
+    Microbenchmark the single pass against the previous multi-scan approach
+
+    Args:
+        iterations: Messages extracted per measurement
+
+    Returns:
+        Microseconds per message for both implementations
+    """
+    messages = [
+        "Hi there!",
+        "What pricing plans do you offer?",
+        "I'm interested in the Pro plan. My name is Sarah Chen.",
+        "My email is sarah.chen@example.com and I create content on YouTube",
+        "My channel is youtube.com/@SarahTech",
+        "I post TikToks daily and want to know how much the basic plan costs, sounds good so far",
+    ]
+    report = {}
+    for label, func in (("single_pass", extraction_engine.extract), ("multi_scan", _multi_scan)):
+        start = time.perf_counter()
+        for i in range(iterations):
+            func(messages[i % len(messages)])
+        report[f"{label}_us_per_message"] = round((time.perf_counter() - start) / iterations * 1e6, 3)
+    report["speedup"] = round(report["multi_scan_us_per_message"] / report["single_pass_us_per_message"], 2)
+    return report
+
+
+if __name__ == "__main__":
+    print(json.dumps(benchmark(), indent=2))
@@ -0,0 +1,10 @@
+"""
+Funnel Simulation Benchmark
+One million synthetic sessions replayed through the funnel's transition tables
+"""
+import json
+from app.agent.funnel import funnel_machine
+
+
+if __name__ == "__main__":
+    print(json.dumps(funnel_machine.simulate(), indent=2))
@@ -0,0 +1,52 @@
+"""
+Metrics Benchmark
+Cost of instrumenting one turn: stage spans, histogram updates and token counting
+"""
+import json
+import time
+from app.agent.metrics import metrics_registry, record_llm_usage, record_turn
+from app.agent.timing import StageTimer
+
+
+def benchmark(turns: int = 100_000, reference_turn_ms: float = 100.0) -> dict:
+    """
+    Cost of instrumenting one turn: the stage spans (perf_counter pairs in
+    StageTimer), the per-stage histogram updates and token counting.
+    Records into the live metrics, so run it in its own process.
+
+    Args:
+        reference_turn_ms: Turn time to compare against; real turns are
+            dominated by a Groq call, so 100 ms is a conservative floor
+
+    Returns:
+        Microseconds per instrumented turn and the share of the reference turn
+    """
+    def noop(state):
+        return state
+
+    stages = ("extraction", "retrieval", "llm", "youtube", "lead_capture")
+    usage = {"input_tokens": 900, "output_tokens": 120}
+    start = time.perf_counter()
+    for _ in range(turns):
+        timer = StageTimer()
+        for stage in stages:
+            timer.run(stage, noop, None)
+        record_llm_usage("respond", usage)
+        record_turn(timer.finish(), "pricing", "EXPLORING")
+    per_turn_us = (time.perf_counter() - start) / turns * 1e6
+
+    start = time.perf_counter()
+    metrics_registry.render()
+    render_ms = (time.perf_counter() - start) * 1000
+
+    return {
+        "turns": turns,
+        "instrumentation_us_per_turn": round(per_turn_us, 2),
+        "overhead_pct_of_reference_turn": round(per_turn_us / (reference_turn_ms * 1000) * 100, 4),
+        "reference_turn_ms": reference_turn_ms,
+        "scrape_render_ms": round(render_ms, 3)
+    }
+
+
+if __name__ == "__main__":
+    print(json.dumps(benchmark(), indent=2))
@@ -0,0 +1,81 @@
+"""
+Model Routing Benchmark
+Scripted conversations with every turn on the 70B model against routed turns, on a local Groq stand-in
+"""
+import asyncio
+import json
+import threading
+import time
+import uvicorn
+from app.config import config
+from app.agent.graph import autostream_graph
+from app.agent.model_router import ROUTES, ModelRouter, stand_in_app
+from app.agent.usage import token_ledger
+from app.memory.session_store import session_store
+
+
+def benchmark(port: int = 8767, conversations: int = 20) -> dict:
+    """
+    Scripted conversations through the graph against a local stand-in for
+    Groq, once with every turn on the 70B model and once routed.
+
+    Stand-in latencies are assumptions, not measurements: 0.20 s to the
+    first token and 4 ms per token for the 70B model, 0.08 s and 1 ms for
+    the small one. Retrieval and the rest of the pipeline run as usual.
+
+    Returns:
+        Per mode: share of turns per route, mean / p50 turn ms and LLM cost
+    """
+    app = stand_in_app(
+        seconds_per_token={config.GROQ_MODEL: 0.004, config.GROQ_FAST_MODEL: 0.001},
+        first_token_seconds={config.GROQ_MODEL: 0.20, config.GROQ_FAST_MODEL: 0.08}
+    )
+    script = ["hi there", "I make gaming videos on YouTube", "what does autostream do?",
+              "how much is it?", "what's the difference between basic and pro?", "that's a bit expensive",
+              "ok I'll take the pro plan", "sounds good, sign me up", "I'm Sam", "sam@example.com"]
+
+    async def run(enabled: bool) -> dict:
+        router = ModelRouter(routes={name: {**settings, "base_url": f"http://127.0.0.1:{port}"}
+                                     for name, settings in ROUTES.items()}, enabled=enabled)
+        previous_router, autostream_graph.router = autostream_graph.router, router
+        cost_before = token_ledger.summary()["totals"].get("cost_usd", 0.0)
+        samples = []
+        try:
+            for conversation in range(conversations):
+                session_id = f"route-bench-{enabled}-{conversation}"
+                for message in script:
+                    new_session = await session_store.touch(session_id)
+                    started = time.perf_counter()
+                    state = await autostream_graph.arun(session_id, message, new_session)
+                    samples.append((time.perf_counter() - started) * 1000)
+                    if state.get("conversation_state") == "FINAL":
+                        break
+                await session_store.delete_session(session_id)
+        finally:
+            autostream_graph.router = previous_router
+        samples.sort()
+        stats = router.stats()
+        decided = sum(route["decisions"] for route in stats["routes"].values()) or 1
+        return {
+            "turns": len(samples),
+            "route_share": {name: round(route["decisions"] / decided, 3) for name, route in stats["routes"].items()},
+            "mean_turn_ms": round(sum(samples) / len(samples), 1),
+            "p50_turn_ms": round(samples[len(samples) // 2], 1),
+            "llm_cost_usd": round(token_ledger.summary()["totals"].get("cost_usd", 0.0) - cost_before, 6),
+            "routes": stats["routes"]
+        }
+
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_config=None))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    try:
+        return {"all_70b": asyncio.run(run(False)), "routed": asyncio.run(run(True))}
+    finally:
+        server.should_exit = True
+        thread.join()
+
+
+if __name__ == "__main__":
+    print(json.dumps(benchmark(), indent=2))
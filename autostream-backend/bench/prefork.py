@@ -0,0 +1,137 @@
+"""
+Prefork Memory Benchmark
+RSS and PSS per worker for 1, 4 and 16 workers: per-worker loading against a preloaded, forked master
+"""
+import argparse
+import gc
+import json
+import os
+import signal
+import time
+from typing import Callable
+from app.prefork import _after_fork, _spawn, memory_report
+
+
+def _synthetic_pipeline(index_vectors: int):
+    """
+    Stand-in with the real pipeline's memory profile, for hosts without
+    the model download: a randomly initialized BERT shaped like
+    all-MiniLM-L6-v2 and a flat FAISS index of 384-d vectors
+    """
+    import faiss
+    import numpy as np
+    import torch
+    from transformers import BertConfig, BertModel
+
+    torch.manual_seed(0)
+    model = BertModel(BertConfig(
+        vocab_size=30522, hidden_size=384, num_hidden_layers=6, num_attention_heads=12, intermediate_size=1536
+    ))
+    model.eval()
+    for parameter in model.parameters():
+        parameter.requires_grad_(False)
+    index = faiss.IndexFlatL2(384)
+    index.add(np.random.default_rng(0).random((index_vectors, 384), dtype=np.float32))
+
+    def query(step: int):
+        ids = torch.randint(0, 30522, (1, 24), generator=torch.Generator().manual_seed(step))
+        with torch.inference_mode():
+            vector = model(ids).last_hidden_state.mean(dim=1).numpy()
+        index.search(vector, 3)
+    return query
+
+
+def _load_query(synthetic: bool, index_vectors: int) -> Callable[[int], None]:
+    if synthetic:
+        return _synthetic_pipeline(index_vectors)
+    from app.agent.rag import rag_pipeline
+    return lambda step: rag_pipeline.retrieve_context(f"how much is the pro plan {step}")
+
+
+def _available_mb() -> float:
+    with open("/proc/meminfo") as f:
+        for line in f:
+            if line.startswith("MemAvailable:"):
+                return int(line.split()[1]) / 1024
+    return float("inf")
+
+
+def benchmark(worker_counts=(1, 4, 16), requests: int = 50, synthetic: bool = True,
+              index_vectors: int = 50_000) -> dict:
+    """
+    RSS and PSS per worker after serving simulated retrieval requests,
+    for each worker count and three modes:
+
+    - per_worker: every worker loads its own model and index (uvicorn --workers)
+    - preload: the master loads once and forks
+    - preload_frozen: preload plus gc.freeze() before forking (what serve() does)
+
+    Each worker runs `requests` embedding + search calls and a full GC
+    pass, the way a long-lived worker eventually would.
+
+    Args:
+        synthetic: Use the offline stand-in instead of the real model download
+
+    Returns:
+        Per mode and worker count: mean RSS/PSS per worker, total PSS and load time
+    """
+    os.environ.setdefault("TOKENIZERS_PARALLELISM", "false")
+    results = {}
+    for mode in ("per_worker", "preload", "preload_frozen"):
+        for workers in worker_counts:
+            # Skip runs that would exhaust memory, judged by the mode's smallest run so far
+            measured = results.get(mode, {})
+            if measured:
+                private_mb = min(r["private_mb_per_worker"] for r in measured.values() if "private_mb_per_worker" in r)
+                if private_mb * workers > _available_mb() * 0.8:
+                    measured[workers] = {"skipped": f"needs ~{private_mb * workers:.0f} MB private memory"}
+                    continue
+            ready_r, ready_w = os.pipe()
+            started = time.perf_counter()
+            query = None
+            if mode != "per_worker":
+                query = _load_query(synthetic, index_vectors)
+                if mode == "preload_frozen":
+                    gc.collect()
+                    gc.freeze()
+
+            def worker(query=query):
+                if query is None:
+                    query = _load_query(synthetic, index_vectors)
+                _after_fork(workers)
+                for step in range(requests):
+                    query(step)
+                    [{"turn": step, "text": "x" * 64} for _ in range(200)]
+                gc.collect()
+                os.write(ready_w, b".")
+                signal.pause()
+
+            pids = [_spawn(worker) for _ in range(workers)]
+            for _ in pids:
+                os.read(ready_r, 1)
+            elapsed = time.perf_counter() - started
+            report = memory_report(pids)
+            for pid in pids:
+                os.kill(pid, signal.SIGTERM)
+                os.waitpid(pid, 0)
+            os.close(ready_r)
+            os.close(ready_w)
+            gc.unfreeze()
+            del query
+            gc.collect()
+
+            results.setdefault(mode, {})[workers] = {
+                "rss_mb_per_worker": round(sum(r["rss_mb"] for r in report.values()) / workers, 1),
+                "pss_mb_per_worker": round(sum(r["pss_mb"] for r in report.values()) / workers, 1),
+                "private_mb_per_worker": round(sum(r["private_mb"] for r in report.values()) / workers, 1),
+                "pss_mb_total": round(sum(r["pss_mb"] for r in report.values()), 1),
+                "seconds_to_all_ready": round(elapsed, 2)
+            }
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--real-model", action="store_true", help="Benchmark with the real embedding model")
+    args = parser.parse_args()
+    print(json.dumps(benchmark(synthetic=not args.real_model), indent=2))
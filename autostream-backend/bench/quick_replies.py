@@ -0,0 +1,51 @@
+"""
+Quick Reply Benchmark
+Cost of deciding and serving a quick-reply turn from the precomputed artifact
+"""
+import json
+import os
+import tempfile
+import time
+from langchain_core.messages import HumanMessage
+from app.agent.quick_replies import PROFILE_FIELDS, QuickReplyCache
+
+
+def benchmark(iterations: int = 100_000) -> dict:
+    """
+    Cost of deciding and serving a quick-reply turn from the artifact
+    (synthetic entries when no current artifact exists)
+
+    Returns:
+        Microseconds per hit, per button text in an unbuilt state, and per ordinary message
+    """
+    cache = QuickReplyCache(enabled=True)
+    if not cache.load():
+        artifact = tempfile.NamedTemporaryFile("w", suffix=".json", delete=False)
+        with artifact:
+            json.dump({"version": cache.version, "entries": [
+                {"message": message, "profile": {**{field: None for field in PROFILE_FIELDS}, "conversation_state": state},
+                 "retrieved_context": "", "reply": "", "intent": "info", "model": "synthetic"}
+                for message in cache.messages for state in cache.states
+            ]}, artifact)
+        cache = QuickReplyCache(artifact_path=artifact.name, enabled=True)
+        cache.load()
+        os.unlink(artifact.name)
+
+    def per_call_us(state: dict) -> float:
+        start = time.perf_counter()
+        for _ in range(iterations):
+            if cache.should_serve(state):
+                cache.lookup(state)
+        return (time.perf_counter() - start) / iterations * 1e6
+
+    button = [HumanMessage(content=cache.messages[0])]
+    return {
+        "entries": cache.stats()["entries"],
+        "hit_us": round(per_call_us({"messages": button, "conversation_state": cache.states[0]}), 2),
+        "other_state_us": round(per_call_us({"messages": button, "conversation_state": "QUALIFIED"}), 2),
+        "other_message_us": round(per_call_us({"messages": [HumanMessage(content="what about 4K?")]}), 2)
+    }
+
+
+if __name__ == "__main__":
+    print(json.dumps(benchmark(), indent=2))
@@ -0,0 +1,72 @@
+"""
+Rate Limit Benchmark
+Check cost with many live client keys, per backend, shard count and thread count
+"""
+import json
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+from app.config import config
+from app.ratelimit import Limit, MemoryBackend, RateLimitBackend, SQLiteBackend
+
+
+def benchmark(keys: int = 100_000, checks: int = 200_000, threads: int = 8) -> dict:
+    """
+    Check cost with `keys` client IPs live in the table while new sessions
+    keep arriving (so tables grow and get swept), for 1 shard vs.
+    RATE_LIMIT_SHARDS, single-threaded and with `threads` threads, and for
+    the shared SQLite backend. Limits are set so every check is admitted
+    (the admitting path is the one that writes).
+
+    Returns:
+        Mean / p99 / max microseconds per check and keys tracked, per configuration
+    """
+    # One request a minute keeps a key live for a minute; the burst admits everything
+    limit = Limit("bench", per_minute=1, burst=10**9)
+    rng = random.Random(7)
+    ips = [f"i:10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}" for i in range(keys)]
+    requests = [[(f"s:new-{n}", limit), (rng.choice(ips), limit), (f"t:tenant-{n % 50}", limit)]
+                for n in range(checks)]
+
+    def run(backend: RateLimitBackend, batch) -> List[int]:
+        samples = []
+        for request in batch:
+            start = time.perf_counter_ns()
+            backend.acquire(request)
+            samples.append(time.perf_counter_ns() - start)
+        return samples
+
+    def measure(backend: RateLimitBackend, workers: int, count: int) -> dict:
+        for ip in ips:
+            backend.acquire([(ip, limit)])
+        sample = requests[:count]
+        start = time.perf_counter()
+        if workers == 1:
+            samples = run(backend, sample)
+        else:
+            with ThreadPoolExecutor(workers) as pool:
+                parts = pool.map(lambda part: run(backend, part), [sample[n::workers] for n in range(workers)])
+                samples = [ns for part in parts for ns in part]
+        elapsed = time.perf_counter() - start
+        samples.sort()
+        return {
+            "mean_us": round(elapsed / len(sample) * 1e6, 2),
+            "p99_us": round(samples[int(len(samples) * 0.99)] / 1000, 1),
+            "max_us": round(samples[-1] / 1000, 1),
+            "checks_per_s": round(len(sample) / elapsed),
+            "tracked_keys": backend.size()
+        }
+
+    results = {"live_keys": keys, "checks": checks}
+    for shards in (1, config.RATE_LIMIT_SHARDS):
+        results[f"memory_{shards}_shards"] = measure(MemoryBackend(shards), 1, checks)
+        results[f"memory_{shards}_shards_{threads}_threads"] = measure(MemoryBackend(shards), threads, checks)
+    sqlite_backend = SQLiteBackend(":memory:")
+    results["sqlite"] = measure(sqlite_backend, 1, checks // 10)
+    sqlite_backend.close()
+    return results
+
+
+if __name__ == "__main__":
+    print(json.dumps(benchmark(), indent=2))
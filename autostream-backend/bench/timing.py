@@ -0,0 +1,89 @@
+"""
+Turn Pipeline Benchmark
+The graph with overlapped stages against the sequential agent node it replaced
+"""
+import asyncio
+import json
+import re
+import time
+from typing import List
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from langchain_core.messages import HumanMessage, SystemMessage
+from app.agent.graph import autostream_graph
+from app.agent.prompts import SYSTEM_PROMPT
+from app.agent.rag import rag_pipeline
+from app.agent.youtube_analyzer import analyze_for_pro_benefits, extract_channel_info, youtube_analyzer
+from app.memory.session_store import session_store
+
+
+def benchmark(turns: int = 20, llm_seconds: float = 0.6) -> dict:
+    """
+    Turn latency of the graph as it runs against the agent node it
+    replaced, which ran retrieval, the LLM call, regex extraction and the
+    channel analysis one after another in the request handler.
+
+    The pre-change turn is reproduced step for step, including its channel
+    analysis: a local mock with no API call. The current graph runs with
+    YOUTUBE_API_KEY unset so its lookup is the same mock. Retrieval is the
+    real pipeline; the LLM is a stand-in that answers after `llm_seconds`.
+    Records into the live stats, so run it in its own process.
+
+    Returns:
+        Mean and p50 turn ms per mode
+    """
+    llm = FakeListChatModel(responses=["INTENT: pricing STATE: PRICING Pro is $79/month with 4K and captions."],
+                            sleep=llm_seconds)
+
+    def message(mode: str, turn: int) -> str:
+        return f"How much is the Pro plan for {mode} {turn}? My channel is youtube.com/@{mode}bench{turn}"
+
+    def pre_change(turn: int) -> float:
+        # The agent node before stages overlapped, blocking the handler as it did
+        text = message("sequential", turn)
+        started = time.perf_counter()
+        context = rag_pipeline.retrieve_context(text)
+        system_prompt = SYSTEM_PROMPT.format(context=context, name="Unknown", email="Unknown",
+                                             platform="Unknown", plan="None", conversation_state="DISCOVERY")
+        reply = llm.invoke([SystemMessage(content=system_prompt), HumanMessage(content=text)]).content
+        re.search(r'INTENT:\s*(\w+)', reply, re.IGNORECASE)
+        for pattern in (r'\[INTENT:.*?\]', r'INTENT:\s*\w+\s*', r'STATE:\s*\w+\s*'):
+            reply = re.sub(pattern, '', reply, flags=re.IGNORECASE)
+        re.search(r'[\w\.-]+@[\w\.-]+\.\w+', text)
+        re.search(r"(?:my name is|i'm|i am|call me) ([\w\s]+)", text.lower())
+        channel = re.search(r'(?:https?://)?(?:www\.)?youtube\.com/\S+|youtu\.be/\S+', text).group(0)
+        analyze_for_pro_benefits(extract_channel_info(channel))
+        return (time.perf_counter() - started) * 1000
+
+    async def overlapped(turn: int) -> float:
+        session_id = f"overlap-bench-{turn}"
+        new_session = await session_store.touch(session_id)
+        started = time.perf_counter()
+        await autostream_graph.arun(session_id, message("overlapped", turn), new_session)
+        elapsed = (time.perf_counter() - started) * 1000
+        await session_store.delete_session(session_id)
+        return elapsed
+
+    def stats(samples: List[float]) -> dict:
+        samples = sorted(samples)
+        return {"mean_turn_ms": round(sum(samples) / len(samples), 1), "p50_turn_ms": round(samples[len(samples) // 2], 1)}
+
+    async def run() -> dict:
+        saved = (autostream_graph.llm, youtube_analyzer.api_key)
+        autostream_graph.llm, youtube_analyzer.api_key = llm, ""
+        try:
+            before = stats([pre_change(turn) for turn in range(turns)])
+            after = stats([await overlapped(turn) for turn in range(turns)])
+        finally:
+            autostream_graph.llm, youtube_analyzer.api_key = saved
+        return {
+            "turns": turns,
+            "pre_change": before,
+            "overlapped": after,
+            "saving_ms": round(before["mean_turn_ms"] - after["mean_turn_ms"], 1)
+        }
+
+    return asyncio.run(run())
+
+
+if __name__ == "__main__":
+    print(json.dumps(benchmark(), indent=2))
@@ -0,0 +1,89 @@
+"""
+Chat Transport Benchmark
+Per-turn cost of POST /api/chat against one persistent WebSocket, with and without token streaming
+"""
+import itertools
+import json
+import threading
+import time
+import httpx
+import uvicorn
+import websockets.sync.client
+from langchain_core.language_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage
+from app.agent.graph import autostream_graph
+from app.main import app
+from app.ratelimit import chat_rate_limiter
+
+
+def benchmark(turns: int = 200, port: int = 8766) -> dict:
+    """
+    Per-turn cost of the two transports against a local server, with the
+    LLM replaced by an instant fake so only transport and framing remain:
+    POST /api/chat on a keep-alive connection versus one persistent
+    WebSocket, with and without token streaming. Retrieval and the rest
+    of the pipeline run as usual.
+
+    Returns:
+        Mean / p50 / p99 client-side ms per turn, response bytes per turn
+        and, for the WebSocket, ms until the first frame (reply text)
+    """
+    reply = ("INTENT: pricing STATE: PRICING The Pro plan is 79 dollars per month with unlimited videos, "
+             "4K resolution and AI captions. Want me to compare it with Basic?")
+    autostream_graph.llm = GenericFakeChatModel(messages=itertools.cycle([AIMessage(content=reply)]))
+    # Hundreds of turns from one session and address would be throttled
+    chat_rate_limiter.enabled = False
+
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_config=None))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+
+    def summarize(samples: list, sizes: list) -> dict:
+        samples.sort()
+        return {
+            "mean_ms": round(sum(samples) / len(samples), 3),
+            "p50_ms": round(samples[len(samples) // 2], 3),
+            "p99_ms": round(samples[int(len(samples) * 0.99)], 3),
+            "bytes_per_turn": round(sum(sizes) / len(sizes))
+        }
+
+    results = {}
+    try:
+        samples, sizes = [], []
+        with httpx.Client(base_url=f"http://127.0.0.1:{port}") as client:
+            for turn in range(turns):
+                start = time.perf_counter()
+                response = client.post("/api/chat", json={"session_id": "bench-post", "message": "how much is pro?"})
+                samples.append((time.perf_counter() - start) * 1000)
+                sizes.append(len(response.content))
+        results["post"] = summarize(samples, sizes)
+
+        for name, stream in (("websocket", True), ("websocket_no_tokens", False)):
+            samples, sizes, first_event = [], [], []
+            with websockets.sync.client.connect(f"ws://127.0.0.1:{port}/api/ws/bench-{name}") as connection:
+                for turn in range(turns):
+                    start = time.perf_counter()
+                    connection.send(json.dumps({"message": "how much is pro?", "stream": stream}))
+                    size = 0
+                    while True:
+                        frame = connection.recv()
+                        if not size:
+                            first_event.append((time.perf_counter() - start) * 1000)
+                        size += len(frame)
+                        if json.loads(frame)["type"] in ("done", "error"):
+                            break
+                    samples.append((time.perf_counter() - start) * 1000)
+                    sizes.append(size)
+            results[name] = summarize(samples, sizes)
+            first_event.sort()
+            results[name]["first_text_p50_ms"] = round(first_event[len(first_event) // 2], 3)
+    finally:
+        server.should_exit = True
+        thread.join()
+    return results
+
+
+if __name__ == "__main__":
+    print(json.dumps(benchmark(), indent=2))
@@ -0,0 +1,60 @@
+"""
+Bulk Channel Analysis Benchmark
+Throughput of bulk_analyze against an in-process fake YouTube API
+"""
+import asyncio
+import json
+import httpx
+from app.agent.youtube_analyzer import YouTubeAnalyzer
+from app.agent.youtube_bulk import bulk_analyze
+
+
+def benchmark(sizes=(10_000, 100_000), latency: float = 0.02, concurrency: int = 128,
+              duplicate_every: int = 10) -> list:
+    """
+    Throughput of bulk_analyze against an in-process fake YouTube API
+
+    Every `duplicate_every`-th line repeats an earlier channel in another
+    URL form, so deduplication is exercised too.
+
+    Args:
+        latency: Simulated API latency per request (seconds)
+
+    Returns:
+        One report per size
+    """
+    async def fake_api(request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(latency)
+        handle = request.url.params.get("forHandle", "@unknown")
+        return httpx.Response(200, json={"items": [{
+            "id": "UC" + handle.lstrip("@"),
+            "snippet": {"title": handle.lstrip("@")},
+            "statistics": {"subscriberCount": "1000", "videoCount": "120"}
+        }]})
+
+    def lines(n: int):
+        for i in range(n):
+            if i % duplicate_every == duplicate_every - 1:
+                yield f"creator{i - 1},https://www.youtube.com/@Creator{i - 1}/videos"
+            else:
+                yield f"creator{i},youtube.com/@creator{i}"
+
+    async def run(n: int) -> dict:
+        analyzer = YouTubeAnalyzer(api_key="bench", base_url="http://fake", transport=httpx.MockTransport(fake_api))
+        analyzer.max_entries = n * 2
+        summary = None
+        async for record in bulk_analyze(lines(n), concurrency, analyzer, max_channels=n):
+            summary = record.get("summary", summary)
+        return {
+            "urls": n,
+            **summary,
+            "api_calls": analyzer.counters["api_calls"],
+            "urls_per_s": round(n / summary["elapsed_s"]),
+            "ideal_s": round(summary["unique_channels"] * latency / concurrency, 2)
+        }
+
+    return [asyncio.run(run(n)) for n in sizes]
+
+
+if __name__ == "__main__":
+    print(json.dumps(benchmark(), indent=2))
@@ -2,11 +2,11 @@
 Test Script for AutoStream AI Assistant
 Run this to verify the backend is working correctly
 """
-import asyncio
 import uuid
-from app.api import chat, ChatRequest
+from fastapi.testclient import TestClient
+from app.main import app
 
-async def test_conversation():
+def test_conversation():
     """Test a complete conversation flow"""
     
     print("=" * 70)
@@ -25,23 +25,26 @@ async def test_conversation():
         "My channel is youtube.com/@SarahTech"
     ]
     
-    for i, message in enumerate(test_messages, 1):
-        print(f"\n{'='*70}")
-        print(f"Turn {i}")
-        print(f"{'='*70}")
-        print(f"👤 User: {message}")
-        
-        try:
-            request = ChatRequest(session_id=session_id, message=message)
-            response = await chat(request)
+    # Through the app (startup, headers, rate limits) as a client would call it
+    with TestClient(app) as client:
+        for i, message in enumerate(test_messages, 1):
+            print(f"\n{'='*70}")
+            print(f"Turn {i}")
+            print(f"{'='*70}")
+            print(f"👤 User: {message}")
             
-            print(f"🤖 Assistant: {response.reply}")
-            print(f"\n📊 Intent: {response.intent}")
-            print(f"📋 State: {response.state}")
-            
-        except Exception as e:
-            print(f"❌ Error: {e}")
-            break
+            try:
+                response = client.post("/api/chat", json={"session_id": session_id, "message": message})
+                response.raise_for_status()
+                data = response.json()
+                
+                print(f"🤖 Assistant: {data['reply']}")
+                print(f"\n📊 Intent: {data['intent']}")
+                print(f"📋 State: {data['state']}")
+                
+            except Exception as e:
+                print(f"❌ Error: {e}")
+                break
     
     print(f"\n{'='*70}")
     print("Test Complete!")
@@ -54,4 +57,4 @@ if __name__ == "__main__":
     
     input("Press Enter to start test...")
     
-    asyncio.run(test_conversation())
+    test_conversation()
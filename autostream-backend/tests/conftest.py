@@ -0,0 +1,8 @@
+"""
+Shared test setup
+Tests run without a Groq key: nothing here calls Groq, but the routed chat models need one to construct
+"""
+import os
+
+os.environ.setdefault("GROQ_API_KEY", "test")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
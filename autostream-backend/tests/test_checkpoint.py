@@ -0,0 +1,104 @@
+"""
+Checkpoint Pruning
+PrunedInMemorySaver keeps each session's newest checkpoints, so its memory stops growing with turns
+"""
+import asyncio
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage
+from langgraph.checkpoint.memory import InMemorySaver
+from langgraph.graph import StateGraph, START, END
+from app.agent.state import AgentState
+from app.config import config
+from app.memory.checkpoint import PrunedInMemorySaver
+
+
+def _respond(state: AgentState) -> AgentState:
+    return {"messages": [AIMessage(content="reply " + "x" * 200)], "turn_count": state.get("turn_count", 0) + 1}
+
+
+def _graph(saver: InMemorySaver):
+    builder = StateGraph(AgentState)
+    builder.add_node("respond", _respond)
+    builder.add_edge(START, "respond")
+    builder.add_edge("respond", END)
+    return builder.compile(checkpointer=saver)
+
+
+def _thread(thread_id: str) -> dict:
+    return {"configurable": {"thread_id": thread_id}}
+
+
+def _run(graph, thread_id: str, turns: int):
+    async def run():
+        for turn in range(turns):
+            await graph.ainvoke({"messages": [HumanMessage(content=f"message {turn}")]},
+                                _thread(thread_id), durability="exit")
+    asyncio.run(run())
+
+
+def _blobs(saver: InMemorySaver, thread_id: str) -> int:
+    return sum(1 for key in saver.blobs if key[0] == thread_id)
+
+
+def _last_message(state: dict) -> str:
+    return [message.content for message in state["messages"] if message.type == "human"][-1]
+
+
+def _checkpoints(saver: InMemorySaver, thread_id: str) -> list:
+    return list(saver.list(_thread(thread_id)))
+
+
+@pytest.mark.parametrize("turns", [1, 2, 5, 30])
+def test_keeps_the_newest_checkpoints(turns):
+    saver = PrunedInMemorySaver()
+    _run(_graph(saver), "s1", turns)
+
+    assert len(_checkpoints(saver, "s1")) == min(turns, config.CHECKPOINTS_PER_SESSION)
+
+
+def test_blobs_stop_growing_with_turns():
+    pruned, unpruned = PrunedInMemorySaver(), InMemorySaver()
+    pruned_graph, unpruned_graph = _graph(pruned), _graph(unpruned)
+
+    _run(pruned_graph, "s1", 5)
+    _run(unpruned_graph, "s1", 5)
+    blobs_after_5 = (_blobs(pruned, "s1"), _blobs(unpruned, "s1"))
+    _run(pruned_graph, "s1", 25)
+    _run(unpruned_graph, "s1", 25)
+
+    assert _blobs(pruned, "s1") == blobs_after_5[0]
+    assert _blobs(unpruned, "s1") > blobs_after_5[1]
+
+
+def test_latest_state_is_intact():
+    saver = PrunedInMemorySaver()
+    graph = _graph(saver)
+    _run(graph, "s1", 12)
+
+    state = graph.get_state(_thread("s1")).values
+
+    assert state["turn_count"] == 12
+    assert _last_message(state) == "message 11"
+
+
+def test_previous_checkpoint_can_be_restored():
+    saver = PrunedInMemorySaver(keep=2)
+    graph = _graph(saver)
+    _run(graph, "s1", 8)
+
+    latest, previous = list(graph.get_state_history(_thread("s1")))
+
+    assert latest.values["turn_count"] == 8
+    assert previous.values["turn_count"] == 7
+    assert _last_message(previous.values) == "message 6"
+
+
+def test_sessions_are_pruned_independently():
+    saver = PrunedInMemorySaver(keep=1)
+    graph = _graph(saver)
+    _run(graph, "s1", 6)
+    _run(graph, "s2", 1)
+
+    assert len(_checkpoints(saver, "s1")) == 1
+    assert graph.get_state(_thread("s2")).values["turn_count"] == 1
+    assert graph.get_state(_thread("s1")).values["turn_count"] == 6
@@ -0,0 +1,137 @@
+"""
+Circuit Breaker States
+Opens on a failure or slow-call rate over the window, then probes half-open until it recovers
+"""
+import pytest
+from app.agent import circuit_breaker as breaker_module
+from app.agent.circuit_breaker import CircuitBreaker, CLOSED, OPEN, HALF_OPEN
+
+
+class Clock:
+    """Stand-in for the time module, moved by hand"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(breaker_module, "time", clock)
+    return clock
+
+
+def _breaker(**kwargs) -> CircuitBreaker:
+    settings = dict(window_seconds=60, min_calls=4, failure_rate=0.5, slow_call_seconds=5,
+                    slow_rate=0.5, open_seconds=30, probes=2)
+    return CircuitBreaker("test", **{**settings, **kwargs})
+
+
+def _open(breaker: CircuitBreaker):
+    for _ in range(breaker.min_calls):
+        assert breaker.allow()
+        breaker.record(0.1, ok=False)
+    assert breaker.state == OPEN
+
+
+def test_needs_min_calls_before_opening(clock):
+    breaker = _breaker()
+
+    for _ in range(3):
+        breaker.record(0.1, ok=False)
+    assert breaker.state == CLOSED
+
+    breaker.record(0.1, ok=False)
+    assert breaker.state == OPEN
+    assert breaker.counters["opened"] == 1
+
+
+def test_failure_rate_below_threshold_stays_closed(clock):
+    breaker = _breaker()
+
+    for ok in (True, True, True, False, True, False):
+        breaker.record(0.1, ok=ok)
+
+    assert breaker.state == CLOSED
+    assert breaker.stats()["window_failure_rate"] == pytest.approx(2 / 6, abs=1e-4)
+
+
+def test_slow_calls_open_the_breaker(clock):
+    breaker = _breaker()
+
+    for _ in range(4):
+        breaker.record(6.0, ok=True)
+
+    assert breaker.state == OPEN
+    assert breaker.counters["slow_calls"] == 4
+    assert breaker.counters["failures"] == 0
+
+
+def test_old_outcomes_leave_the_window(clock):
+    breaker = _breaker()
+    for _ in range(3):
+        breaker.record(0.1, ok=False)
+
+    clock.now += 61
+    breaker.record(0.1, ok=False)
+
+    assert breaker.state == CLOSED
+    assert breaker.stats()["window_calls"] == 1
+
+
+def test_open_rejects_until_open_seconds_pass(clock):
+    breaker = _breaker()
+    _open(breaker)
+
+    assert not breaker.allow()
+    assert breaker.counters["rejected"] == 1
+
+    clock.now += 30
+    assert breaker.stats()["state"] == HALF_OPEN
+    assert breaker.allow()
+    assert breaker.state == HALF_OPEN
+
+
+def test_half_open_limits_probes_and_closes_on_success(clock):
+    breaker = _breaker()
+    _open(breaker)
+    clock.now += 30
+
+    assert breaker.allow() and breaker.allow()
+    assert not breaker.allow()
+
+    breaker.record(0.1, ok=True)
+    assert breaker.state == HALF_OPEN
+    breaker.record(0.1, ok=True)
+
+    assert breaker.state == CLOSED
+    assert breaker.stats()["window_calls"] == 0
+
+
+@pytest.mark.parametrize("seconds, ok", [(0.1, False), (6.0, True)])
+def test_failed_or_slow_probe_reopens(clock, seconds, ok):
+    breaker = _breaker()
+    _open(breaker)
+    clock.now += 30
+    assert breaker.allow()
+
+    breaker.record(seconds, ok=ok)
+
+    assert breaker.state == OPEN
+    assert breaker.counters["opened"] == 2
+    assert not breaker.allow()
+
+
+def test_abandoned_probe_frees_its_slot(clock):
+    breaker = _breaker(probes=1)
+    _open(breaker)
+    clock.now += 30
+    assert breaker.allow()
+    assert not breaker.allow()
+
+    breaker.abandon()
+
+    assert breaker.allow()
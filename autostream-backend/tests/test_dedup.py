@@ -0,0 +1,104 @@
+"""
+Lead Deduplication
+Claims match a returning lead by normalized email or channel within its tenant, and release gives keys back
+"""
+import pytest
+from app.config import config
+from app.leads.dedup import LeadDedupIndex, normalize_email
+
+
+@pytest.fixture
+def path(tmp_path) -> str:
+    return str(tmp_path / "leads.db")
+
+
+@pytest.fixture
+def index(path):
+    index = LeadDedupIndex(path)
+    yield index
+    index.close()
+
+
+@pytest.mark.parametrize("email, normalized", [
+    ("Jane.Doe+yt@gmail.com", "janedoe@gmail.com"),
+    ("jane.doe@googlemail.com", "janedoe@gmail.com"),
+    (" Jane.Doe+promo@Example.com ", "jane.doe@example.com"),
+    ("not-an-email", "not-an-email"),
+])
+def test_normalize_email(email, normalized):
+    assert normalize_email(email) == normalized
+
+
+def test_new_lead_then_duplicate(index):
+    assert index.claim("lead-1", "jane.doe@gmail.com") is None
+
+    assert index.claim("lead-2", "JaneDoe+yt@gmail.com") == "lead-1"
+    assert index.find("janedoe@gmail.com") == "lead-1"
+    assert index.stats()["duplicates"] == 1
+
+
+def test_unknown_email_is_not_found(index):
+    index.claim("lead-1", "jane@example.com")
+
+    assert index.find("sam@example.com") is None
+    assert index.stats()["bloom_negatives"] >= 1
+
+
+def test_release_frees_the_keys(index):
+    index.claim("lead-1", "jane@example.com")
+
+    index.release("lead-1", "jane@example.com")
+
+    assert index.find("jane@example.com") is None
+    assert index.claim("lead-2", "jane@example.com") is None
+    assert index.find("jane@example.com") == "lead-2"
+
+
+def test_release_leaves_another_leads_keys(index):
+    index.claim("lead-1", "jane@example.com")
+
+    index.release("lead-2", "jane@example.com")
+
+    assert index.find("jane@example.com") == "lead-1"
+
+
+def test_tenants_do_not_share_leads(index):
+    assert index.claim("lead-1", "jane@example.com", tenant_id="acme") is None
+
+    assert index.claim("lead-2", "jane@example.com", tenant_id="globex") is None
+    assert index.claim("lead-3", "jane@example.com") is None
+    assert index.find("jane@example.com", tenant_id="acme") == "lead-1"
+
+
+def test_returning_lead_matched_by_channel(index, monkeypatch):
+    monkeypatch.setattr(config, "LEAD_DEDUP_BY_CHANNEL", True)
+    index.claim("lead-1", "jane@example.com")
+
+    # Same person, now with a channel: the channel is attached to the first lead
+    assert index.claim("lead-2", "jane@example.com", "https://youtube.com/@janecooks") == "lead-1"
+    assert index.claim("lead-3", "jane.work@example.com", "https://www.youtube.com/@janecooks") == "lead-1"
+
+
+def test_channel_ignored_unless_enabled(index, monkeypatch):
+    monkeypatch.setattr(config, "LEAD_DEDUP_BY_CHANNEL", False)
+    index.claim("lead-1", "jane@example.com", "https://youtube.com/@janecooks")
+
+    assert index.claim("lead-2", "sam@example.com", "https://youtube.com/@janecooks") is None
+
+
+def test_index_is_rebuilt_from_the_database(index, path):
+    index.claim("lead-1", "jane@example.com")
+
+    reopened = LeadDedupIndex(path)
+    assert reopened.find("jane@example.com") == "lead-1"
+    reopened.close()
+
+
+def test_claim_raced_by_another_process(index, path):
+    # A second worker's index, built before this one's claim was persisted
+    other = LeadDedupIndex(path)
+    index.claim("lead-1", "jane@example.com")
+
+    assert other.claim("lead-2", "jane@example.com") == "lead-1"
+    assert other.find("jane@example.com") == "lead-1"
+    other.close()
@@ -0,0 +1,21 @@
+"""
+Extraction Corpus
+Every message in app/data/extraction_corpus.json must extract exactly its expected fields and keywords
+"""
+import json
+from pathlib import Path
+import pytest
+from app.agent.extraction import ExtractionResult, extraction_engine
+
+CORPUS_PATH = Path(__file__).resolve().parent.parent / "app" / "data" / "extraction_corpus.json"
+
+with open(CORPUS_PATH, "r", encoding="utf-8") as f:
+    CORPUS = json.load(f)
+
+
+@pytest.mark.parametrize("case", CORPUS, ids=[case["message"] for case in CORPUS])
+def test_corpus(case):
+    expected = {**ExtractionResult().to_dict(), **case["expected"]}
+    expected["keywords"] = sorted(expected["keywords"])
+
+    assert extraction_engine.extract(case["message"]).to_dict() == expected
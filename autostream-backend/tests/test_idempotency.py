@@ -0,0 +1,162 @@
+"""
+Idempotent Chat Requests
+Concurrent duplicates share one computation, recent results replay, failures are retried
+"""
+import asyncio
+import pytest
+from app.idempotency import IdempotentRequests, request_key
+
+
+class Turn:
+    """Computation that counts its runs and finishes when released"""
+
+    def __init__(self, result="reply", error: Exception = None):
+        self.result = result
+        self.error = error
+        self.runs = 0
+        self.release = asyncio.Event()
+
+    async def __call__(self):
+        self.runs += 1
+        await self.release.wait()
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+def test_concurrent_duplicates_coalesce():
+    requests = IdempotentRequests(ttl=60, max_entries=10)
+
+    async def scenario():
+        turn = Turn()
+        callers = [asyncio.create_task(requests.run("s1:k:a", turn)) for _ in range(3)]
+        await asyncio.sleep(0)
+        turn.release.set()
+        return turn, await asyncio.gather(*callers)
+
+    turn, outcomes = asyncio.run(scenario())
+
+    assert turn.runs == 1
+    assert [how for _, how in outcomes] == ["executed", "coalesced", "coalesced"]
+    assert {result for result, _ in outcomes} == {"reply"}
+
+
+def test_finished_result_replays_within_ttl():
+    requests = IdempotentRequests(ttl=60, max_entries=10)
+    stored = []
+
+    async def scenario():
+        turn = Turn()
+        turn.release.set()
+        first = await requests.run("s1:k:a", turn, on_result=stored.append)
+        second = await requests.run("s1:k:a", turn, on_result=stored.append)
+        return turn, first, second
+
+    turn, first, second = asyncio.run(scenario())
+
+    assert turn.runs == 1
+    assert (first, second) == (("reply", "executed"), ("reply", "replayed"))
+    assert stored == ["reply"]
+
+
+def test_expired_result_runs_again():
+    requests = IdempotentRequests(ttl=-1, max_entries=10)
+
+    async def scenario():
+        turn = Turn()
+        turn.release.set()
+        await requests.run("s1:k:a", turn)
+        return turn, await requests.run("s1:k:a", turn)
+
+    turn, (_, how) = asyncio.run(scenario())
+
+    assert (turn.runs, how) == (2, "executed")
+
+
+def test_failure_is_not_stored():
+    requests = IdempotentRequests(ttl=60, max_entries=10)
+
+    async def scenario():
+        failing = Turn(error=RuntimeError("LLM down"))
+        failing.release.set()
+        with pytest.raises(RuntimeError):
+            await requests.run("s1:k:a", failing)
+        retry = Turn()
+        retry.release.set()
+        return await requests.run("s1:k:a", retry)
+
+    assert asyncio.run(scenario()) == ("reply", "executed")
+    assert requests.counters["failed"] == 1
+
+
+def test_refused_admission_starts_nothing():
+    requests = IdempotentRequests(ttl=60, max_entries=10)
+
+    def refuse():
+        raise PermissionError("rate limited")
+
+    async def scenario():
+        turn = Turn()
+        with pytest.raises(PermissionError):
+            await requests.run("s1:k:a", turn, admit=refuse)
+        return turn
+
+    assert asyncio.run(scenario()).runs == 0
+    assert requests.stats()["in_flight"] == 0
+
+
+def test_computation_survives_its_first_caller_going_away():
+    requests = IdempotentRequests(ttl=60, max_entries=10)
+
+    async def scenario():
+        turn = Turn()
+        first = asyncio.create_task(requests.run("s1:k:a", turn))
+        await asyncio.sleep(0)
+        duplicate = asyncio.create_task(requests.run("s1:k:a", turn))
+        await asyncio.sleep(0)
+        first.cancel()
+        await asyncio.sleep(0)
+        turn.release.set()
+        return await duplicate
+
+    assert asyncio.run(scenario()) == ("reply", "coalesced")
+    assert requests.counters["cancelled"] == 0
+
+
+def test_last_caller_going_away_cancels_the_computation():
+    requests = IdempotentRequests(ttl=60, max_entries=10)
+
+    async def scenario():
+        caller = asyncio.create_task(requests.run("s1:k:a", Turn()))
+        await asyncio.sleep(0)
+        caller.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await caller
+        await asyncio.sleep(0)
+
+    asyncio.run(scenario())
+
+    assert requests.counters["cancelled"] == 1
+    assert requests.stats()["in_flight"] == 0
+
+
+def test_oldest_results_are_dropped_past_max_entries():
+    requests = IdempotentRequests(ttl=60, max_entries=2)
+    for key in ("a", "b", "c"):
+        requests.put(key, key)
+
+    async def scenario(key):
+        turn = Turn()
+        turn.release.set()
+        return await requests.run(key, turn)
+
+    assert requests.stats()["stored"] == 2
+    assert asyncio.run(scenario("c")) == ("c", "replayed")
+    assert asyncio.run(scenario("a")) == ("reply", "executed")
+
+
+def test_request_key():
+    assert request_key("s1", "abc") == "s1:k:abc"
+    assert request_key("s1", message="hi", turn_count=2) == request_key("s1", message="hi", turn_count=2)
+    assert request_key("s1", message="hi", turn_count=2) != request_key("s1", message="hi", turn_count=3)
+    assert request_key("s1", message="hi") != request_key("s2", message="hi")
@@ -0,0 +1,104 @@
+"""
+Intent Classification
+Local pass first, one embedding per message, and the LLM only for messages the local pass is unsure about
+"""
+import asyncio
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage
+from langgraph.checkpoint.memory import InMemorySaver
+from app.agent import graph as graph_module
+from app.agent.circuit_breaker import CircuitBreaker
+from app.agent.graph import AutoStreamGraph, parse_reply
+from app.agent.intent import intent_classifier
+from app.agent.intent_embedding import embedding_intent_classifier
+
+
+class ReplyLLM:
+    """Chat model that answers every call with one fixed reply"""
+
+    def __init__(self, content: str):
+        self.content = content
+
+    async def ainvoke(self, prompt):
+        return AIMessage(content=self.content)
+
+
+@pytest.fixture
+def embedded(monkeypatch):
+    """Texts embedded by the local classifier, in call order"""
+    embedded = []
+    embed = embedding_intent_classifier._embed
+    embedding_intent_classifier.warm_up()
+
+    def counting(texts):
+        embedded.extend(texts)
+        return embed(texts)
+    monkeypatch.setattr(embedding_intent_classifier, "_embed", counting)
+    monkeypatch.setattr(intent_classifier, "counters", {"local": 0, "llm": 0})
+    return embedded
+
+
+@pytest.fixture
+def escalated(monkeypatch):
+    """Messages sent to the LLM classifier (which answers "comparison")"""
+    escalated = []
+
+    def escalate(state):
+        escalated.append(state["messages"][-1].content)
+        return "comparison"
+    monkeypatch.setattr(intent_classifier, "_escalate", escalate)
+    return escalated
+
+
+def test_batch_embeds_each_message_once(monkeypatch, embedded, escalated):
+    # Nothing clears the thresholds: every message is escalated
+    monkeypatch.setattr(embedding_intent_classifier, "min_similarity", 2.0)
+    messages = ["hi there", "which plan is better", "I want to sign up"]
+
+    assert intent_classifier.classify_batch(messages) == ["comparison"] * 3
+
+    assert embedded == messages
+    assert escalated == messages
+    assert intent_classifier.counters == {"local": 0, "llm": 0}
+
+
+def test_confident_messages_stay_local(monkeypatch, embedded, escalated):
+    monkeypatch.setattr(embedding_intent_classifier, "min_similarity", -1.0)
+    monkeypatch.setattr(embedding_intent_classifier, "min_margin", 0.0)
+
+    intents = intent_classifier.classify_batch(["hi there", "how much is pro"])
+
+    assert len(intents) == 2
+    assert escalated == []
+    assert intent_classifier.counters["local"] == 2
+
+
+def test_no_escalation_keeps_local_guess(monkeypatch, embedded, escalated):
+    monkeypatch.setattr(embedding_intent_classifier, "min_similarity", 2.0)
+    state = {"messages": [HumanMessage(content="which plan is better")]}
+    label, _, _ = embedding_intent_classifier.classify("which plan is better")
+
+    assert intent_classifier.classify_intent(state, escalate=False) == label.lower()
+    assert escalated == []
+
+
+def test_parse_reply_default():
+    assert parse_reply("Sure, happy to help.") == ("greeting", "Sure, happy to help.")
+    assert parse_reply("Sure, happy to help.", default=None)[0] is None
+    assert parse_reply("INTENT: pricing STATE: PRICING Pro is 79.", default=None) == ("pricing", "Pro is 79.")
+
+
+def test_untagged_reply_is_classified_locally(monkeypatch, embedded, escalated):
+    monkeypatch.setattr(graph_module, "llm_breaker", CircuitBreaker("test", min_calls=10))
+    graph = AutoStreamGraph(checkpointer=InMemorySaver())
+    graph.llm = ReplyLLM("Basic is 29 dollars a month and Pro is 79.")
+    text = "Compare basic and pro for me"
+    label, _, _ = embedding_intent_classifier.classify(text)
+
+    updates = asyncio.run(graph._respond_node({
+        "messages": [HumanMessage(content=text)], "conversation_state": "DISCOVERY", "session_id": "intent-test"
+    }))
+
+    assert updates["intent"] == label.lower()
+    assert escalated == []
+    assert intent_classifier.counters["local"] == 1
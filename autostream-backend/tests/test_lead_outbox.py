@@ -0,0 +1,65 @@
+"""
+Lead Outbox Leases
+Every delivery attempt counts, including one whose lease expired before it was settled
+"""
+import pytest
+from app.leads.outbox import LeadOutbox
+
+
+@pytest.fixture
+def outbox():
+    outbox = LeadOutbox(":memory:")
+    outbox.append({"email": "maya@example.com", "session_id": "s1"}, "key-1")
+    yield outbox
+    outbox.close()
+
+
+def _row(outbox: LeadOutbox) -> dict:
+    return next(outbox.iter_leads())
+
+
+def test_expired_lease_counts_as_an_attempt(outbox):
+    # A dispatcher that dies mid-delivery never settles its lease
+    assert outbox.claim_batch(10, lease_seconds=-1, max_attempts=3)[0]["attempts"] == 0
+
+    batch = outbox.claim_batch(10, lease_seconds=-1, max_attempts=3)
+
+    assert batch[0]["attempts"] == 1
+    assert _row(outbox)["attempts"] == 1
+
+
+def test_lead_that_keeps_expiring_goes_dead(outbox):
+    for _ in range(3):
+        assert len(outbox.claim_batch(10, lease_seconds=-1, max_attempts=3)) == 1
+
+    assert outbox.claim_batch(10, lease_seconds=-1, max_attempts=3) == []
+    row = _row(outbox)
+    assert (row["status"], row["attempts"]) == ("dead", 3)
+    assert outbox.stats() == {"dead": 1}
+
+
+def test_live_lease_is_not_reclaimed(outbox):
+    assert len(outbox.claim_batch(10, lease_seconds=60)) == 1
+    assert outbox.claim_batch(10, lease_seconds=60) == []
+    assert _row(outbox)["attempts"] == 0
+
+
+def test_expired_leases_and_failures_share_the_budget(outbox):
+    outbox.claim_batch(10, lease_seconds=-1, max_attempts=3)
+    batch = outbox.claim_batch(10, max_attempts=3)
+
+    outbox.mark_failed([batch[0]["id"]], "CRM down", max_attempts=3, base_backoff=0)
+    assert _row(outbox)["status"] == "pending"
+    batch = outbox.claim_batch(10, max_attempts=3)
+    outbox.mark_failed([batch[0]["id"]], "CRM down", max_attempts=3, base_backoff=0)
+
+    row = _row(outbox)
+    assert (row["status"], row["attempts"]) == ("dead", 3)
+
+
+def test_delivered_lead_is_settled(outbox):
+    batch = outbox.claim_batch(10)
+    outbox.mark_delivered([entry["id"] for entry in batch])
+
+    assert outbox.claim_batch(10, lease_seconds=-1) == []
+    assert outbox.stats() == {"delivered": 1}
@@ -0,0 +1,71 @@
+"""
+LLM Circuit Breaker in the Reply Path
+A stalled LLM must open the breaker; a client's short deadline must not
+"""
+import asyncio
+from langgraph.checkpoint.memory import InMemorySaver
+from app.config import config
+from app.agent import graph as graph_module
+from app.agent.circuit_breaker import CircuitBreaker, CLOSED, OPEN
+from app.agent.deadline import Deadline, STAGE_BUDGETS, STAGE_RESERVES, current_deadline
+from app.agent.graph import AutoStreamGraph
+
+
+class StalledLLM:
+    """Chat model whose calls never return"""
+
+    async def ainvoke(self, prompt):
+        await asyncio.Event().wait()
+
+
+def _call(graph: AutoStreamGraph, deadline: Deadline):
+    async def run():
+        token = current_deadline.set(deadline)
+        try:
+            return await graph._guarded_llm_call([], None)
+        finally:
+            current_deadline.reset(token)
+    return asyncio.run(run())
+
+
+def _stalled_graph(monkeypatch) -> CircuitBreaker:
+    breaker = CircuitBreaker("test", min_calls=3, failure_rate=0.5, slow_call_seconds=5, open_seconds=60)
+    monkeypatch.setattr(graph_module, "llm_breaker", breaker)
+    graph = AutoStreamGraph(checkpointer=InMemorySaver())
+    graph.llm = StalledLLM()
+    return graph, breaker
+
+
+def test_stalled_llm_opens_breaker(monkeypatch):
+    # The server's deadline cuts the call before LLM_TIMEOUT: still a failure
+    monkeypatch.setattr(config, "TURN_DEADLINE_MS", 300)
+    monkeypatch.setattr(config, "LLM_MIN_BUDGET_MS", 10)
+    graph, breaker = _stalled_graph(monkeypatch)
+
+    for _ in range(3):
+        assert _call(graph, Deadline.for_request()) is None
+
+    assert breaker.state == OPEN
+    assert breaker.counters["failures"] == 3
+    # Open: the next turn falls back without waiting on the LLM
+    assert _call(graph, Deadline.for_request()) is None
+    assert breaker.counters["rejected"] == 1
+
+
+def test_client_deadline_cut_does_not_open_breaker(monkeypatch):
+    monkeypatch.setattr(config, "LLM_MIN_BUDGET_MS", 10)
+    graph, breaker = _stalled_graph(monkeypatch)
+
+    for _ in range(5):
+        assert _call(graph, Deadline.for_request("300")) is None
+
+    assert breaker.state == CLOSED
+    assert breaker.counters["failures"] == 0
+
+
+def test_default_deadline_leaves_llm_timeout():
+    deadline = Deadline.for_request()
+    assert not deadline.requested
+    # Even after retrieval uses its whole budget
+    assert deadline.remaining() - STAGE_BUDGETS["retrieval"] - STAGE_RESERVES["llm"] > config.LLM_TIMEOUT
+    assert config.LLM_TIMEOUT > config.LLM_SLOW_CALL_SECONDS
@@ -0,0 +1,140 @@
+"""
+Reply Model Routing
+Route selection per rule, and what a turn does when its route's model fails, against the Groq stand-in
+"""
+import asyncio
+import httpx
+import pytest
+from langchain_core.messages import HumanMessage
+from langchain_groq import ChatGroq
+from langgraph.checkpoint.memory import InMemorySaver
+from app.config import config
+from app.agent import graph as graph_module
+from app.agent.circuit_breaker import CircuitBreaker
+from app.agent.graph import AutoStreamGraph, ReplyTagFilter, parse_reply
+from app.agent.model_router import ModelRouter, ROUTES, stand_in_app
+
+FAST_MODEL = ROUTES["fast"]["model"]
+QUALITY_MODEL = ROUTES["quality"]["model"]
+
+
+def _router(app=None, enabled: bool = True) -> ModelRouter:
+    """ModelRouter whose routes talk to a stand-in app in-process"""
+    router = ModelRouter(enabled=enabled)
+    if app is not None:
+        for route in router.routes.values():
+            route.llm = ChatGroq(
+                model_name=route.model, groq_api_key="test", temperature=route.temperature,
+                max_tokens=route.max_tokens, base_url="http://stand-in", max_retries=0,
+                http_async_client=httpx.AsyncClient(transport=httpx.ASGITransport(app=app))
+            )
+    return router
+
+
+def _state(text: str, conversation_state: str = "DISCOVERY", signals=()) -> dict:
+    return {"messages": [HumanMessage(content=text)], "conversation_state": conversation_state,
+            "turn_keywords": list(signals), "session_id": "router-test"}
+
+
+@pytest.mark.parametrize("conversation_state, signals, intent, expected", [
+    ("PRICING", (), "greeting", ("quality", "pricing_state")),
+    ("DISCOVERY", ("pricing",), "greeting", ("quality", "pricing_signal")),
+    ("DISCOVERY", ("plan_selected",), "greeting", ("quality", "pricing_signal")),
+    ("DISCOVERY", (), "comparison", ("quality", "sales_intent")),
+    ("DISCOVERY", (), "unknown", ("quality", "sales_intent")),
+    ("DISCOVERY", (), "greeting", ("fast", "default")),
+    ("QUALIFIED", ("email",), "high_intent", ("fast", "default")),
+])
+def test_route_selection(monkeypatch, conversation_state, signals, intent, expected):
+    router = _router()
+    monkeypatch.setattr(router, "_intent", lambda state: intent)
+
+    route, rule = router.select(_state("hi", conversation_state, signals))
+
+    assert (route.name, rule) == expected
+    assert router.stats()["decisions_by_rule"] == {rule: 1}
+
+
+def test_intent_only_classified_when_a_rule_needs_it(monkeypatch):
+    router = _router()
+    calls = []
+    monkeypatch.setattr(router, "_intent", lambda state: calls.append(state) or "pricing")
+
+    router.select(_state("how much is pro", "PRICING"))
+    assert calls == []
+    router.select(_state("how much is pro"))
+    assert len(calls) == 1
+
+
+def test_routing_disabled_uses_quality(monkeypatch):
+    router = _router(enabled=False)
+    monkeypatch.setattr(router, "_intent", lambda state: pytest.fail("classified while disabled"))
+
+    route, rule = router.select(_state("hello"))
+
+    assert (route.name, rule) == ("quality", "disabled")
+
+
+def test_unknown_route_in_rules_is_rejected():
+    with pytest.raises(ValueError):
+        ModelRouter(rules=[{"name": "default", "route": "cheap"}])
+
+
+def test_tag_survives_fast_route_token_cap():
+    # A reply far longer than FAST_MAX_TOKENS: the cap cuts the text, not the leading tags
+    reply = "INTENT: pricing STATE: PRICING " + " ".join(["word"] * (config.FAST_MAX_TOKENS * 2))
+    router = _router(stand_in_app(reply=reply))
+    route = router.routes["fast"]
+
+    response = asyncio.run(route.llm.ainvoke([HumanMessage(content="how much is pro")]))
+
+    assert response.usage_metadata["output_tokens"] == config.FAST_MAX_TOKENS
+    intent, text = parse_reply(response.content)
+    assert intent == "pricing"
+    assert not text.startswith(("INTENT", "STATE"))
+
+
+def test_leading_tags_never_stream():
+    tag_filter = ReplyTagFilter()
+    shown = "".join(tag_filter.feed(chunk) for chunk in
+                    ["INT", "ENT: pri", "cing ST", "ATE: PRIC", "ING\n\nBasic is", " 29 dollars."])
+    shown += tag_filter.flush()
+
+    assert shown == "Basic is 29 dollars."
+
+
+def _failing_route_graph(monkeypatch, failing: tuple):
+    breaker = CircuitBreaker("test", min_calls=10, open_seconds=60)
+    monkeypatch.setattr(graph_module, "llm_breaker", breaker)
+    router = _router(stand_in_app(failing=failing))
+    return AutoStreamGraph(checkpointer=InMemorySaver(), router=router), router, breaker
+
+
+def test_failing_route_falls_back_to_knowledge_base_reply(monkeypatch):
+    graph, router, breaker = _failing_route_graph(monkeypatch, failing=(QUALITY_MODEL,))
+    state = _state("How much is the Pro plan?", "PRICING")
+    state["retrieved_context"] = "Pro Plan: 79 dollars per month, unlimited videos, 4K"
+
+    updates = asyncio.run(graph._respond_node(state))
+
+    assert updates["messages"][0].content
+    assert graph.degraded_replies == 1
+    stats = router.stats()["routes"]
+    assert stats["quality"]["calls"] == 1
+    assert stats["quality"]["errors"] == 1
+    assert stats["fast"]["calls"] == 0
+    assert breaker.counters["failures"] == 1
+
+
+def test_healthy_route_is_unaffected_by_a_failing_one(monkeypatch):
+    graph, router, breaker = _failing_route_graph(monkeypatch, failing=(QUALITY_MODEL,))
+    monkeypatch.setattr(router, "_intent", lambda state: "greeting")
+
+    updates = asyncio.run(graph._respond_node(_state("hey there")))
+
+    assert graph.degraded_replies == 0
+    assert updates["intent"] == "pricing"
+    assert "INTENT" not in updates["messages"][0].content
+    stats = router.stats()["routes"]
+    assert (stats["fast"]["calls"], stats["fast"]["errors"]) == (1, 0)
+    assert breaker.counters["failures"] == 0
@@ -0,0 +1,144 @@
+"""
+Rate Limiting
+GCRA bursts and refill on both backends, and all-or-nothing charging across the chat limiter's scopes
+"""
+import pytest
+from app import ratelimit as ratelimit_module
+from app.ratelimit import ChatRateLimiter, Limit, MemoryBackend, SQLiteBackend
+
+
+class Clock:
+    """Stand-in for the time module, moved by hand"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def time(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(ratelimit_module, "time", clock)
+    return clock
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def backend(request, tmp_path):
+    if request.param == "memory":
+        yield MemoryBackend(shards=4)
+        return
+    backend = SQLiteBackend(str(tmp_path / "rate_limits.db"))
+    yield backend
+    backend.close()
+
+
+def _admitted(backend, checks, requests: int) -> int:
+    return sum(backend.acquire(checks).allowed for _ in range(requests))
+
+
+def test_burst_then_refused(clock, backend):
+    limit = Limit("session", per_minute=60, burst=5)
+
+    assert _admitted(backend, [("s:a", limit)], 8) == 5
+
+    decision = backend.acquire([("s:a", limit)])
+    assert not decision.allowed
+    assert decision.scope == "session"
+    assert decision.retry_after == pytest.approx(1.0)
+    assert decision.retry_after_header == "1"
+
+
+def test_refills_at_the_rate(clock, backend):
+    limit = Limit("session", per_minute=60, burst=5)
+    _admitted(backend, [("s:a", limit)], 5)
+
+    clock.now += 2
+    assert _admitted(backend, [("s:a", limit)], 5) == 2
+
+    clock.now += 60
+    assert _admitted(backend, [("s:a", limit)], 8) == 5
+
+
+def test_keys_are_independent(clock, backend):
+    limit = Limit("session", per_minute=60, burst=2)
+    _admitted(backend, [("s:a", limit)], 2)
+
+    assert backend.acquire([("s:b", limit)]).allowed
+    assert backend.size() == 2
+
+
+def test_refused_request_charges_no_key(clock, backend):
+    loose = Limit("tenant", per_minute=60, burst=10)
+    tight = Limit("session", per_minute=60, burst=1)
+    assert backend.acquire([("s:a", tight), ("t:x", loose)]).allowed
+
+    for _ in range(5):
+        assert not backend.acquire([("s:a", tight), ("t:x", loose)]).allowed
+
+    # Only the admitted request was charged to the tenant
+    assert _admitted(backend, [("t:x", loose)], 20) == 9
+
+
+def test_memory_sweep_drops_idle_keys(clock):
+    backend = MemoryBackend(shards=1, sweep_every=10)
+    limit = Limit("session", per_minute=60, burst=1)
+    for n in range(10):
+        backend.acquire([(f"s:{n}", limit)])
+
+    clock.now += 120
+    backend.acquire([("s:late", limit)])
+
+    assert backend.size() == 1
+
+
+def test_sqlite_state_is_shared_between_connections(clock, tmp_path):
+    path = str(tmp_path / "rate_limits.db")
+    limit = Limit("session", per_minute=60, burst=3)
+    first, second = SQLiteBackend(path), SQLiteBackend(path)
+
+    assert _admitted(first, [("s:a", limit)], 2) == 2
+    assert _admitted(second, [("s:a", limit)], 3) == 1
+    first.close()
+    second.close()
+
+
+def _limiter(backend) -> ChatRateLimiter:
+    limiter = ChatRateLimiter(backend=backend, enabled=True)
+    limiter.limits = {
+        "session": Limit("session", per_minute=60, burst=2),
+        "ip": Limit("ip", per_minute=60, burst=3),
+        "tenant": Limit("tenant", per_minute=60, burst=5),
+    }
+    return limiter
+
+
+def test_chat_limiter_reports_the_scope_hit(clock):
+    limiter = _limiter(MemoryBackend(shards=4))
+
+    assert [limiter.check("s1", "10.0.0.1", "acme").allowed for _ in range(3)] == [True, True, False]
+    # s1's refused turn was not charged to the IP: one left there
+    assert [limiter.check("s2", "10.0.0.1", "acme").scope for _ in range(2)] == [None, "ip"]
+    assert [limiter.check(f"s{n}", f"10.0.1.{n}", "acme").scope for n in range(3, 6)] == [None, None, "tenant"]
+
+    stats = limiter.stats()
+    assert stats["allowed"] == 5
+    assert stats["refused"] == {"session": 1, "ip": 1, "tenant": 1}
+
+
+def test_chat_limiter_without_ip_or_tenant(clock):
+    limiter = _limiter(MemoryBackend(shards=4))
+
+    assert all(limiter.check(f"s{n}", None, None).allowed for n in range(5))
+    assert limiter.check("s6", None, None).scope == "tenant"
+
+
+def test_disabled_limiter_admits_everything(clock):
+    limiter = ChatRateLimiter(backend=MemoryBackend(shards=4), enabled=False)
+
+    assert all(limiter.check("s1", "10.0.0.1", "acme").allowed for _ in range(100))
+    assert limiter.backend.size() == 0
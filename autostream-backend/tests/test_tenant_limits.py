@@ -0,0 +1,43 @@
+"""
+Tenant Rate Limits
+The tenant bucket is charged to the session's own tenant, not whatever the client sends
+"""
+import asyncio
+from langgraph.checkpoint.memory import InMemorySaver
+from app.memory.session_store import SessionStore
+from app.ratelimit import ChatRateLimiter, Limit, MemoryBackend
+
+
+def _store() -> SessionStore:
+    store = SessionStore(max_sessions=10)
+    store.checkpointer = InMemorySaver()
+    return store
+
+
+def test_new_session_takes_claimed_tenant():
+    store = _store()
+    assert store.tenant_for("s1", "acme") == "acme"
+    assert store.tenant_for("s1", None) == "default"
+
+
+def test_session_keeps_its_tenant():
+    store = _store()
+    asyncio.run(store.touch("s1", "acme"))
+
+    assert store.tenant_for("s1", None) == "acme"
+    assert store.tenant_for("s1", "acme") == "acme"
+    # Naming another tenant is refused rather than charged to it
+    assert store.tenant_for("s1", "victim") is None
+
+
+def test_omitting_header_does_not_escape_tenant_limit():
+    store = _store()
+    limiter = ChatRateLimiter(backend=MemoryBackend(), enabled=True)
+    limiter.limits["session"] = Limit("session", 6000, 1000)
+    limiter.limits["tenant"] = Limit("tenant", 60, 2)
+    asyncio.run(store.touch("s1", "acme"))
+
+    decisions = [limiter.check("s1", None, store.tenant_for("s1", None)) for _ in range(3)]
+
+    assert [d.allowed for d in decisions] == [True, True, False]
+    assert decisions[-1].scope == "tenant"
@@ -0,0 +1,97 @@
+"""
+WebSocket Chat Disconnects
+A client that goes away mid-turn cancels the turn, which is left in the session as just its message
+"""
+import asyncio
+import json
+import socket
+import threading
+import time
+import pytest
+import uvicorn
+from fastapi import FastAPI
+from websockets.sync.client import connect
+from langchain_core.messages import AIMessage, AIMessageChunk
+from app.agent.graph import autostream_graph
+from app.memory.session_store import session_store
+from app.ws import router
+
+REPLY = "INTENT: pricing STATE: PRICING Pro is 79 dollars a month."
+
+
+class SlowLLM:
+    """Chat model that answers after `seconds`"""
+
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+        self.called = threading.Event()
+
+    async def ainvoke(self, prompt):
+        self.called.set()
+        await asyncio.sleep(self.seconds)
+        return AIMessage(content=REPLY)
+
+    async def astream(self, prompt):
+        self.called.set()
+        await asyncio.sleep(self.seconds)
+        yield AIMessageChunk(content=REPLY)
+
+
+@pytest.fixture
+def server(monkeypatch):
+    """Base ws:// URL of a live server for the WebSocket routes (a real disconnect needs a real socket)"""
+    app = FastAPI()
+    app.include_router(router, prefix="/api")
+    monkeypatch.setattr(autostream_graph, "cancellations", {**autostream_graph.cancellations, "turns": 0})
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_config=None))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    yield f"ws://127.0.0.1:{port}/api/ws"
+    server.should_exit = True
+    thread.join()
+
+
+def _messages(session_id: str) -> list:
+    state = asyncio.run(session_store.get_session(session_id)) or {}
+    return [(message.type, message.content) for message in state.get("messages", [])]
+
+
+def _wait_for(condition, seconds: float = 5) -> bool:
+    stop = time.monotonic() + seconds
+    while not condition():
+        if time.monotonic() > stop:
+            return False
+        time.sleep(0.02)
+    return True
+
+
+def test_disconnect_cancels_turn(server, monkeypatch):
+    llm = SlowLLM(30)
+    monkeypatch.setattr(autostream_graph, "llm", llm)
+
+    with connect(f"{server}/ws-disconnect") as client:
+        client.send(json.dumps({"message": "How much is the Pro plan?"}))
+        assert llm.called.wait(10)
+
+    # Cancelled on the disconnect, not after the LLM call would have finished
+    assert _wait_for(lambda: autostream_graph.cancellations["turns"] == 1)
+    assert _wait_for(lambda: _messages("ws-disconnect") == [("human", "How much is the Pro plan?")])
+
+
+def test_finished_turn_is_kept(server, monkeypatch):
+    monkeypatch.setattr(autostream_graph, "llm", SlowLLM(0))
+
+    with connect(f"{server}/ws-complete") as client:
+        client.send(json.dumps({"message": "How much is the Pro plan?"}))
+        events = []
+        while not events or events[-1]["type"] != "done":
+            events.append(json.loads(client.recv(timeout=10)))
+
+    assert {"type": "reply", "intent": "pricing"} in events
+    assert autostream_graph.cancellations["turns"] == 0
+    assert _messages("ws-complete") == [("human", "How much is the Pro plan?"), ("ai", "Pro is 79 dollars a month.")]
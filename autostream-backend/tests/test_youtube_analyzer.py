@@ -0,0 +1,174 @@
+"""
+YouTube Channel Analyzer
+Runs YouTubeAnalyzer against the local fake YouTube Data API (app.agent.youtube_fake_api)
+"""
+import asyncio
+import httpx
+import pytest
+from app.agent import youtube_fake_api
+from app.agent.youtube_analyzer import YouTubeAnalyzer, parse_channel_ref
+
+
+@pytest.fixture
+def analyzer(monkeypatch) -> YouTubeAnalyzer:
+    monkeypatch.setattr(youtube_fake_api, "LATENCY", 0)
+    youtube_fake_api.app.state.requests = 0
+    return YouTubeAnalyzer(api_key="test", base_url="http://fake",
+                           transport=httpx.ASGITransport(app=youtube_fake_api.app))
+
+
+@pytest.mark.parametrize("url, ref", [
+    ("youtube.com/@Foo", "@foo"),
+    ("https://www.youtube.com/@foo/videos?view=0", "@foo"),
+    ("https://m.youtube.com/channel/UCabcDEF", "channel/UCabcDEF"),
+    ("youtube.com/c/FooBar", "c/foobar"),
+    ("youtube.com/user/FooBar", "user/foobar"),
+    ("youtube.com/watch?v=dQw4w9WgXcQ", "video/dQw4w9WgXcQ"),
+    ("youtube.com/watch?feature=share&v=dQw4w9WgXcQ", "video/dQw4w9WgXcQ"),
+    ("youtube.com/shorts/abc123", "video/abc123"),
+    ("https://youtu.be/abc123?t=10", "video/abc123"),
+    # Legacy youtube.com/<name> URLs
+    ("youtube.com/PewDiePie", "c/pewdiepie"),
+    ("https://www.youtube.com/LinusTechTips/videos", "c/linustechtips"),
+    ("youtube.com/playlist?list=PL123", None),
+    ("youtube.com/results?search_query=editing", None),
+    ("youtube.com/", None),
+    ("https://vimeo.com/foo", None),
+])
+def test_parse_channel_ref(url, ref):
+    assert parse_channel_ref(url) == ref
+
+
+def test_legacy_url_resolves_through_search(analyzer):
+    analysis = asyncio.run(analyzer.analyze("https://www.youtube.com/PewDiePie"))
+
+    assert analysis["channel_info"]["channel_id"] == youtube_fake_api._channel_id("pewdiepie")
+    # /search, then /channels
+    assert youtube_fake_api.app.state.requests == 2
+
+
+def test_not_found_channel_is_not_looked_up_again(analyzer):
+    async def run():
+        first = await analyzer.analyze("https://youtube.com/@deletedCreator")
+        calls = analyzer.counters["api_calls"]
+        # Every later turn prefetches the same channel
+        assert analyzer.prefetch("youtube.com/@DeletedCreator") is None
+        second = await analyzer.analyze("youtube.com/@deletedcreator/videos")
+        return first, second, calls
+    first, second, calls = asyncio.run(run())
+
+    assert first is None and second is None
+    assert analyzer.counters["api_calls"] == calls == 1
+    assert analyzer.counters["not_found"] == 1
+    assert analyzer.counters["negative_hits"] == 2
+    assert analyzer.cached("youtube.com/@deletedcreator") is None
+
+
+def test_failed_lookup_is_not_retried_until_negative_ttl():
+    failing = YouTubeAnalyzer(api_key="test", base_url="http://fake", transport=httpx.MockTransport(
+        lambda request: httpx.Response(503)
+    ))
+
+    async def run():
+        await failing.analyze("youtube.com/@flaky")
+        await failing.analyze("youtube.com/@flaky")
+        # As if YOUTUBE_NEGATIVE_TTL ran out
+        failing._cache.clear()
+        await failing.analyze("youtube.com/@flaky")
+    asyncio.run(run())
+
+    assert failing.counters["errors"] == 2
+    assert failing.counters["negative_hits"] == 1
+
+
+def test_url_forms_of_one_channel_share_the_cache(analyzer):
+    async def run():
+        first = await analyzer.analyze("youtube.com/@SameCreator")
+        second = await analyzer.analyze("https://www.youtube.com/@samecreator/shorts")
+        # The channel id is cached too, so its /channel/ URL is a hit as well
+        third = await analyzer.analyze("youtube.com/channel/" + first["channel_info"]["channel_id"])
+        return first, second, third
+    first, second, third = asyncio.run(run())
+
+    assert first is second is third
+    assert analyzer.counters["api_calls"] == 1
+    assert analyzer.counters["cache_hits"] == 2
+
+
+def test_concurrent_lookups_are_coalesced(analyzer, monkeypatch):
+    monkeypatch.setattr(youtube_fake_api, "LATENCY", 0.05)
+
+    async def run():
+        return await asyncio.gather(*[analyzer.analyze("youtube.com/@busy") for _ in range(10)])
+    results = asyncio.run(run())
+
+    assert all(result is results[0] for result in results)
+    assert analyzer.counters["api_calls"] == 1
+    assert analyzer.counters["coalesced"] == 9
+    assert not analyzer._inflight
+
+
+def test_prefetch_then_analyze_makes_one_call(analyzer, monkeypatch):
+    monkeypatch.setattr(youtube_fake_api, "LATENCY", 0.02)
+
+    async def run():
+        task = analyzer.prefetch("youtube.com/@early")
+        assert analyzer.prefetch("youtube.com/@early") is None
+        analysis = await analyzer.analyze("youtube.com/@early")
+        return task, analysis
+    task, analysis = asyncio.run(run())
+
+    assert task.result() is analysis
+    assert analyzer.counters["api_calls"] == 1
+
+
+def test_video_link_resolves_to_its_channel(analyzer):
+    async def run():
+        from_video = await analyzer.analyze("https://youtu.be/clip42")
+        from_channel = await analyzer.analyze("youtube.com/channel/" + youtube_fake_api._channel_id("video-clip42"))
+        return from_video, from_channel
+    from_video, from_channel = asyncio.run(run())
+
+    assert from_video["channel_info"]["channel_id"] == youtube_fake_api._channel_id("video-clip42")
+    assert from_channel is from_video
+    # /videos, then /channels; the channel URL is then a cache hit
+    assert analyzer.counters["api_calls"] == 2
+
+
+def test_deleted_video_is_not_found(analyzer):
+    assert asyncio.run(analyzer.analyze("youtube.com/watch?v=deleted1")) is None
+    assert analyzer.counters["not_found"] == 1
+
+
+def test_cache_expires_after_ttl(analyzer, monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr("app.agent.youtube_analyzer.time.monotonic", lambda: clock[0])
+    analyzer.ttl = 60
+
+    async def run():
+        await analyzer.analyze("youtube.com/@ttl")
+        clock[0] += 59
+        await analyzer.analyze("youtube.com/@ttl")
+        clock[0] += 2
+        await analyzer.analyze("youtube.com/@ttl")
+    asyncio.run(run())
+
+    assert analyzer.counters["misses"] == 2
+    assert analyzer.counters["api_calls"] == 2
+
+
+def test_cache_evicts_least_recently_used(analyzer):
+    # Each channel takes two entries: its handle and its channel id
+    analyzer.max_entries = 4
+
+    async def run():
+        for handle in ("@one", "@two"):
+            await analyzer.analyze("youtube.com/" + handle)
+        # Use @one again, so @two is the least recently used
+        await analyzer.analyze("youtube.com/@one")
+        await analyzer.analyze("youtube.com/@three")
+    asyncio.run(run())
+
+    assert analyzer.cached("youtube.com/@one") is not None
+    assert analyzer.cached("youtube.com/@two") is None
+    assert analyzer.cached("youtube.com/@three") is not None